@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the backend hot paths, runnable offline.
+
+YOLO is replaced by a fake model returning synthetic Results and frames are
+generated JPEGs, so no weights, network or API keys are needed.
+
+Usage:
+    python benchmark_hot_paths.py                    # run and print
+    python benchmark_hot_paths.py --save-baseline    # record benchmark_baseline.json
+    python benchmark_hot_paths.py --compare          # fail if slower than baseline + tolerance
+    python benchmark_hot_paths.py --allocations      # peak memory per ingested frame, legacy vs pooled
+    python benchmark_hot_paths.py --resolutions 320 480 640 [--real-model yolov8n.pt]
+                                                     # decode + inference time per inference size
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Clients are constructed at import time but never called here
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+import cv2
+import numpy as np
+
+import utils.object_detection as object_detection_module
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+COCO_NAMES = {0: "person", 39: "bottle", 41: "cup", 56: "chair", 57: "couch", 62: "tv", 63: "laptop", 73: "book"}
+
+
+class FakeBoxes:
+    def __init__(self, count: int, width: int, height: int, rng: np.random.Generator):
+        x1 = rng.uniform(0, width * 0.7, count)
+        y1 = rng.uniform(0, height * 0.7, count)
+        x2 = x1 + rng.uniform(20, width * 0.3, count)
+        y2 = y1 + rng.uniform(20, height * 0.3, count)
+        self.xyxy = np.stack([x1, y1, x2, y2], axis=1).astype(np.float32)
+        self.cls = rng.choice(list(COCO_NAMES), count).astype(np.float32)
+        self.conf = rng.uniform(0.2, 0.99, count).astype(np.float32)
+
+
+class FakeResults:
+    """Stands in for ultralytics.engine.results.Results (numpy instead of tensors)."""
+
+    def __init__(self, count: int = 12, width: int = 640, height: int = 480, seed: int = 0):
+        self.names = COCO_NAMES
+        self.boxes = FakeBoxes(count, width, height, np.random.default_rng(seed))
+
+
+class FakeYOLO:
+    def __init__(self, model_name: str = "yolov8n.pt"):
+        self.model_name = model_name
+
+    def __call__(self, image, **kwargs):
+        height, width = image.shape[:2]
+        return [FakeResults(width=width, height=height)]
+
+
+def synthetic_jpeg(width: int = 640, height: int = 480, seed: int = 0) -> str:
+    """A textured frame (gradients + rectangles) encoded like the iOS client does."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    image = np.dstack([x + 0 * y, y + 0 * x, (x + y) / 2]).astype(np.uint8)
+    for _ in range(8):
+        x1, y1 = int(rng.integers(0, width - 60)), int(rng.integers(0, height - 60))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(image, (x1, y1), (x1 + 60, y1 + 60), color, -1)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return base64.b64encode(encoded.tobytes()).decode()
+
+
+def build_benchmarks() -> Dict[str, Callable[[], object]]:
+    """Name -> zero-argument callable exercising one hot path."""
+    object_detection_module.YOLO = FakeYOLO
+    from utils.str_to_pic import str_to_pic
+    from utils.object_detection import object_detection
+    from utils.llm_communication import llm_communication
+    from utils.object_tracker import object_tracker
+    import server
+
+    os.makedirs("./utils/photos", exist_ok=True)
+    frame = synthetic_jpeg()
+    detector = object_detection()
+    results = FakeResults()
+    image = cv2.imdecode(np.frombuffer(base64.b64decode(frame), np.uint8), cv2.IMREAD_COLOR)
+    bbox = [100, 80, 300, 260]
+    hsv_samples = [(h, s, v) for h in range(0, 180, 9) for s in (10, 120, 240) for v in (40, 128, 220)]
+
+    com = llm_communication()
+    for i in range(30):
+        com.log_message(f"I can see a chair and a lamp, message {i}", f"That's lovely, let's notice it together {i}.")
+    messages = [
+        "Anchor, I can't breathe, please help",
+        "I'm sitting on a chair near the stairs",
+        "anchor can you play the video from my mom",
+        "I see a cup, a laptop, a couch and a book",
+    ]
+
+    tracker = object_tracker(keyframe_interval=10 ** 9)
+    tracker.update(detector.detections_from_results(results, 0.5), timestamp=0.0, frame_size=(640, 480))
+
+    clients = [f"10.0.0.{i}" for i in range(256)]
+    client_index = [0]
+
+    def rate_limit():
+        client_index[0] = (client_index[0] + 1) % len(clients)
+        return server.check_rate_limit(clients[client_index[0]])
+
+    return {
+        "str_to_pic": lambda: os.remove(str_to_pic(frame)),
+        "decode_frame": lambda: detector.frame_buffers.decode_frame(frame),
+        "decode_letterboxed_640": lambda: detector.frame_buffers.release_array(
+            detector.frame_buffers.decode_letterboxed(frame, 640)[0]),
+        "get_objects_from_results_for_kori": lambda: detector.get_objects_from_results_for_kori(results, 1, 0.0, 0.5),
+        "extract_dominant_color": lambda: detector.extract_dominant_color(image, bbox),
+        "assess_frame_quality": lambda: detector.assess_frame_quality(frame),
+        "object_tracker_update": lambda: tracker.update(detector.detections_from_results(results, 0.5), timestamp=0.0),
+        "object_tracker_predict": lambda: tracker.predict(0.1),
+        "_hsv_to_color_name": lambda: [detector._hsv_to_color_name(h, s, v) for h, s, v in hsv_samples],
+        "check_rate_limit": rate_limit,
+        "format_conversation_for_context": lambda: com.format_conversation_for_context(),
+        "check_if_user_wants_switch_procedure": lambda: [com.check_if_user_wants_switch_procedure(m) for m in messages],
+    }
+
+
+def run_benchmarks(benchmarks: Dict[str, Callable[[], object]], min_seconds: float = 0.2,
+                   repeats: int = 5) -> Dict[str, float]:
+    """Median seconds per call for each benchmark."""
+    results = {}
+    for name, func in benchmarks.items():
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        number = max(1, int(number * min_seconds / 0.2))
+        samples = [elapsed / number for elapsed in timer.repeat(repeat=repeats, number=number)]
+        results[name] = sorted(samples)[len(samples) // 2]
+    return results
+
+
+def measure_frame_allocations(frames: int = 50) -> Dict[str, Dict[str, float]]:
+    """Peak traced bytes and allocated blocks per frame: file-based ingestion vs the pooled decoder."""
+    object_detection_module.YOLO = FakeYOLO
+    from utils.str_to_pic import str_to_pic
+    from utils.object_detection import object_detection
+
+    os.makedirs("./utils/photos", exist_ok=True)
+    frame = synthetic_jpeg()
+    detector = object_detection()
+
+    def legacy():
+        path = str_to_pic(frame)
+        image = cv2.imread(path)
+        os.remove(path)
+        return image
+
+    paths = {"legacy (str_to_pic + imread)": legacy, "pooled (decode_frame)": lambda: detector.frame_buffers.decode_frame(frame)}
+    report = {}
+    for name, ingest in paths.items():
+        ingest()  # warm the pool and any lazy imports
+        peaks, blocks = [], []
+        for _ in range(frames):
+            tracemalloc.start()
+            image = ingest()
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            blocks.append(len(tracemalloc.take_snapshot().traces))
+            tracemalloc.stop()
+            del image
+        report[name] = {"peak_bytes": sorted(peaks)[len(peaks) // 2], "blocks": sorted(blocks)[len(blocks) // 2]}
+    return report
+
+
+def measure_resolutions(sizes: List[int], real_model: str = None) -> Dict[str, Dict[str, float]]:
+    """Median decode and inference seconds per (source frame, inference size)."""
+    object_detection_module.YOLO = FakeYOLO
+    if real_model:
+        from ultralytics import YOLO
+        object_detection_module.YOLO = YOLO
+    from utils.object_detection import object_detection
+
+    sources = {"640x480": synthetic_jpeg(640, 480), "1920x1440": synthetic_jpeg(1920, 1440)}
+    report = {}
+    for size in sizes:
+        detector = object_detection(model_name=real_model or "yolov8n.pt", inference_size=size)
+        detector.warm_up()
+        for source_name, frame in sources.items():
+            image, _ = detector.frame_buffers.decode_letterboxed(frame, size)
+            decode = run_benchmarks({"decode": lambda: detector.frame_buffers.release_array(
+                detector.frame_buffers.decode_letterboxed(frame, size)[0])}, min_seconds=0.1, repeats=3)
+            inference = run_benchmarks({"inference": lambda: detector.model(image, imgsz=size, verbose=False)},
+                                       min_seconds=0.1, repeats=3)
+            detector.frame_buffers.release_array(image)
+            report[f"{source_name} @ {size}"] = {"decode": decode["decode"], "inference": inference["inference"]}
+    return report
+
+
+def compare_to_baseline(results: Dict[str, float], baseline: Dict[str, float],
+                        tolerance: float) -> List[Tuple[str, float, float]]:
+    """Benchmarks slower than baseline * (1 + tolerance): (name, baseline, current)."""
+    return [
+        (name, baseline[name], seconds)
+        for name, seconds in results.items()
+        if name in baseline and seconds > baseline[name] * (1 + tolerance)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backend hot-path micro-benchmarks")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Record these results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="Exit non-zero on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown, e.g. 0.25 = 25%%")
+    parser.add_argument("--only", nargs="*", help="Run only these benchmarks")
+    parser.add_argument("--allocations", action="store_true", help="Report per-frame ingestion allocations and exit")
+    parser.add_argument("--resolutions", nargs="*", type=int, help="Time decode + inference at these inference sizes")
+    parser.add_argument("--real-model", help="YOLO weights for --resolutions (default: the fake model)")
+    args = parser.parse_args()
+
+    if args.resolutions:
+        print(f"📐 Decode + inference per resolution ({args.real_model or 'fake model'})")
+        print("=" * 60)
+        for name, row in measure_resolutions(args.resolutions, args.real_model).items():
+            print(f"  {name:<22} decode {row['decode'] * 1e3:>8.2f} ms   inference {row['inference'] * 1e3:>8.2f} ms")
+        sys.exit(0)
+
+    if args.allocations:
+        print("🧮 Per-frame ingestion allocations (median over 50 frames)")
+        print("=" * 60)
+        for name, row in measure_frame_allocations().items():
+            print(f"  {name:<32} peak {row['peak_bytes'] / 1024:>8.1f} KiB   live blocks {row['blocks']:>5}")
+        sys.exit(0)
+
+    print("⏱️  Backend Hot-Path Benchmarks")
+    print("=" * 60)
+
+    if args.compare and not os.path.exists(args.baseline):
+        print(f"❌ No baseline at {args.baseline}; record one with --save-baseline before --compare")
+        sys.exit(2)
+
+    benchmarks = build_benchmarks()
+    if args.only:
+        benchmarks = {name: func for name, func in benchmarks.items() if name in args.only}
+    results = run_benchmarks(benchmarks)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    for name, seconds in results.items():
+        line = f"  {name:<40} {seconds * 1e6:>10.1f} µs"
+        if name in baseline:
+            line += f"   ({(seconds / baseline[name] - 1) * 100:+.0f}% vs baseline)"
+        print(line)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"results": results, "tolerance": args.tolerance}, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.baseline}")
+
+    if args.compare:
+        missing = [name for name in results if name not in baseline]
+        if missing:
+            print(f"\n⚠️  Not in the baseline, so not compared: {', '.join(missing)}")
+        if len(missing) == len(results):
+            print("❌ Nothing was compared")
+            sys.exit(2)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} hot path(s) regressed beyond {args.tolerance:.0%}:")
+            for name, before, after in regressions:
+                print(f"  {name}: {before * 1e6:.1f} µs -> {after * 1e6:.1f} µs")
+            sys.exit(1)
+        print("\n✅ No regressions beyond tolerance")
@@ -5,6 +5,7 @@ class TextMessageData(BaseModel):
     text: str
     heart_rate: float
     timestamp: float 
+    latency_budget_ms: Optional[float] = None  # Reply deadline for this turn (default: TURN_LATENCY_BUDGET_MS)
 
 class ImageMessageData(BaseModel):
     image: Union[str, bytes]
@@ -16,6 +17,14 @@ class TTSRequestData(BaseModel):
     voice: Optional[str] = None  # Optional voice selection
     format: Optional[str] = None  # Optional audio format
 
+class ProfileRequestData(BaseModel):
+    requests: int = 10  # Number of upcoming matching requests to profile
+    mode: str = "sampling"  # "sampling" or "deterministic"
+    endpoint: Optional[str] = None  # Only profile this path, e.g. "/upload_text"
+    match_header: Optional[str] = None  # Only profile requests whose header...
+    match_value: Optional[str] = None  # ...has this value
+    sample_interval_ms: Optional[float] = None
+
 class AudioProcessData(BaseModel):
     audio_data: str  # Base64 encoded audio data
     source_type: Optional[str] = "bytes"  # "bytes" or "file" 
\ No newline at end of file
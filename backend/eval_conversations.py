@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of the conversation pipeline over a corpus of transcripts.
+
+Each transcript is driven through its own llm_communication session via
+starting_point, the same entry point /upload_text uses; sessions run
+concurrently on a bounded thread pool. Per turn it records latency, LLM
+calls and tokens, the READY/HOLD decision and the procedure/stage before
+and after. The report covers throughput, latency percentiles, decision
+rates, stage progression and, where transcripts state expectations, how
+often the pipeline met them.
+
+Transcripts are JSONL, one conversation per line:
+    {"id": "calm-1", "od_results": ["lamp", "cup"],
+     "turns": ["I'm anxious", {"text": "I see a lamp, a cup...", "expect": {"decision": "READY", "stage": 2}}]}
+A turn is either its text or an object with "text" and optional "od_results"
+and "expect" ({"decision": "READY"|"HOLD"|"none", "procedure": ..., "stage": ...},
+checked after the turn).
+
+Against real providers (OPENAI_API_KEY / GEMINI_API_KEY from the environment):
+    python eval_conversations.py eval_transcripts.jsonl --concurrency 8
+Against the offline stub:
+    python provider_stub.py --profile typical &
+    python eval_conversations.py eval_transcripts.jsonl --stub http://localhost:2420 --concurrency 64
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from load_test import percentile
+
+
+def load_transcripts(path: str) -> List[Dict[str, Any]]:
+    transcripts = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            transcript = json.loads(line)
+            transcript.setdefault("id", f"line-{number}")
+            transcript["turns"] = [turn if isinstance(turn, dict) else {"text": turn} for turn in transcript["turns"]]
+            transcripts.append(transcript)
+    return transcripts
+
+
+def decision_of(calls: List[Dict[str, Any]]) -> str:
+    """READY / HOLD as the grounding step's LLM reply signalled it, or "none"."""
+    for call in calls:
+        text = (call["text"] or "").lstrip()
+        if text.startswith("READY:"):
+            return "READY"
+        if text.startswith("HOLD:"):
+            return "HOLD"
+    return "none"
+
+
+def run_transcript(transcript: Dict[str, Any], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Play one transcript through a fresh session (blocking); returns a record per turn."""
+    from utils.llm_communication import llm_communication
+
+    session = llm_communication()
+    calls: List[Dict[str, Any]] = []
+    session.on_llm_call = lambda **call: calls.append(call)
+    records = []
+    for index, turn in enumerate(transcript["turns"]):
+        before = (session.current_procedure, session.current_stage)
+        calls.clear()
+        start = time.perf_counter()
+        error = None
+        try:
+            response = session.starting_point(turn["text"], time.time(),
+                                              od_results=turn.get("od_results", transcript.get("od_results")))
+        except Exception as e:  # the pipeline itself failed, not just a provider call
+            response, error = None, str(e)
+        seconds = time.perf_counter() - start
+        reply_calls = [call for call in calls if call["purpose"] != "summary"]
+        record = {
+            "transcript": transcript["id"],
+            "turn": index,
+            "text": turn["text"],
+            "response": response,
+            "seconds": seconds,
+            "llm_calls": len(reply_calls),
+            "provider_errors": sum(call["purpose"] == "error" for call in reply_calls),
+            "prompt_tokens": sum(call["prompt_tokens"] for call in reply_calls),
+            "completion_tokens": sum(call["completion_tokens"] for call in reply_calls),
+            "decision": decision_of(reply_calls),
+            "procedure_before": before[0],
+            "stage_before": before[1],
+            "procedure": session.current_procedure,
+            "stage": session.current_stage,
+            "error": error,
+        }
+        expect = turn.get("expect")
+        if expect:
+            actual = {"decision": record["decision"], "procedure": record["procedure"], "stage": record["stage"]}
+            record["expect"] = expect
+            record["met"] = all(actual.get(key) == value for key, value in expect.items())
+        # The server folds old turns into the summary after each reply; count it, but not in turn latency
+        if args.summaries:
+            calls.clear()
+            session.summarize_older_turns()
+            record["summary_tokens"] = sum(call["prompt_tokens"] + call["completion_tokens"] for call in calls)
+        records.append(record)
+    return records
+
+
+def run_corpus(transcripts: List[Dict[str, Any]], args: argparse.Namespace) -> Dict[str, Any]:
+    records: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    completed = 0
+
+    def play(transcript: Dict[str, Any]) -> None:
+        nonlocal completed
+        turns = run_transcript(transcript, args)
+        with lock:
+            records.extend(turns)
+            completed += 1
+            if args.progress and completed % args.progress == 0:
+                print(f"  {completed}/{len(transcripts)} transcripts", file=sys.stderr)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="eval-session") as pool:
+        for future in [pool.submit(play, transcript) for transcript in transcripts]:
+            future.result()
+    return {"records": records, "wall_seconds": time.perf_counter() - start}
+
+
+def summarize(records: List[Dict[str, Any]], transcripts: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    latencies = sorted(record["seconds"] for record in records)
+    decisions: Dict[str, int] = {}
+    for record in records:
+        decisions[record["decision"]] = decisions.get(record["decision"], 0) + 1
+
+    # Stage progression per transcript: where it ended, and how many turns grounding took to reach closure
+    last_turns: Dict[str, Dict[str, Any]] = {}
+    turns_to_closure = []
+    for record in sorted(records, key=lambda record: (record["transcript"], record["turn"])):
+        last_turns[record["transcript"]] = record
+        if record["procedure"] == "grounding" and record["stage"] == 6 and record["stage_before"] != 6:
+            turns_to_closure.append(record["turn"] + 1)
+    final_positions: Dict[str, int] = {}
+    for record in last_turns.values():
+        position = f"{record['procedure']}:{record['stage']}"
+        final_positions[position] = final_positions.get(position, 0) + 1
+
+    checked = [record for record in records if "met" in record]
+    return {
+        "transcripts": len(transcripts),
+        "turns": len(records),
+        "wall_seconds": wall_seconds,
+        "turns_per_second": len(records) / wall_seconds if wall_seconds > 0 else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "llm_calls": sum(record["llm_calls"] for record in records),
+        "provider_errors": sum(record["provider_errors"] for record in records),
+        "pipeline_errors": sum(record["error"] is not None for record in records),
+        "prompt_tokens": sum(record["prompt_tokens"] for record in records),
+        "completion_tokens": sum(record["completion_tokens"] for record in records),
+        "summary_tokens": sum(record.get("summary_tokens", 0) for record in records),
+        "decisions": decisions,
+        "hold_rate": decisions.get("HOLD", 0) / max(1, decisions.get("HOLD", 0) + decisions.get("READY", 0)),
+        "final_positions": final_positions,
+        "reached_closure": len(turns_to_closure),
+        "mean_turns_to_closure": sum(turns_to_closure) / len(turns_to_closure) if turns_to_closure else None,
+        "expectations_checked": len(checked),
+        "expectations_met": sum(record["met"] for record in checked),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n📊 {report['transcripts']} transcripts, {report['turns']} turns in {report['wall_seconds']:.1f}s "
+          f"({report['turns_per_second']:.2f} turns/s)")
+    print(f"  latency per turn     p50 {report['p50_ms']:.0f} ms   p95 {report['p95_ms']:.0f} ms   "
+          f"p99 {report['p99_ms']:.0f} ms")
+    turns = max(1, report["turns"])
+    print(f"  LLM calls            {report['llm_calls']} ({report['llm_calls'] / turns:.2f}/turn), "
+          f"{report['provider_errors']} provider errors, {report['pipeline_errors']} pipeline errors")
+    print(f"  tokens (estimated)   prompt {report['prompt_tokens']} ({report['prompt_tokens'] / turns:.0f}/turn), "
+          f"completion {report['completion_tokens']}, summaries {report['summary_tokens']}")
+    print("  decisions            " + ", ".join(f"{name} {count}" for name, count in sorted(report["decisions"].items()))
+          + f"   (HOLD rate {report['hold_rate']:.0%})")
+    closure = f", mean {report['mean_turns_to_closure']:.1f} turns" if report["mean_turns_to_closure"] else ""
+    print(f"  grounding closure    {report['reached_closure']}/{report['transcripts']} transcripts{closure}")
+    print("  final positions      " + ", ".join(f"{position} x{count}"
+                                                 for position, count in sorted(report["final_positions"].items())))
+    if report["expectations_checked"]:
+        print(f"  expectations met     {report['expectations_met']}/{report['expectations_checked']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run transcripts through concurrent conversation sessions")
+    parser.add_argument("transcripts", help="JSONL file, one transcript per line")
+    parser.add_argument("--concurrency", type=int, default=8, help="Sessions running at once")
+    parser.add_argument("--stub", metavar="URL", help="Use provider_stub.py at this URL instead of real providers")
+    parser.add_argument("--repeat", type=int, default=1, help="Play the corpus this many times (throughput runs)")
+    parser.add_argument("--no-summaries", dest="summaries", action="store_false",
+                        help="Skip the rolling-summary call the server makes after each turn")
+    parser.add_argument("--output", help="Write one JSON record per turn to this file")
+    parser.add_argument("--report-json", help="Write the summary report as JSON to this file")
+    parser.add_argument("--progress", type=int, default=0, help="Print progress every N transcripts")
+    args = parser.parse_args()
+
+    if args.stub:
+        # Read by llm_communication when it is first imported
+        os.environ["OPENAI_BASE_URL"] = args.stub.rstrip("/") + "/v1"
+        os.environ["GEMINI_BASE_URL"] = args.stub.rstrip("/")
+        os.environ.setdefault("OPENAI_API_KEY", "offline")
+        os.environ.setdefault("GEMINI_API_KEY", "offline")
+    from utils.structured_logger import logger
+    logger.stream = sys.stderr  # keep the pipeline's JSON logs out of the report
+
+    corpus = load_transcripts(args.transcripts)
+    if args.repeat > 1:
+        corpus = [{**transcript, "id": f"{transcript['id']}#{round_}"}
+                  for round_ in range(args.repeat) for transcript in corpus]
+    print(f"🧪 {len(corpus)} transcripts, concurrency {args.concurrency}, "
+          f"{'stub at ' + args.stub if args.stub else 'real providers'}")
+    result = run_corpus(corpus, args)
+    report = summarize(result["records"], corpus, result["wall_seconds"])
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            for record in sorted(result["records"], key=lambda record: (record["transcript"], record["turn"])):
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    if args.report_json:
+        with open(args.report_json, "w") as f:
+            json.dump(report, f, indent=2)
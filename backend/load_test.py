@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Asyncio load generator simulating concurrent iOS sessions against the backend.
+
+Each session streams frames to /upload_image at a fixed FPS and sends
+/upload_text turns at human pacing. Reports throughput, error rate and
+p50/p95/p99 latency per endpoint, and can ramp sessions up to find the
+saturation point of a deployment.
+
+Run the backend against the offline provider stub first:
+    python provider_stub.py --profile typical &
+    OPENAI_BASE_URL=http://localhost:2420/v1 GEMINI_BASE_URL=http://localhost:2420 \\
+        OPENAI_API_KEY=offline GEMINI_API_KEY=offline python server.py &
+
+Then:
+    python load_test.py --sessions 20 --fps 2 --duration 60
+    python load_test.py --find-saturation --fps 2 --slo-p95-ms 1500
+
+The server rate-limits /upload_text per client IP, so against a localhost
+target each session binds its own 127.x.y.z source address. That needs the
+whole 127.0.0.0/8 block on loopback (Linux); elsewhere (macOS only has
+127.0.0.1 unless aliases are added) sessions share one address, and text
+turns beyond the rate limit come back as 429s.
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import random
+import socket
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "utils", "puppy.jpeg")
+
+USER_TURNS = [
+    "I'm feeling really anxious right now",
+    "I can see a couch, a lamp, a cup, a window and my phone",
+    "I can feel the blanket, the floor, my sleeve and the table",
+    "I hear the fridge humming, a car outside and my breathing",
+    "I smell coffee and some soap",
+    "I can taste mint from my toothpaste",
+    "Sorry, I keep thinking about work instead",
+    "Anchor, I can't breathe",
+]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class load_stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.status_counts: Dict[str, Dict[str, int]] = {}
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def record(self, endpoint: str, seconds: float, status: str) -> None:
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        counts = self.status_counts.setdefault(endpoint, {})
+        counts[status] = counts.get(status, 0) + 1
+        if not status.startswith("2"):
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        report = {}
+        for endpoint, values in self.latencies.items():
+            ordered = sorted(values)
+            report[endpoint] = {
+                "requests": len(values),
+                "throughput_rps": len(values) / elapsed if elapsed > 0 else 0.0,
+                "error_rate": self.errors.get(endpoint, 0) / len(values),
+                "p50_ms": percentile(ordered, 0.50) * 1000,
+                "p95_ms": percentile(ordered, 0.95) * 1000,
+                "p99_ms": percentile(ordered, 0.99) * 1000,
+            }
+        return report
+
+
+@lru_cache(maxsize=1)
+def loopback_block_bindable() -> bool:
+    """Whether addresses other than 127.0.0.1 can be bound (Linux routes all of 127.0.0.0/8 to loopback)."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+            probe.bind(("127.0.0.2", 0))
+        return True
+    except OSError:
+        return False
+
+
+def source_address(index: int, base_url: str) -> Optional[str]:
+    """A distinct loopback source address per session when targeting localhost, if the OS allows binding it."""
+    host = urlparse(base_url).hostname
+    if host not in ("localhost", "127.0.0.1") or not loopback_block_bindable():
+        return None
+    index += 2
+    return f"127.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}"
+
+
+async def timed_post(client: httpx.AsyncClient, stats: load_stats, endpoint: str, payload: dict,
+                     timeout: float) -> None:
+    start = time.perf_counter()
+    try:
+        response = await client.post(endpoint, json=payload, timeout=timeout)
+        status = str(response.status_code)
+    except httpx.TimeoutException:
+        status = "timeout"
+    except httpx.HTTPError:
+        status = "connection_error"
+    stats.record(endpoint, time.perf_counter() - start, status)
+
+
+async def run_session(index: int, args: argparse.Namespace, image: str, stats: load_stats, stop_at: float) -> None:
+    """One simulated device: a frame loop and a conversation loop until stop_at."""
+    address = source_address(index, args.url)
+    transport = httpx.AsyncHTTPTransport(local_address=address) if address else None
+    async with httpx.AsyncClient(base_url=args.url, transport=transport) as client:
+
+        async def frames():
+            interval = 1.0 / args.fps
+            next_at = time.perf_counter() + random.uniform(0, interval)
+            while next_at < stop_at:
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                payload = {"image": image, "heart_rate": random.uniform(70, 110), "timestamp": time.time()}
+                await timed_post(client, stats, "/upload_image", payload, args.timeout)
+                # Fixed-rate capture timer, like the app: late frames are not made up for
+                next_at = max(next_at + interval, time.perf_counter())
+
+        async def turns():
+            await asyncio.sleep(random.uniform(0, args.think_seconds))
+            while time.perf_counter() < stop_at:
+                payload = {"text": random.choice(USER_TURNS), "heart_rate": random.uniform(70, 110),
+                           "timestamp": time.time()}
+                await timed_post(client, stats, "/upload_text", payload, args.timeout)
+                # Human pacing: think/speak time, never below the server's per-client rate limit
+                await asyncio.sleep(max(args.min_turn_gap, random.lognormvariate(0, 0.4) * args.think_seconds))
+
+        tasks = []
+        if args.fps > 0:
+            tasks.append(frames())
+        if args.think_seconds > 0:
+            tasks.append(turns())
+        await asyncio.gather(*tasks)
+
+
+async def run_load(sessions: int, duration: float, args: argparse.Namespace, image: str) -> load_stats:
+    stats = load_stats()
+    stop_at = time.perf_counter() + duration
+    await asyncio.gather(*(run_session(i, args, image, stats, stop_at) for i in range(sessions)))
+    stats.finished = time.perf_counter()
+    return stats
+
+
+def print_report(sessions: int, report: Dict[str, Dict[str, float]]) -> None:
+    print(f"\n📊 {sessions} session(s)")
+    print(f"  {'endpoint':<16}{'reqs':>7}{'rps':>8}{'err%':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for endpoint, row in sorted(report.items()):
+        print(f"  {endpoint:<16}{row['requests']:>7}{row['throughput_rps']:>8.1f}{row['error_rate'] * 100:>7.1f}"
+              f"{row['p50_ms']:>9.0f}{row['p95_ms']:>9.0f}{row['p99_ms']:>9.0f}")
+
+
+def saturated(report: Dict[str, Dict[str, float]], args: argparse.Namespace) -> bool:
+    return any(row["p95_ms"] > args.slo_p95_ms or row["error_rate"] > args.max_error_rate
+               for row in report.values())
+
+
+async def find_saturation(args: argparse.Namespace, image: str) -> None:
+    """Double the session count until the SLO breaks, then report the last level that held."""
+    sessions = args.sessions
+    last_good = None
+    while sessions <= args.max_sessions:
+        report = (await run_load(sessions, args.duration, args, image)).summary()
+        print_report(sessions, report)
+        if saturated(report, args):
+            print(f"\n🚨 Saturated at {sessions} sessions "
+                  f"(p95 > {args.slo_p95_ms:.0f} ms or error rate > {args.max_error_rate:.0%})")
+            break
+        last_good = sessions
+        sessions *= 2
+    if last_good is None:
+        print("\n❌ The SLO is not met even at the starting session count")
+    else:
+        print(f"\n✅ Highest tested load within SLO: {last_good} sessions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent session load generator")
+    parser.add_argument("--url", default="http://localhost:2419")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per run (or per ramp step)")
+    parser.add_argument("--fps", type=float, default=2.0, help="Frames per second per session (0 = none)")
+    parser.add_argument("--think-seconds", type=float, default=8.0, help="Median gap between text turns (0 = none)")
+    parser.add_argument("--min-turn-gap", type=float, default=5.5, help="Lower bound between turns of one session")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--image", default=DEFAULT_IMAGE, help="JPEG sent as every frame")
+    parser.add_argument("--find-saturation", action="store_true", help="Ramp sessions until the SLO breaks")
+    parser.add_argument("--max-sessions", type=int, default=1024)
+    parser.add_argument("--slo-p95-ms", type=float, default=2000.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        frame = base64.b64encode(f.read()).decode()
+
+    print("🚀 Load test against " + args.url)
+    if args.find_saturation:
+        asyncio.run(find_saturation(args, frame))
+    else:
+        result = asyncio.run(run_load(args.sessions, args.duration, args, frame))
+        print_report(args.sessions, result.summary())
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for the OpenAI and Gemini APIs used by the backend.
+
+Speaks the subset of the APIs that llm_communication and text_to_speech call:
+    POST /v1/chat/completions                      (OpenAI chat)
+    POST /v1/audio/speech                          (OpenAI TTS, returns silent mp3)
+    POST /{version}/models/{model}:generateContent (Gemini)
+
+Responses are replayed from a recordings file (JSONL) or generated
+synthetically, with configurable latency distributions and error rates.
+
+Point the backend at it with:
+    OPENAI_BASE_URL=http://localhost:2420/v1
+    GEMINI_BASE_URL=http://localhost:2420
+    OPENAI_API_KEY=offline GEMINI_API_KEY=offline
+
+Run:
+    python provider_stub.py --profile typical --recordings recordings.jsonl
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+import uvicorn
+
+# Latency distributions (milliseconds) and error rates per provider endpoint.
+# A distribution is {"dist": "fixed" | "uniform" | "normal" | "lognormal", ...params}.
+LATENCY_PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "instant": {
+        "chat": {"dist": "fixed", "ms": 0},
+        "gemini": {"dist": "fixed", "ms": 0},
+        "speech": {"dist": "fixed", "ms": 0},
+    },
+    "typical": {
+        "chat": {"dist": "lognormal", "median_ms": 700, "sigma": 0.35},
+        "gemini": {"dist": "lognormal", "median_ms": 550, "sigma": 0.35},
+        "speech": {"dist": "lognormal", "median_ms": 900, "sigma": 0.3},
+    },
+    "slow": {
+        "chat": {"dist": "lognormal", "median_ms": 2500, "sigma": 0.5},
+        "gemini": {"dist": "lognormal", "median_ms": 2000, "sigma": 0.5},
+        "speech": {"dist": "lognormal", "median_ms": 3000, "sigma": 0.4},
+    },
+    "flaky": {
+        "chat": {"dist": "lognormal", "median_ms": 900, "sigma": 0.8, "error_rate": 0.05},
+        "gemini": {"dist": "lognormal", "median_ms": 700, "sigma": 0.8, "error_rate": 0.05},
+        "speech": {"dist": "lognormal", "median_ms": 1100, "sigma": 0.6, "error_rate": 0.05},
+    },
+}
+
+SYNTHETIC_REPLIES = [
+    "You're doing really well. Let's keep going gently, one step at a time.",
+    "I hear you, and you're safe here with me. Take a slow breath with me.",
+    "That's a lovely thing to notice. Stay with that feeling for a moment.",
+    "Thank you for sharing that with me. Let's move forward together, calmly.",
+]
+
+# Bytes per silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, mono, no padding.
+# Each frame is 1152 samples (~26 ms) of silence.
+_MP3_FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0xC0])
+_MP3_FRAME_LENGTH = 417
+SILENT_MP3_FRAME = _MP3_FRAME_HEADER + bytes(_MP3_FRAME_LENGTH - len(_MP3_FRAME_HEADER))
+MP3_FRAME_SECONDS = 1152 / 44100
+SPOKEN_CHARS_PER_SECOND = 15
+
+
+def silent_mp3(text: str) -> bytes:
+    """Silent mp3 roughly as long as the text would take to speak."""
+    seconds = max(0.5, len(text) / SPOKEN_CHARS_PER_SECOND)
+    return SILENT_MP3_FRAME * int(seconds / MP3_FRAME_SECONDS)
+
+
+def sample_latency_ms(spec: Dict[str, Any]) -> float:
+    """Draw one latency sample (milliseconds) from a distribution spec."""
+    dist = spec.get("dist", "fixed")
+    if dist == "fixed":
+        return float(spec.get("ms", 0))
+    if dist == "uniform":
+        return random.uniform(spec["min_ms"], spec["max_ms"])
+    if dist == "normal":
+        return max(0.0, random.gauss(spec["mean_ms"], spec["stddev_ms"]))
+    if dist == "lognormal":
+        return random.lognormvariate(0.0, spec["sigma"]) * spec["median_ms"]
+    raise ValueError(f"Unknown latency distribution: {dist}")
+
+
+# Where llm_communication's prompt templates quote the user's current turn. History is placed
+# before the prompt and quoted as "User: ..." lines, so it never matches these.
+USER_MESSAGE_FIELDS = [
+    re.compile(r'^\s*- User’s reply: "(.*)"\s*$', re.MULTILINE),  # grounding step / segue
+    re.compile(r'^\s*User said: "(.*)"\s*$', re.MULTILINE),  # breathing step
+    re.compile(r"^The user said: '(.*)'\. .*Guide them according to the grounding step\.$", re.MULTILINE),
+    re.compile(r"^\s*(?:Current message|Message received): (.*?)\s*$", re.MULTILINE),  # enhanced pipeline
+]
+
+
+def user_message_of(prompt: str) -> Optional[str]:
+    """The user's current turn as quoted in the prompt (the last quoted field), or None."""
+    found = [(match.start(), match.group(1)) for field in USER_MESSAGE_FIELDS for match in field.finditer(prompt)]
+    return max(found)[1] if found else None
+
+
+class provider_stub:
+    def __init__(self, profile: Dict[str, Dict[str, Any]], recordings: List[Dict[str, Any]] = None,
+                 hold_rate: float = 0.2, seed: Optional[int] = None):
+        """
+        State for the stand-in providers.
+
+        Args:
+            profile: Latency/error spec per endpoint ("chat", "gemini", "speech")
+            recordings: Recorded responses, each {"provider", "text"} and optionally "user_message"
+                (the turn it answered, matched exactly) or "prompt_contains" (a substring of the prompt)
+            hold_rate: Chance that a synthetic grounding reply is a HOLD instead of READY
+            seed: Random seed for reproducible runs
+        """
+        if seed is not None:
+            random.seed(seed)
+        self.profile = profile
+        self.hold_rate = hold_rate
+        self.recordings: Dict[str, List[Dict[str, Any]]] = {}
+        for record in recordings or []:
+            self.recordings.setdefault(record["provider"], []).append(record)
+        self._replay_cycles = {provider: itertools.cycle(records) for provider, records in self.recordings.items()}
+        # Records answering the same turn text (e.g. "ok" said twice) are replayed in capture order
+        self._turn_matches: Dict[tuple, List[Dict[str, Any]]] = {}
+        self._needle_matches: Dict[tuple, List[Dict[str, Any]]] = {}
+        for record in recordings or []:
+            if record.get("user_message") is not None:
+                self._turn_matches.setdefault((record["provider"], record["user_message"]), []).append(record)
+            elif record.get("prompt_contains"):
+                self._needle_matches.setdefault((record["provider"], record["prompt_contains"]), []).append(record)
+        self._match_uses: Dict[tuple, int] = {}
+        self.request_counts: Dict[str, int] = {}
+        self.error_counts: Dict[str, int] = {}
+
+    async def simulate(self, endpoint: str) -> Optional[JSONResponse]:
+        """Sleep for a sampled latency; return an error response if one is injected."""
+        self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+        spec = self.profile.get(endpoint, {"dist": "fixed", "ms": 0})
+        await asyncio.sleep(sample_latency_ms(spec) / 1000)
+        if random.random() < spec.get("error_rate", 0.0):
+            self.error_counts[endpoint] = self.error_counts.get(endpoint, 0) + 1
+            status = random.choice([429, 500, 503])
+            return JSONResponse(status_code=status, content={
+                "error": {"code": status, "message": "Injected error from provider stub", "status": "UNAVAILABLE"}
+            })
+        return None
+
+    def reply_text(self, provider: str, prompt: str) -> str:
+        """Replay a recorded response for the prompt, or make up a plausible one."""
+        records = self.recordings.get(provider)
+        if records:
+            message = user_message_of(prompt)
+            if message is not None and (provider, message) in self._turn_matches:
+                return self._next_match(self._turn_matches, (provider, message))
+            for key in self._needle_matches:
+                if key[0] == provider and key[1] in prompt:
+                    return self._next_match(self._needle_matches, key)
+            return next(self._replay_cycles[provider])["text"]
+
+        reply = random.choice(SYNTHETIC_REPLIES)
+        if '"READY:"' in prompt and '"HOLD:"' in prompt:
+            return ("HOLD: " if random.random() < self.hold_rate else "READY: ") + reply
+        if '"READY:"' in prompt:
+            return "READY: " + reply
+        return reply
+
+
+    def _next_match(self, matches: Dict[tuple, List[Dict[str, Any]]], key: tuple) -> str:
+        used = self._match_uses.get(key, 0)
+        self._match_uses[key] = used + 1
+        return matches[key][used % len(matches[key])]["text"]
+
+
+def create_app(stub: provider_stub) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok", "requests": stub.request_counts, "errors": stub.error_counts}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        error = await stub.simulate("chat")
+        if error is not None:
+            return error
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        text = stub.reply_text("openai_chat", prompt)
+        prompt_tokens = len(prompt.split())
+        completion_tokens = len(text.split())
+        return {
+            "id": f"chatcmpl-stub-{random.getrandbits(32):08x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.post("/v1/audio/speech")
+    async def audio_speech(request: Request):
+        body = await request.json()
+        error = await stub.simulate("speech")
+        if error is not None:
+            return error
+        return Response(content=silent_mp3(body.get("input", "")), media_type="audio/mpeg")
+
+    @app.post("/{version}/models/{model}:generateContent")
+    async def generate_content(version: str, model: str, request: Request):
+        body = await request.json()
+        error = await stub.simulate("gemini")
+        if error is not None:
+            return error
+        prompt = "\n".join(
+            part.get("text", "")
+            for content in body.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        text = stub.reply_text("gemini", prompt)
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": len(prompt.split()),
+                "candidatesTokenCount": len(text.split()),
+                "totalTokenCount": len(prompt.split()) + len(text.split()),
+            },
+        }
+
+    return app
+
+
+def load_recordings(path: str) -> List[Dict[str, Any]]:
+    """Read recorded responses from a JSONL file."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline OpenAI/Gemini stand-in server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=2420)
+    parser.add_argument("--profile", default="typical", help=f"One of {sorted(LATENCY_PROFILES)} or a JSON file")
+    parser.add_argument("--recordings", help="JSONL file of recorded responses to replay")
+    parser.add_argument("--error-rate", type=float, help="Override the error rate of every endpoint")
+    parser.add_argument("--hold-rate", type=float, default=0.2, help="Chance of synthetic HOLD replies")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.profile in LATENCY_PROFILES:
+        profile = json.loads(json.dumps(LATENCY_PROFILES[args.profile]))
+    else:
+        with open(args.profile) as f:
+            profile = json.load(f)
+    if args.error_rate is not None:
+        for spec in profile.values():
+            spec["error_rate"] = args.error_rate
+
+    recordings = load_recordings(args.recordings) if args.recordings else None
+    stub = provider_stub(profile, recordings=recordings, hold_rate=args.hold_rate, seed=args.seed)
+    uvicorn.run(create_app(stub), host=args.host, port=args.port)
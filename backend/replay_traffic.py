@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Replays captured production traffic against one or two backend builds.
+
+Capture real sessions by starting the server with CAPTURE_TRAFFIC=<archive>
+(optionally CAPTURE_SAMPLE_RATE / CAPTURE_MAX_MB). The archive holds every
+request to the conversation and detection endpoints with its arrival time,
+plus the provider responses the server got while answering it.
+
+Turn the provider responses into input for provider_stub.py, so replays get
+the same LLM decisions (READY/HOLD, procedure switches) and provider latency:
+    python replay_traffic.py capture.grtraf --export-stub replay_stub
+    python provider_stub.py --profile replay_stub/profile.json --recordings replay_stub/recordings.jsonl &
+
+Start the builds under test against the stub (see load_test.py), then:
+    python replay_traffic.py capture.grtraf --url http://localhost:2419
+    python replay_traffic.py capture.grtraf --url http://localhost:2419 --url http://localhost:2519 --speed 4
+
+Requests keep their original spacing divided by --speed, and each captured
+client gets its own 127.x.y.z source address against localhost where the OS
+allows it (Linux; see load_test.py). Text turns are rate-limited per client,
+so replays above 1x see 429s where the capture had turns closer than
+RATE_LIMIT_SECONDS * speed apart. Server CPU is read from
+/metrics before and after each run (the API process plus detector workers), so
+each build should serve only the replay while it runs.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import statistics
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from load_test import load_stats, percentile, source_address
+from utils.traffic_capture import read_archive
+
+# provider_stub endpoint for each provider recorded by the capture
+STUB_ENDPOINTS = {"openai_chat": "chat", "gemini": "gemini", "openai_speech": "speech"}
+CPU_METRICS = ("grounded_process_cpu_seconds_total", "grounded_detector_worker_busy_seconds_total")
+
+
+def load_capture(path: str) -> Dict[str, List[Dict]]:
+    """Archive records grouped by kind; requests sorted by arrival."""
+    records: Dict[str, List[Dict]] = {"request": [], "response": [], "provider": []}
+    for record in read_archive(path):
+        records.setdefault(record["kind"], []).append(record)
+    records["request"].sort(key=lambda record: record["t"])
+    return records
+
+
+def print_capture_summary(records: Dict[str, List[Dict]]) -> None:
+    requests = records["request"]
+    if not requests:
+        print("Archive has no requests")
+        return
+    by_path: Dict[str, int] = {}
+    for record in requests:
+        by_path[record["path"]] = by_path.get(record["path"], 0) + 1
+    print(f"📼 {len(requests)} requests from {len({record['client'] for record in requests})} client(s) "
+          f"over {requests[-1]['t'] - requests[0]['t']:.0f}s, {len(records['provider'])} provider responses")
+    for path, count in sorted(by_path.items()):
+        print(f"  {path:<28}{count:>7}")
+
+
+def export_stub(records: Dict[str, List[Dict]], directory: str) -> None:
+    """Write recordings.jsonl and a latency profile.json for provider_stub.py."""
+    os.makedirs(directory, exist_ok=True)
+    turn_text = {record["request_id"]: record["body"].get("text") for record in records["request"]
+                 if isinstance(record["body"], dict)}
+    latencies: Dict[str, List[float]] = {}
+    with open(os.path.join(directory, "recordings.jsonl"), "w") as f:
+        for record in records["provider"]:
+            latencies.setdefault(STUB_ENDPOINTS.get(record["provider"], record["provider"]), []).append(
+                max(record["seconds"], 0.001) * 1000)
+            if record["text"] is None:
+                continue
+            entry = {"provider": record["provider"], "text": record["text"]}
+            if turn_text.get(record["request_id"]) is not None:
+                entry["user_message"] = turn_text[record["request_id"]]
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    # Lognormal fit of the recorded latencies, in provider_stub's profile format
+    profile = {}
+    for endpoint in STUB_ENDPOINTS.values():
+        logs = [math.log(ms) for ms in latencies.get(endpoint, [])]
+        if not logs:
+            profile[endpoint] = {"dist": "fixed", "ms": 0}
+            continue
+        profile[endpoint] = {"dist": "lognormal", "median_ms": round(math.exp(statistics.fmean(logs)), 1),
+                             "sigma": round(statistics.pstdev(logs), 3)}
+    with open(os.path.join(directory, "profile.json"), "w") as f:
+        json.dump(profile, f, indent=2)
+    print(f"💾 {sum(len(values) for values in latencies.values())} provider responses -> {directory}")
+
+
+async def server_cpu_seconds(client: httpx.AsyncClient) -> Optional[float]:
+    """CPU seconds the target has used so far according to its /metrics, or None if unavailable."""
+    try:
+        response = await client.get("/metrics", timeout=10.0)
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    total = None
+    for line in response.text.splitlines():
+        name = line.split("{", 1)[0].split(" ", 1)[0]
+        if name in CPU_METRICS:
+            total = (total or 0.0) + float(line.rsplit(" ", 1)[1])
+    return total
+
+
+async def replay(url: str, requests: List[Dict], speed: float, timeout: float) -> Dict:
+    """Send every captured request to url at its original offset / speed; returns the run's report."""
+    clients = {}
+    for record in requests:
+        if record["client"] not in clients:
+            address = source_address(len(clients), url)
+            transport = httpx.AsyncHTTPTransport(local_address=address) if address else None
+            clients[record["client"]] = httpx.AsyncClient(base_url=url, transport=transport)
+    stats = load_stats()
+
+    async def send(record: Dict) -> None:
+        client = clients[record["client"]]
+        body = record["body"]
+        if isinstance(body, dict):
+            if "timestamp" in body:
+                body = {**body, "timestamp": time.time()}
+            content = json.dumps(body)
+        else:
+            content = body or None
+        headers = {**record["headers"], "Content-Type": "application/json"} if content else record["headers"]
+        start = time.perf_counter()
+        try:
+            response = await client.request(record["method"], record["path"], content=content, headers=headers,
+                                            timeout=timeout)
+            status = str(response.status_code)
+        except httpx.TimeoutException:
+            status = "timeout"
+        except httpx.HTTPError:
+            status = "connection_error"
+        stats.record(record["path"], time.perf_counter() - start, status)
+
+    async with httpx.AsyncClient(base_url=url) as admin:
+        cpu_before = await server_cpu_seconds(admin)
+        stats.started = time.perf_counter()
+        first_t = requests[0]["t"]
+        tasks = []
+        for record in requests:
+            delay = stats.started + (record["t"] - first_t) / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(record)))
+        await asyncio.gather(*tasks)
+        stats.finished = time.perf_counter()
+        cpu_after = await server_cpu_seconds(admin)
+    for client in clients.values():
+        await client.aclose()
+
+    cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return {"url": url, "endpoints": stats.summary(), "cpu_seconds": cpu,
+            "wall_seconds": stats.finished - stats.started, "requests": len(requests)}
+
+
+def captured_latencies(records: Dict[str, List[Dict]]) -> Dict[str, Dict[str, float]]:
+    """p50/p95 of how production answered each endpoint while the capture ran."""
+    paths = {record["request_id"]: record["path"] for record in records["request"]}
+    seconds: Dict[str, List[float]] = {}
+    for record in records["response"]:
+        if record["request_id"] in paths:
+            seconds.setdefault(paths[record["request_id"]], []).append(record["seconds"])
+    return {path: {"p50_ms": percentile(sorted(values), 0.50) * 1000, "p95_ms": percentile(sorted(values), 0.95) * 1000}
+            for path, values in seconds.items()}
+
+
+def print_run(run: Dict, captured: Dict[str, Dict[str, float]]) -> None:
+    cpu = f"{run['cpu_seconds']:.1f}s CPU ({run['cpu_seconds'] / run['requests'] * 1000:.1f} ms/request)" \
+        if run["cpu_seconds"] is not None else "CPU unavailable"
+    print(f"\n📊 {run['url']}: {run['requests']} requests in {run['wall_seconds']:.0f}s, {cpu}")
+    print(f"  {'endpoint':<28}{'reqs':>7}{'err%':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'prod p95':>10}")
+    for endpoint, row in sorted(run["endpoints"].items()):
+        production = captured.get(endpoint, {}).get("p95_ms")
+        production = f"{production:>10.0f}" if production is not None else f"{'-':>10}"
+        print(f"  {endpoint:<28}{row['requests']:>7}{row['error_rate'] * 100:>7.1f}"
+              f"{row['p50_ms']:>9.0f}{row['p95_ms']:>9.0f}{row['p99_ms']:>9.0f}{production}")
+
+
+def print_comparison(baseline: Dict, candidate: Dict) -> None:
+    def change(before: float, after: float) -> str:
+        return f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+
+    print(f"\n⚖️  {candidate['url']} vs {baseline['url']}")
+    for endpoint in sorted(set(baseline["endpoints"]) & set(candidate["endpoints"])):
+        before, after = baseline["endpoints"][endpoint], candidate["endpoints"][endpoint]
+        print(f"  {endpoint:<28}p50 {change(before['p50_ms'], after['p50_ms']):>8}"
+              f"   p95 {change(before['p95_ms'], after['p95_ms']):>8}"
+              f"   errors {before['error_rate'] * 100:.1f}% -> {after['error_rate'] * 100:.1f}%")
+    if baseline["cpu_seconds"] is not None and candidate["cpu_seconds"] is not None:
+        print(f"  {'server CPU':<28}{baseline['cpu_seconds']:.1f}s -> {candidate['cpu_seconds']:.1f}s "
+              f"({change(baseline['cpu_seconds'], candidate['cpu_seconds'])})")
+
+
+async def replay_all(args: argparse.Namespace, records: Dict[str, List[Dict]]) -> None:
+    requests = records["request"]
+    captured = captured_latencies(records)
+    runs = []
+    for url in args.url:
+        print(f"\n🚀 Replaying at {args.speed}x against {url}")
+        runs.append(await replay(url, requests, args.speed, args.timeout))
+        print_run(runs[-1], captured)
+    if len(runs) == 2:
+        print_comparison(runs[0], runs[1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay captured traffic and compare builds")
+    parser.add_argument("archive", help="Archive written by the server with CAPTURE_TRAFFIC set")
+    parser.add_argument("--url", action="append", default=[],
+                        help="Target server; give two to compare a baseline (first) with a candidate")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up (2 = twice as fast)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--export-stub", metavar="DIR",
+                        help="Write recordings.jsonl and profile.json for provider_stub.py")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+    if len(args.url) > 2:
+        parser.error("give at most two --url targets")
+
+    capture_records = load_capture(args.archive)
+    print_capture_summary(capture_records)
+    if args.export_stub:
+        export_stub(capture_records, args.export_stub)
+    if args.url and capture_records["request"]:
+        asyncio.run(replay_all(args, capture_records))
@@ -1,24 +1,302 @@
-from fastapi import FastAPI, HTTPException, Request, Depends
+import time
+SERVER_IMPORT_STARTED = time.perf_counter()
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Depends, BackgroundTasks, Header
+from fastapi.responses import PlainTextResponse, Response
 # Assuming TextMessageData is in data_models.py (open on the right)
-from data_models import TextMessageData, ImageMessageData, TTSRequestData, AudioProcessData
+from data_models import TextMessageData, ImageMessageData, TTSRequestData, AudioProcessData, ProfileRequestData
 import uvicorn
-import time
-from typing import Dict, Tuple
+import os
+import uuid
+from typing import Dict, Tuple, Optional
 #from utils import * 
 #from utils import str_to_pic
-from utils.llm_communication import llm_communication
-from utils.object_detection import object_detection
-from services.text_to_speech import text_to_speech
+# llm_communication, object_detection and text_to_speech (openai, genai, torch, cv2) are
+# imported in the background by the lifespan hook so /health answers straight away
+from utils.single_flight import single_flight
+from utils.metrics import metrics, current_endpoint
+from utils.structured_logger import logger, current_request_id, current_session_id
+from utils.request_profiler import profiled, request_profiler
+from utils.startup_report import startup_report
+from utils.frame_rate_advisor import frame_rate_advisor
+from utils.object_tracker import tracker_registry
+from utils.priority_scheduler import priority_scheduler, job_shed, PRIORITY_CLASSES
+from utils.fair_queue import fair_queue, job_dropped
+from utils.debug_frame_recorder import debug_frame_recorder
+from utils.turn_deadline import turn_deadline, deadline_exceeded, current_deadline
+from utils.traffic_capture import capture, capture_middleware
+from utils.session_snapshot import session_snapshot
+from utils.expiry_wheel import expiry
+
+startup = startup_report()
+STARTUP_WAIT_SECONDS = 10  # How long a request waits for a subsystem that is still loading
+DETECTOR_MODEL = os.getenv("DETECTOR_MODEL", "yolov8n.pt")
+DETECTOR_BOX_COORDINATES = os.getenv("DETECTOR_BOX_COORDINATES", "original")  # or "normalized"
+DETECTOR_WORKERS = int(os.getenv("DETECTOR_WORKERS", "0"))  # >0 runs YOLO in that many worker processes
+DETECTION_CONCURRENCY = max(1, DETECTOR_WORKERS * 2)  # frames inferred at once (one in-process model)
+
+com = None
+tts_service = None
+detector = None
+
+def init_conversation():
+    global com
+    with startup.phase("conversation", "import"):
+        from utils.llm_communication import llm_communication
+    with startup.phase("conversation", "init"):
+        conversation = llm_communication()
+    with startup.phase("conversation", "restore"):
+        # Published only once restored, so a snapshot taken meanwhile can't overwrite the saved episode
+        restore_conversation(conversation)
+    com = conversation
+
+def init_tts():
+    global tts_service
+    with startup.phase("tts", "import"):
+        from services.text_to_speech import text_to_speech
+    with startup.phase("tts", "init"):
+        tts_service = text_to_speech()
+
+# Spoken fallbacks for turns that miss their deadline, rendered once both dependencies are up and
+# cached on disk under FALLBACK_AUDIO_CACHE_DIR so restarts don't render them again ("" turns the cache off)
+FALLBACK_AUDIO_CACHE_DIR = os.getenv("FALLBACK_AUDIO_CACHE_DIR", "fallback_audio")
+fallback_audio: Dict[str, str] = {}
+
+def init_fallback_audio():
+    if not (startup.wait_ready("conversation") and startup.wait_ready("tts")):
+        raise RuntimeError("conversation or tts failed to start")
+    with startup.phase("fallback_audio", "render"):
+        for text in com.all_fallback_replies():
+            audio = tts_service.cached_text_to_audio(text, FALLBACK_AUDIO_CACHE_DIR) if FALLBACK_AUDIO_CACHE_DIR \
+                else tts_service.text_to_audio(text)
+            if audio is not None:
+                fallback_audio[text] = audio
+
+def init_detector():
+    global detector
+    with startup.phase("detector", "import"):
+        from utils.object_detection import object_detection
+    with startup.phase("detector", "init"):
+        detector = object_detection(model_name=DETECTOR_MODEL, box_coordinates=DETECTOR_BOX_COORDINATES,
+                                    workers=DETECTOR_WORKERS)
+    with startup.phase("detector", "warmup"):
+        detector.warm_up()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.start_background("conversation", init_conversation)
+    startup.start_background("tts", init_tts)
+    startup.start_background("detector", init_detector)
+    startup.start_background("fallback_audio", init_fallback_audio)
+    snapshots = asyncio.create_task(snapshot_sessions_periodically()) if session_snapshots is not None else None
+    expiry_task = asyncio.create_task(expiry.run())  # every per-client TTL, off the request path
+    yield
+    expiry_task.cancel()
+    if snapshots is not None:
+        snapshots.cancel()
+        save_sessions(collect_session_changes())  # on shutdown and on every reload
+        session_snapshots.close()
+    if detector is not None and detector.pool is not None:
+        detector.pool.close()  # stops the workers and unlinks the shared-memory frame slots
+
+def requires(subsystem: str):
+    """Endpoint dependency that waits briefly for a subsystem, then answers 503."""
+    async def wait_until_ready():
+        if not await startup.wait_for(subsystem, STARTUP_WAIT_SECONDS):
+            raise HTTPException(status_code=503, detail=f"{subsystem} is still starting up",
+                                headers={"Retry-After": "2"})
+    return Depends(wait_until_ready)
+
+app = FastAPI(lifespan=lifespan)
+startup.record("server", "import", time.perf_counter() - SERVER_IMPORT_STARTED, SERVER_IMPORT_STARTED)
+
+# Opt-in capture of real sessions (CAPTURE_TRAFFIC=<archive path>) for replay_traffic.py; registered
+# first so it runs inside record_request_metrics and sees the request id
+CAPTURE_PATHS = ("/upload_image", "/upload_text", "/detection/image_qualities", "/start-new-anxiety")
+app.add_middleware(capture_middleware, capture=capture, paths=CAPTURE_PATHS,
+                   client_id=lambda scope: get_client_id(Request(scope)))
+
+def collect_capture_metrics():
+    for outcome, count in capture.stats.items():
+        metrics.set_counter("grounded_capture_records_total", count, outcome=outcome)
+
+metrics.describe("grounded_capture_records_total", "counter",
+                 "Traffic capture records written, or lost (dropped, over_quota, errors)")
+metrics.register_collector(collect_capture_metrics)
+
+def collect_process_metrics():
+    metrics.set_counter("grounded_process_cpu_seconds_total", time.process_time())
+
+metrics.describe("grounded_process_cpu_seconds_total", "counter", "CPU time of the server process, all threads")
+metrics.register_collector(collect_process_metrics)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Per-request wall time, tagged with endpoint, method and status.
+
+    No per-request CPU: requests interleave on the event loop and their heavy
+    work runs in worker threads and detector processes, so the loop thread's
+    CPU says little about one request. See grounded_span_cpu_seconds for the
+    CPU of individual steps and grounded_process_cpu_seconds_total overall.
+    """
+    endpoint = request.url.path
+    token = current_endpoint.set(endpoint)
+    request_token = current_request_id.set(request.headers.get("X-Request-ID") or uuid.uuid4().hex)
+    session_token = current_session_id.set(get_client_id(request))
+    wall_start = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        current_endpoint.reset(token)
+        current_request_id.reset(request_token)
+        current_session_id.reset(session_token)
+        labels = {"endpoint": endpoint, "method": request.method, "status": status}
+        metrics.observe("grounded_request_seconds", time.perf_counter() - wall_start, **labels)
+
+# On-demand profiling of selected requests; admin endpoints are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+profiler = request_profiler()
+
+@app.middleware("http")
+async def profile_selected_requests(request: Request, call_next):
+    if not profiler.enabled or not profiler.should_profile(request.url.path, request.headers):
+        return await call_next(request)
+    token = profiler.begin(request.url.path)
+    try:
+        return await call_next(request)
+    finally:
+        profiler.end(token)
+
+def admin_check(request: Request):
+    """Dependency guarding admin endpoints with the X-Admin-Token header."""
+    if not ADMIN_TOKEN or request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.post("/admin/profile/start", dependencies=[Depends(admin_check)])
+def start_profiling(data: ProfileRequestData):
+    """Profile the next N requests, optionally only on one endpoint or with a matching header."""
+    match_header = (data.match_header, data.match_value) if data.match_header else None
+    try:
+        profiler.start(requests=data.requests, mode=data.mode, match_header=match_header,
+                       endpoint=data.endpoint, sample_interval_ms=data.sample_interval_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "armed", "requests": data.requests, "mode": data.mode}
 
-app = FastAPI()
+@app.post("/admin/profile/stop", dependencies=[Depends(admin_check)])
+def stop_profiling():
+    profiler.stop()
+    return {"status": "stopped", "profiled_requests": profiler.profiled_requests}
+
+@app.get("/admin/profile/results", dependencies=[Depends(admin_check)])
+def profiling_results(format: str = "collapsed", endpoint: Optional[str] = None):
+    """Aggregated stacks as collapsed text (flamegraph.pl / speedscope input) or an SVG flamegraph."""
+    if format == "svg":
+        return Response(profiler.flamegraph_svg(endpoint), media_type="image/svg+xml")
+    return PlainTextResponse(profiler.collapsed(endpoint))
+
+@app.delete("/admin/profile/results", dependencies=[Depends(admin_check)])
+def clear_profiling_results():
+    profiler.reset()
+    return {"status": "cleared"}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Latency histograms and counters in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Per-session state survives restarts and reloads through a memory-mapped snapshot file, written
+# incrementally every SESSION_SNAPSHOT_SECONDS and on shutdown; SESSION_SNAPSHOT_PATH="" turns it off
+SESSION_SNAPSHOT_PATH = os.getenv("SESSION_SNAPSHOT_PATH", "session_snapshot.bin")
+SESSION_SNAPSHOT_SECONDS = float(os.getenv("SESSION_SNAPSHOT_SECONDS", "30"))
+session_snapshots = session_snapshot(SESSION_SNAPSHOT_PATH) if SESSION_SNAPSHOT_PATH else None
 
 # Rate limiting for upload_text endpoint
 # Track last request timestamps by client (using IP or session)
 last_request_times: Dict[str, float] = {}
+rate_limit_changes: set = set()  # clients whose entry changed since the last snapshot
 RATE_LIMIT_SECONDS = 5  # Minimum seconds between requests (adjust as needed)
+RATE_LIMIT_RETENTION_SECONDS = 10 * 60  # Entries are forgotten this long after a client's last turn
+
+def expire_rate_limits(client_ids: list):
+    """Drop entries of clients that have been quiet for the retention period (called by the expiry wheel)."""
+    for client_id in client_ids:
+        last_request_times.pop(client_id, None)
+        rate_limit_changes.add(client_id)
+
+rate_limit_expiry = expiry.group("rate_limit", expire_rate_limits, default_ttl=RATE_LIMIT_RETENTION_SECONDS)
+
+def collect_expiry_metrics():
+    for group in expiry.groups:
+        metrics.set_gauge("grounded_expiry_keys", len(group), group=group.name)
+        metrics.set_counter("grounded_expiry_expired_total", group.stats["expired"], group=group.name)
+
+metrics.describe("grounded_expiry_keys", "gauge", "Keys with a TTL on the expiry wheel, per structure")
+metrics.describe("grounded_expiry_expired_total", "counter", "Keys expired by the expiry wheel, per structure")
+metrics.register_collector(collect_expiry_metrics)
+
+# Idempotent /upload_text: retries with the same Idempotency-Key (per client) share one
+# in-flight turn and get its result from a short-lived cache instead of re-running LLM + TTS
+IDEMPOTENCY_TTL_SECONDS = 120
+upload_text_flights = single_flight(ttl_seconds=IDEMPOTENCY_TTL_SECONDS)
+
+def collect_idempotency_metrics():
+    for outcome, count in upload_text_flights.stats.items():
+        metrics.set_counter("grounded_upload_text_turns_total", count, outcome=outcome)
+
+metrics.describe("grounded_upload_text_turns_total", "counter",
+                 "/upload_text turns by outcome: executed, coalesced (in flight) or cache_hits (duplicate suppressed)")
+metrics.register_collector(collect_idempotency_metrics)
+
+def collect_logger_metrics():
+    for outcome, count in logger.stats.items():
+        metrics.set_counter("grounded_log_records_total", count, outcome=outcome)
+
+metrics.describe("grounded_log_records_total", "counter", "Structured log records written, dropped (buffer full) or sampled out")
+metrics.register_collector(collect_logger_metrics)
+
+# Adaptive frame-rate hints: detection responses tell each client when to send its next frame
+DETECTION_ENDPOINTS = ("/upload_image", "/detection/image_qualities")
+frame_pacing = frame_rate_advisor()
 
-# Cumulative object detection results - accumulates all objects seen over time
-cumulative_detected_objects: set = set()
+@app.middleware("http")
+async def track_detection_queue(request: Request, call_next):
+    """Detection requests accepted but not yet answered, i.e. the inference queue depth."""
+    if request.url.path not in DETECTION_ENDPOINTS:
+        return await call_next(request)
+    with frame_pacing.tracking():
+        return await call_next(request)
+
+def collect_frame_pacing_metrics():
+    metrics.set_gauge("grounded_detection_queue_depth", frame_pacing.in_flight)
+
+metrics.describe("grounded_detection_queue_depth", "gauge", "Detection requests queued or running")
+metrics.register_collector(collect_frame_pacing_metrics)
+
+def frame_hints(client_id: str, objects: Optional[list]) -> dict:
+    """Record the scene a client just sent (None if the frame was skipped) and advise when to send the next one."""
+    if objects is not None:
+        frame_pacing.observe(client_id, (obj.get("class_id") for obj in objects))
+    procedure = None
+    if com is not None:
+        procedure = com.current_procedure
+        if procedure == "grounding" and com.current_stage == 1:
+            procedure = "grounding_visual"
+    return frame_pacing.advise(client_id, procedure, inference_size=detector.inference_size)
+
+# Cumulative object detection results - accumulates objects seen over time, each forgotten
+# once it hasn't been detected for CUMULATIVE_OBJECTS_TTL_SECONDS
+CUMULATIVE_OBJECTS_TTL_SECONDS = float(os.getenv("CUMULATIVE_OBJECTS_TTL_SECONDS", "1800"))
+cumulative_detected_objects: set = set(session_snapshots.get("cumulative_objects", [])) if session_snapshots else set()
+cumulative_objects_expiry = expiry.group("cumulative_objects", cumulative_detected_objects.difference_update,
+                                         default_ttl=CUMULATIVE_OBJECTS_TTL_SECONDS)
+for restored_object in cumulative_detected_objects:
+    cumulative_objects_expiry.touch(restored_object)
 
 def get_client_id(request) -> str:
     """
@@ -37,9 +315,13 @@ def check_rate_limit(client_id: str) -> Tuple[bool, float]:
         (is_allowed, time_since_last_request)
     """
     current_time = time.time()
-    
-    # Clean up old entries (older than 10 minutes) to prevent memory leaks
-    cleanup_old_entries(current_time)
+
+    # A client first seen since a restart may have sent its last turn just before it
+    if client_id not in last_request_times and session_snapshots is not None:
+        restored = session_snapshots.get(f"rate_limit/{client_id}")
+        if restored is not None and current_time - restored < RATE_LIMIT_SECONDS:
+            last_request_times[client_id] = restored
+            rate_limit_expiry.touch(client_id)
     
     if client_id in last_request_times:
         time_since_last = current_time - last_request_times[client_id]
@@ -48,27 +330,26 @@ def check_rate_limit(client_id: str) -> Tuple[bool, float]:
     
     # Update timestamp
     last_request_times[client_id] = current_time
+    rate_limit_changes.add(client_id)
+    rate_limit_expiry.touch(client_id)
     return True, 0.0
 
-def cleanup_old_entries(current_time: float):
-    """
-    Remove entries older than 10 minutes to prevent memory leaks.
-    """
-    cutoff_time = current_time - (10 * 60)  # 10 minutes ago
-    old_keys = [key for key, timestamp in last_request_times.items() if timestamp < cutoff_time]
-    for key in old_keys:
-        del last_request_times[key]
-
 def rate_limit_check(request: Request):
     """
     Dependency function for rate limiting that can be injected into endpoints.
     """
     client_id = get_client_id(request)
+
+    # Retries of a turn that is in flight or cached don't count against the rate limit
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key and upload_text_flights.has((client_id, idempotency_key)):
+        return client_id
+
     is_allowed, time_since_last = check_rate_limit(client_id)
     
     if not is_allowed:
         remaining_time = RATE_LIMIT_SECONDS - time_since_last
-        print(f"Rate limit exceeded for client {client_id}. Please wait {remaining_time:.1f} seconds.")
+        logger.warning("rate_limit.exceeded", client_id=client_id, retry_after_seconds=round(remaining_time, 1))
         raise HTTPException(
             status_code=429, 
             detail=f"Rate limit exceeded. Please wait {remaining_time:.1f} seconds before making another request."
@@ -81,7 +362,11 @@ def health():
     """Simple endpoint to confirm the server is running."""
     return {"status": "ok"}
 
-detector = object_detection(model_name="yolov8n.pt")
+@app.get("/startup")
+def startup_status():
+    """Import/initialization time per subsystem and whether each is ready."""
+    return startup.report()
+
 frame_counter = 0
 
 def get_last_objects_identified():
@@ -93,30 +378,252 @@ def add_to_cumulative_objects(object_names: list):
     for obj_name in object_names:
         if obj_name and obj_name.strip():  # Only add non-empty strings
             cumulative_detected_objects.add(obj_name.strip().lower())
+            cumulative_objects_expiry.touch(obj_name.strip().lower())
 
 def get_cumulative_objects():
     """Get all objects that have been detected over time."""
     global cumulative_detected_objects
     return list(cumulative_detected_objects)
 
-@app.put("/detection/image_qualities")
-async def detect_object_data_from_photo(data: ImageMessageData):
+def restore_conversation(conversation) -> None:
+    state = session_snapshots.get("conversation") if session_snapshots is not None else None
+    if state is not None:
+        conversation.import_state(state)
+        logger.info("session.restored", procedure=conversation.current_procedure, stage=conversation.current_stage,
+                    turns=len(conversation.message_history))
+
+def collect_session_changes() -> dict:
+    """Session state to snapshot (on the event loop); unchanged values are skipped when written."""
+    changes = {"cumulative_objects": sorted(cumulative_detected_objects)}
+    if com is not None:
+        changes["conversation"] = com.export_state()
+    while rate_limit_changes:
+        client_id = rate_limit_changes.pop()
+        changes[f"rate_limit/{client_id}"] = last_request_times.get(client_id)  # None deletes expired entries
+    return changes
+
+rate_limits_pruned = False
+
+def save_sessions(changes: dict) -> None:
+    """Append changed session state to the snapshot file (blocking)."""
+    global rate_limits_pruned
+    start = time.perf_counter()
+    if not rate_limits_pruned:
+        # Entries from before the restart for clients that haven't come back
+        rate_limits_pruned = True
+        for key in session_snapshots.keys():
+            if key.startswith("rate_limit/") and key not in changes \
+                    and key[len("rate_limit/"):] not in last_request_times:
+                changes[key] = None
+    written = session_snapshots.write(changes)
+    metrics.observe("grounded_session_snapshot_seconds", time.perf_counter() - start)
+    logger.info("session.snapshot", values_written=written, entries=len(session_snapshots),
+                file_bytes=session_snapshots.size_bytes())
+
+async def snapshot_sessions_periodically():
+    while True:
+        await asyncio.sleep(SESSION_SNAPSHOT_SECONDS)
+        try:
+            await scheduler.run("background", save_sessions, collect_session_changes())
+        except Exception as e:
+            logger.error("session.snapshot_failed", error=str(e))
+
+def collect_session_snapshot_metrics():
+    if session_snapshots is None:
+        return
+    metrics.set_gauge("grounded_session_snapshot_entries", len(session_snapshots))
+    metrics.set_gauge("grounded_session_snapshot_bytes", session_snapshots.size_bytes())
+
+metrics.describe("grounded_session_snapshot_seconds", "histogram", "Time to append changed session state to the snapshot")
+metrics.describe("grounded_session_snapshot_entries", "gauge", "Keys in the session snapshot file")
+metrics.describe("grounded_session_snapshot_bytes", "gauge", "Size of the session snapshot file")
+metrics.register_collector(collect_session_snapshot_metrics)
+
+# Blocking work (LLM + TTS turns, YOLO, summaries) runs off the event loop in priority order:
+# interactive turns, then a session's first frame, then continuous frames, then background jobs.
+# One turn at a time, since every session shares the same conversation state.
+scheduler = priority_scheduler(
+    max_concurrency=int(os.getenv("SCHEDULER_CONCURRENCY", "4")),
+    reserved_interactive=1,
+    class_limits={"interactive": 1, "session_start": 1, "background": 1,
+                  "frames": DETECTION_CONCURRENCY},
+    max_wait_seconds={"frames": float(os.getenv("FRAME_MAX_QUEUE_SECONDS", "2.0"))},
+)
+
+def collect_scheduler_metrics():
+    for priority_class in PRIORITY_CLASSES:
+        metrics.set_gauge("grounded_scheduler_queued", scheduler.queued[priority_class], priority=priority_class)
+        metrics.set_gauge("grounded_scheduler_running", scheduler.running[priority_class], priority=priority_class)
+        for outcome, count in scheduler.stats[priority_class].items():
+            metrics.set_counter("grounded_scheduler_jobs_total", count, priority=priority_class, outcome=outcome)
+
+metrics.describe("grounded_scheduler_wait_seconds", "histogram", "Time jobs waited for a scheduler slot, by priority class")
+metrics.describe("grounded_scheduler_queued", "gauge", "Jobs waiting for a scheduler slot")
+metrics.describe("grounded_scheduler_running", "gauge", "Jobs holding a scheduler slot")
+metrics.describe("grounded_scheduler_jobs_total", "counter", "Scheduled jobs completed, or shed after waiting too long")
+metrics.register_collector(collect_scheduler_metrics)
+
+def parse_client_weights(spec: str) -> Dict[str, float]:
+    """"10.0.0.5=2,10.0.0.9=0.5" -> {"10.0.0.5": 2.0, "10.0.0.9": 0.5}"""
+    weights = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        client_id, _, weight = entry.partition("=")
+        weights[client_id.strip()] = float(weight)
+    return weights
+
+# Detection capacity is shared fairly across clients (weighted deficit round-robin), so one device
+# streaming at full rate can't starve other sessions; its surplus frames are dropped instead
+detection_queue = fair_queue(
+    capacity=DETECTION_CONCURRENCY,
+    weights=parse_client_weights(os.getenv("DETECTION_CLIENT_WEIGHTS", "")),
+    max_in_flight_per_client=int(os.getenv("DETECTION_MAX_IN_FLIGHT_PER_CLIENT", "1")),
+    max_queued_per_client=int(os.getenv("DETECTION_MAX_QUEUED_PER_CLIENT", "2")),
+)
+
+def collect_fair_queue_metrics():
+    for client_id, counts in detection_queue.stats().items():
+        metrics.set_counter("grounded_detection_client_frames_total", counts["served"], client=client_id, outcome="served")
+        metrics.set_counter("grounded_detection_client_frames_total", counts["dropped"], client=client_id, outcome="dropped")
+
+metrics.describe("grounded_detection_client_frames_total", "counter",
+                 "Detection jobs per client: served, or dropped for a newer frame while queued")
+metrics.register_collector(collect_fair_queue_metrics)
+
+# Sampled copies of received frames for debugging, with a disk quota; DEBUG_FRAMES=0 turns it off
+debug_frames = debug_frame_recorder(
+    directory=os.getenv("DEBUG_FRAMES_DIR", "debug_images"),
+    enabled=os.getenv("DEBUG_FRAMES", "1") == "1",
+    sample_rate=float(os.getenv("DEBUG_FRAMES_SAMPLE_RATE", "0.05")),
+    per_session_limit=int(os.getenv("DEBUG_FRAMES_PER_SESSION", "200")),
+    quota_bytes=int(float(os.getenv("DEBUG_FRAMES_QUOTA_MB", "500")) * 1024 * 1024),
+)
+
+def collect_debug_frame_metrics():
+    for outcome, count in debug_frames.stats.items():
+        metrics.set_counter("grounded_debug_frames_total", count, outcome=outcome)
+    metrics.set_gauge("grounded_debug_frames_disk_bytes", debug_frames.disk_usage_bytes())
+
+metrics.describe("grounded_debug_frames_total", "counter",
+                 "Debug frame captures: written, evicted, or not saved (dropped, sampled_out, session_limited, errors)")
+metrics.describe("grounded_debug_frames_disk_bytes", "gauge", "Disk used by saved debug frames")
+metrics.register_collector(collect_debug_frame_metrics)
+
+# Per-session tracking: full YOLO only on keyframes (every Nth frame, or when predictions get
+# unreliable); frames in between are answered from constant-velocity track predictions
+KEYFRAME_INTERVAL = int(os.getenv("DETECTION_KEYFRAME_INTERVAL", "5"))  # 1 = detect every frame
+trackers = tracker_registry(keyframe_interval=KEYFRAME_INTERVAL)
+
+def collect_tracking_metrics():
+    for kind, count in trackers.stats.items():
+        metrics.set_counter("grounded_detection_frames_total", count, kind=kind)
+
+metrics.describe("grounded_detection_frames_total", "counter",
+                 "Frames answered by full detection (keyframes) or from predicted tracks (predicted_frames)")
+metrics.register_collector(collect_tracking_metrics)
+
+def collect_detector_pool_metrics():
+    if detector is None or detector.pool is None:
+        return
+    for worker in detector.pool.stats():
+        labels = {"worker": str(worker["worker"])}
+        metrics.set_counter("grounded_detector_worker_jobs_total", worker["done"], outcome="done", **labels)
+        metrics.set_counter("grounded_detector_worker_jobs_total", worker["errors"], outcome="error", **labels)
+        metrics.set_counter("grounded_detector_worker_busy_seconds_total", worker["busy_seconds"], **labels)
+        metrics.set_counter("grounded_detector_worker_restarts_total", worker["restarts"], **labels)
+        metrics.set_gauge("grounded_detector_worker_in_flight", worker["in_flight"], **labels)
+        metrics.set_gauge("grounded_detector_worker_up", int(worker["alive"] and worker["ready"]), **labels)
+
+metrics.describe("grounded_detector_worker_jobs_total", "counter", "Frames processed per detector worker process")
+metrics.describe("grounded_detector_worker_busy_seconds_total", "counter", "Inference seconds per detector worker")
+metrics.describe("grounded_detector_worker_restarts_total", "counter", "Crashed or hung detector workers replaced")
+metrics.describe("grounded_detector_worker_in_flight", "gauge", "Frames queued on or running in each detector worker")
+metrics.describe("grounded_detector_worker_up", "gauge", "1 if the detector worker is alive and has its model loaded")
+metrics.register_collector(collect_detector_pool_metrics)
+
+@app.get("/detector/workers", dependencies=[requires("detector")])
+def detector_workers():
+    """Health of the detector worker processes (empty when inference runs in-process)."""
+    return detector.pool.stats() if detector.pool is not None else []
+
+# Blurry, dark or covered frames are answered without running the detector
+FRAME_QUALITY_GATE = os.getenv("FRAME_QUALITY_GATE", "1") == "1"
+
+def collect_frame_quality_metrics():
+    if detector is None:
+        return
+    for outcome, count in detector.quality_gate.stats.items():
+        if outcome != "accepted":
+            metrics.set_counter("grounded_frames_skipped_total", count, reason=outcome)
+
+metrics.describe("grounded_frames_skipped_total", "counter", "Frames that skipped inference, by quality gate reason")
+metrics.register_collector(collect_frame_quality_metrics)
+
+async def detect_frame(client_id: str, image_string: str, timestamp: float, start_time: float,
+                 assess_quality: bool = FRAME_QUALITY_GATE) -> dict:
+    """
+    Objects in a frame in Kori's format, each with a stable track_id.
+
+    With assess_quality the response also has the frame's "quality" metrics, and
+    frames failing the gate come back with no objects and "skipped": <reason>.
+    """
+    # Base64-decoded once, in a worker thread, and shared by the quality gate and inference
+    frame = detector.frame_buffers.frame(image_string)
+    try:
+        return await detect_decoded_frame(client_id, frame, timestamp, start_time, assess_quality)
+    finally:
+        frame.release()
+
+async def detect_decoded_frame(client_id: str, frame, timestamp: float, start_time: float,
+                               assess_quality: bool) -> dict:
+    quality = None
+    if assess_quality:
+        quality = await asyncio.to_thread(profiled, detector.assess_frame_quality, frame)
+        if not quality["acceptable"]:
+            return {"objects": [], "quality": quality, "skipped": quality["reason"]}
+
+    tracker = trackers.for_session(client_id)
+    if not tracker.needs_keyframe(timestamp):
+        trackers.stats["predicted_frames"] += 1
+        with metrics.span("postprocess"):
+            formatted_results = detector.format_objects_for_kori(tracker.predict(timestamp), frame_counter, start_time)
+        return {**formatted_results, "quality": quality} if quality else formatted_results
+
+    # A session's first frame is what its conversation starts from; later ones can wait
+    priority_class = "session_start" if tracker.frames_since_keyframe is None else "frames"
+    try:
+        results = await detection_queue.run(client_id, scheduler.run, priority_class, detector.detect, frame)
+    except job_shed:
+        return {"objects": [], "skipped": "overloaded"}
+    except job_dropped:
+        return {"objects": [], "skipped": "superseded"}
+    trackers.stats["keyframes"] += 1
+    with metrics.span("postprocess"):
+        detections = detector.detections_from_results(results[0], confidence_threshold=0.5)
+        tracked = tracker.update(detections, timestamp, frame_size=detector.frame_size(results[0]))
+        formatted_results = detector.format_objects_for_kori(tracked, frame_counter, start_time)
+    return {**formatted_results, "quality": quality} if quality else formatted_results
+
+@app.put("/detection/image_qualities", dependencies=[requires("detector")])
+async def detect_object_data_from_photo(data: ImageMessageData, request: Request):
     global frame_counter
     frame_counter +=1
     
     start_time = time.time()
     image_string = data.image
-    results = detector.apply_object_detection(image_string) 
-    formatted_results = detector.get_objects_from_results_for_kori(results[0], frame_counter,start_time,confidence_threshold= 0.5) 
+    # Always report the quality metrics this endpoint is named after
+    formatted_results = await detect_frame(get_client_id(request), image_string, data.timestamp, start_time,
+                                     assess_quality=True)
+    if "skipped" in formatted_results:
+        return {**formatted_results, **frame_hints(get_client_id(request), None)}
     detector.last_objects_identified = formatted_results
-    return formatted_results
+    return {**formatted_results, **frame_hints(get_client_id(request), formatted_results["objects"])}
     # Convert to Kori's desired format
     
     #file uploaded is an image
 
 
-@app.post("/upload_image")
-async def process_frame(data: ImageMessageData):
+@app.post("/upload_image", dependencies=[requires("detector")])
+async def process_frame(data: ImageMessageData, request: Request):
     #print("Raw data:", data.model_dump())
     #print("Raw data:", data.model_dump_json())
     global frame_counter
@@ -125,66 +632,104 @@ async def process_frame(data: ImageMessageData):
     start_time = time.time()
     image_string = data.image
     
-    # DEBUG: Save received image for inspection
-    try:
-        import base64
-        import os
-        from datetime import datetime
-        
-        # Create debug directory if it doesn't exist
-        debug_dir = "debug_images"
-        if not os.path.exists(debug_dir):
-            os.makedirs(debug_dir)
-        
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{debug_dir}/received_image_{frame_counter}_{timestamp}.jpg"
-        
-        # Decode and save the image
-        image_data = base64.b64decode(image_string)
-        with open(filename, 'wb') as f:
-            f.write(image_data)
-        
-        #print(f"DEBUG: Saved received image to {filename}")
-        #print(f"DEBUG: Image size: {len(image_data)} bytes")
-        
-    except Exception as e:
-        print(f"DEBUG: Failed to save image: {e}")
-        print(f"DEBUG: Image string length: {len(image_string)}")
-        print(f"DEBUG: Image string preview: {image_string[:100]}...")
+    # DEBUG: Save a sample of received images for inspection (written in the background)
+    with metrics.span("debug_save"):
+        debug_frames.record(get_client_id(request), frame_counter, image_string)
     
-    results = detector.apply_object_detection(image_string) 
-    formatted_results = detector.get_objects_from_results_for_kori(results[0], frame_counter,start_time,confidence_threshold= 0.5) 
+    formatted_results = await detect_frame(get_client_id(request), image_string, data.timestamp, start_time)
+    if "skipped" in formatted_results:
+        # Keep the last good scene for the conversation rather than an empty one
+        return {**formatted_results, **frame_hints(get_client_id(request), None)}
     if formatted_results is not None:
         detector.last_objects_identified = formatted_results
         
         # Extract object names and add to cumulative list
-        object_names = []
-        for obj in formatted_results:
-            if isinstance(obj, dict) and 'object' in obj:
-                object_names.append(obj['object'])
-            elif isinstance(obj, str):
-                object_names.append(obj)
+        object_names = [detector.coco_classes.get(obj["class_id"], "") for obj in formatted_results.get("objects", [])]
         
         # Add new objects to cumulative list
         add_to_cumulative_objects(object_names)
-        print(f"Cumulative objects so far: {get_cumulative_objects()}")
+        logger.info("frame.cumulative_objects", objects=get_cumulative_objects())
 
     end_time = time.time()
     #print("  zach's formatted restults: " +  str(formatted_results) + " and Took : " + str(end_time - start_time) + " seconds")
-    return formatted_results
-
-com = llm_communication()
-obj_detector = object_detection()
-tts_service = text_to_speech()
+    return {**formatted_results, **frame_hints(get_client_id(request), formatted_results["objects"])}
 
-@app.post("/start-new-anxiety")
+@app.post("/start-new-anxiety", dependencies=[requires("conversation")])
 def set_therapy_stage_to_zero():
     com.current_stage = 0
 
-@app.post("/upload_text") #FIXME we have client id and it doesn't get used.
-async def process_text(data: TextMessageData, client_id: str = Depends(rate_limit_check)):
-    
+@app.get("/idempotency/stats")
+def idempotency_stats():
+    """Counts of /upload_text turns executed vs. duplicates suppressed."""
+    return upload_text_flights.stats
+
+@app.post("/upload_text", dependencies=[requires("conversation"), requires("tts")]) #FIXME we have client id and it doesn't get used.
+async def process_text(data: TextMessageData, background_tasks: BackgroundTasks, client_id: str = Depends(rate_limit_check),
+                       idempotency_key: Optional[str] = Header(None)):
+    if idempotency_key:
+        return await upload_text_flights.run((client_id, idempotency_key),
+                                             lambda: respond_to_text(data, background_tasks))
+    return await respond_to_text(data, background_tasks)
+
+# Latency budget per turn (queueing + LLM + TTS); a request can set its own with latency_budget_ms
+TURN_LATENCY_BUDGET_MS = float(os.getenv("TURN_LATENCY_BUDGET_MS", "8000"))
+
+metrics.describe("grounded_turns_total", "counter", "/upload_text turns that met or missed their latency budget")
+metrics.describe("grounded_turn_deadline_misses_total", "counter",
+                 "Turns answered with a fallback, by the phase and provider that ran out the budget")
+
+async def respond_to_text(data: TextMessageData, background_tasks: BackgroundTasks):
+    deadline = turn_deadline((data.latency_budget_ms or TURN_LATENCY_BUDGET_MS) / 1000)
+    turn = asyncio.ensure_future(scheduler.run("interactive", reply_to_text, data, deadline))
+    try:
+        # shield: a late turn keeps its scheduler slot until it has rolled itself back
+        reply = await asyncio.wait_for(asyncio.shield(turn), timeout=max(deadline.remaining(), 0))
+        metrics.inc("grounded_turns_total", outcome="met")
+    except (asyncio.TimeoutError, deadline_exceeded):
+        turn.add_done_callback(lambda task: task.cancelled() or task.exception())  # retrieve the late error
+        reply = deadline_fallback(deadline)
+    # Fold turns that left the recent window into the rolling summary once the reply is sent
+    background_tasks.add_task(scheduler.run, "background", com.summarize_older_turns)
+    return reply
+
+def deadline_fallback(deadline: turn_deadline) -> dict:
+    """Pre-rendered reply for the step the user is on, for a turn that ran out of time."""
+    metrics.inc("grounded_turns_total", outcome="missed")
+    metrics.inc("grounded_turn_deadline_misses_total", phase=deadline.phase, provider=deadline.provider)
+    state = deadline.checkpoint or com.conversation_checkpoint()
+    message = com.fallback_reply(state["current_procedure"], state["current_stage"])
+    logger.warning("text.deadline_missed", phase=deadline.phase, provider=deadline.provider,
+                   budget_seconds=deadline.budget_seconds)
+    return {
+        "status": "success",
+        "message": message,
+        "audio_base64": fallback_audio.get(message),
+        "fallback": "deadline",
+    }
+
+def reply_to_text(data: TextMessageData, deadline: turn_deadline) -> dict:
+    """
+    Run one turn under its deadline (blocking; run through the scheduler).
+
+    If the budget runs out, the conversation is put back the way it was so
+    the fallback the user heard matches the step they are still on.
+    """
+    token = current_deadline.set(deadline)
+    deadline.checkpoint = com.conversation_checkpoint()
+    try:
+        deadline.enter("queue", "scheduler")  # nothing to do if the budget went on waiting for a slot
+        reply = compose_reply(data)
+        if deadline.expired():
+            raise deadline_exceeded(f"{deadline.phase} ({deadline.provider}) finished after the turn deadline")
+        return reply
+    except deadline_exceeded:
+        com.restore_checkpoint(deadline.checkpoint)
+        raise
+    finally:
+        current_deadline.reset(token)
+
+def compose_reply(data: TextMessageData) -> dict:
+    """LLM reply and its speech for one turn."""
     text = data.text
     heart_rate = data.heart_rate
     timestamp = data.timestamp
@@ -195,7 +740,6 @@ async def process_text(data: TextMessageData, client_id: str = Depends(rate_limi
 
     # Get all cumulative object detection results for grounding exercise
     od_object_names = get_cumulative_objects()
-    print(f"Using cumulative objects for grounding: {od_object_names}")
     
 
     #FIXME FIXME FIXME this is where we will call our direction function in llm comm
@@ -206,21 +750,18 @@ async def process_text(data: TextMessageData, client_id: str = Depends(rate_limi
     response = com.starting_point(text, timestamp, od_results=od_object_names)
 
 
-    print(f"input: {text}")
-    print(f"heart_rate: {heart_rate}")
-    print(f"RESPONSE: {response}")
-    
+    logger.info("text.turn", input=text, heart_rate=heart_rate, response=response,
+                grounding_objects=od_object_names)
+
     # Log conversation stats for monitoring
     #stats = com.get_conversation_stats()
     #print(f"Conversation stats: {stats}")
     
     # Convert LLM response to speech using TTS
     try:
-        print(f"Converting response to speech...")
         tts_result = tts_service.create_grounding_audio(response)
         
         if tts_result["success"]:
-            print(f"✅ TTS conversion successful!")
             #print(f"Voice used: {tts_result['voice_used']}")
             string_message = tts_result["audio_data"]
             #print(f"long string ass message: {string_message}")
@@ -230,7 +771,7 @@ async def process_text(data: TextMessageData, client_id: str = Depends(rate_limi
                 "audio_base64": tts_result["audio_data"]
             }
         else:
-            print(f"❌ TTS conversion failed: {tts_result['error']}")
+            logger.error("text.tts_failed", error=tts_result["error"])
             # Return text response even if TTS fails
             return {
                 "status": "success",
@@ -238,8 +779,10 @@ async def process_text(data: TextMessageData, client_id: str = Depends(rate_limi
                 "audio_base64": None
             }
         
+    except deadline_exceeded:
+        raise
     except Exception as e:
-        print(f"❌ TTS service error: {e}")
+        logger.error("text.tts_error", error=str(e))
         # Return text response even if TTS fails
         return {
             "status": "success",
@@ -252,4 +795,5 @@ async def process_text(data: TextMessageData, client_id: str = Depends(rate_limi
 # ----------------------------
 if __name__ == "__main__":
     # Note: 'server:app' tells uvicorn to look for the 'app' variable in 'server.py'
-    uvicorn.run("server:app", host="0.0.0.0", port=2419, reload=True)
+    # Auto-reload re-imports every heavy dependency on each change; opt in with RELOAD=1
+    uvicorn.run("server:app", host="0.0.0.0", port=2419, reload=os.getenv("RELOAD", "0") == "1")
@@ -1,16 +1,22 @@
 import os
 import base64
+import hashlib
 import io
+import time
 from typing import Optional
 from openai import OpenAI
 from dotenv import load_dotenv
+from utils.metrics import metrics
+from utils.structured_logger import logger
+from utils.turn_deadline import deadline_exceeded, provider_timeout, raise_if_expired
+from utils.traffic_capture import capture
 load_dotenv()
 class text_to_speech:
     def __init__(self):
         """
         Initialize the text-to-speech service using OpenAI's TTS API.
         """
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL"))
         
         # Available voices for grounding/calming speech
         self.available_voices = {
@@ -50,32 +56,66 @@ class text_to_speech:
             
             # Validate voice and format
             if voice not in self.available_voices:
-                print(f"Warning: Voice '{voice}' not available, using default")
+                logger.warning("tts.unknown_voice", voice=voice, using=self.default_voice)
                 voice = self.default_voice
             
             if format not in self.available_formats:
-                print(f"Warning: Format '{format}' not available, using default")
+                logger.warning("tts.unknown_format", format=format, using=self.default_format)
                 format = self.default_format
             
-            # Call OpenAI TTS API
-            response = self.client.audio.speech.create(
-                model="tts-1",  # or "tts-1-hd" for higher quality
-                voice=voice,
-                input=text,
-                response_format=format
-            )
-            
-            # Get audio data
-            audio_data = response.content
+            # Call OpenAI TTS API (within a turn, only for what is left of its latency budget)
+            timeout = provider_timeout("tts", "openai")
+            start_time = time.time()
+            with metrics.span("tts", provider="openai", model="tts-1"):
+                response = self.client.audio.speech.create(
+                    model="tts-1",  # or "tts-1-hd" for higher quality
+                    voice=voice,
+                    input=text,
+                    response_format=format,
+                    **({"timeout": timeout} if timeout is not None else {})
+                )
+                
+                # Get audio data
+                audio_data = response.content
+            # Only the timing is kept; replays get silent audio from provider_stub
+            capture.record_provider("openai_speech", None, time.time() - start_time, audio_bytes=len(audio_data))
             
             # Convert to base64
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+            with metrics.span("serialize"):
+                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
             
             return audio_base64
             
+        except deadline_exceeded:
+            raise  # the turn answers with its pre-rendered fallback instead
         except Exception as e:
-            print(f"Error in text-to-speech conversion: {e}")
+            raise_if_expired(e)
+            logger.error("tts.error", provider="openai", model="tts-1", error=str(e))
             return None
+
+    def cached_text_to_audio(self, text: str, cache_dir: str, voice: str = None) -> Optional[str]:
+        """
+        text_to_audio through an on-disk cache keyed by text, voice and format.
+
+        For fixed phrases rendered at every startup (e.g. deadline fallbacks),
+        so a restart doesn't pay for them again.
+        """
+        voice = voice if voice in self.available_voices else self.default_voice
+        key = hashlib.sha1(f"{voice}\0{self.default_format}\0{text}".encode()).hexdigest()
+        path = os.path.join(cache_dir, f"{key}.{self.default_format}")
+        if os.path.exists(path):
+            return self.file_to_base64(path)
+
+        audio_base64 = self.text_to_audio(text, voice=voice)
+        if audio_base64 is not None:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(path + ".tmp", "wb") as f:
+                    f.write(base64.b64decode(audio_base64))
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                logger.warning("tts.cache_write_failed", path=path, error=str(e))
+        return audio_base64
     
     def get_available_voices(self) -> dict:
         """
@@ -134,6 +174,8 @@ class text_to_speech:
                 "format": self.default_format
             }
             
+        except deadline_exceeded:
+            raise
         except Exception as e:
             return {
                 "success": False,
@@ -161,7 +203,7 @@ class text_to_speech:
             return audio_base64
             
         except Exception as e:
-            print(f"Error converting audio to base64: {e}")
+            logger.error("tts.encode_error", error=str(e))
             return None
     
     def file_to_base64(self, file_path: str) -> Optional[str]:
@@ -176,7 +218,7 @@ class text_to_speech:
         """
         try:
             if not os.path.exists(file_path):
-                print(f"Audio file not found: {file_path}")
+                logger.warning("tts.file_not_found", path=file_path)
                 return None
             
             # Read file as bytes
@@ -187,7 +229,7 @@ class text_to_speech:
             return self.audio_to_base64(audio_data)
             
         except Exception as e:
-            print(f"Error reading audio file: {e}")
+            logger.error("tts.file_error", path=file_path, error=str(e))
             return None
     
     def process_audio_pipeline(self, audio_input, is_file_path: bool = False) -> dict:
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test script for the timing-wheel expiry service.
+Drives the wheel with an explicit clock and checks that keys expire on
+time, that touching a key pushes its expiry back, and that long TTLs
+cascade down through the levels.
+"""
+
+import os
+import random
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import utils.expiry_wheel as expiry_module
+from utils.expiry_wheel import expiry_wheel
+
+clock = [1000.0]
+expiry_module.time.monotonic = lambda: clock[0]
+
+
+def make_wheel(**options):
+    expired = []
+    wheel = expiry_wheel(**options)
+    group = wheel.group("test", expired.extend)
+    return wheel, group, expired
+
+
+def test_expiry_and_touch():
+    print("⏱️  Testing Expiry Wheel")
+    print("=" * 50)
+
+    wheel, group, expired = make_wheel()
+    group.touch("a", 5)
+    group.touch("b", 10)
+    clock[0] += 4
+    wheel.advance()
+    assert expired == [], f"nothing is due yet: {expired}"
+    group.touch("a", 5)  # activity pushes it back
+    clock[0] += 2
+    wheel.advance()
+    assert expired == [], f"touched key expired early: {expired}"
+    clock[0] += 5
+    wheel.advance()
+    assert sorted(expired) == ["a", "b"], f"expected both keys expired, got {expired}"
+    assert len(group) == 0
+    print("  ✅ Keys expire on time; touching a key extends it")
+
+    group.touch("c", 3)
+    group.cancel("c")
+    clock[0] += 5
+    wheel.advance()
+    assert "c" not in expired, "cancelled key shouldn't be reported"
+    print("  ✅ Cancelled keys are not reported")
+
+
+def test_cascading_levels():
+    """Random TTLs on a tiny wheel (4 slots x 3 levels) so entries cascade and overflow."""
+    wheel, group, expired = make_wheel(slot_bits=2, levels=3)
+    random.seed(7)
+    deadlines = {}
+    for key in range(200):
+        ttl = random.uniform(0.5, 400)
+        deadlines[key] = clock[0] + ttl
+        group.touch(key, ttl)
+    while deadlines:
+        clock[0] += random.choice([0.3, 1.0, 2.5])
+        wheel.advance()
+        for key in expired:
+            assert deadlines[key] <= clock[0] < deadlines[key] + 3.5, f"key {key} expired at the wrong time"
+            del deadlines[key]
+        expired.clear()
+        late = [key for key, deadline in deadlines.items() if deadline < clock[0] - 1]
+        assert not late, f"keys missed their expiry: {late}"
+    print("  ✅ Long TTLs cascade through the levels and expire within a tick")
+
+
+if __name__ == "__main__":
+    test_expiry_and_touch()
+    test_cascading_levels()
+    print("\n🎉 Expiry wheel tests passed")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for the fair detection queue.
+Checks that a job cancelled while queued (a client disconnecting) is
+skipped when capacity frees up instead of breaking the release.
+"""
+
+import asyncio
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.fair_queue import fair_queue, job_dropped
+
+
+async def cancelled_while_queued():
+    queue = fair_queue(capacity=1)
+    release = asyncio.Event()
+
+    async def job(name):
+        if name == "first":
+            await release.wait()
+        return name
+
+    first = asyncio.create_task(queue.run("a", job, "first"))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(queue.run("b", job, "waiting"))
+    await asyncio.sleep(0)
+    assert queue.in_flight == 1 and queue.stats()["b"]["queued"] == 1
+
+    # Free capacity and cancel the queued job in the same iteration: the release runs first
+    release.set()
+    waiting.cancel()
+    assert await first == "first", "the running job should finish normally"
+    try:
+        await waiting
+    except asyncio.CancelledError:
+        pass
+    assert queue.in_flight == 0, f"cancelled job kept a slot: in_flight={queue.in_flight}"
+    assert await queue.run("c", job, "later") == "later", "later jobs should still get through"
+    print("  ✅ Cancelled queued job skipped; capacity released")
+
+
+async def superseded_after_cancel():
+    queue = fair_queue(capacity=1, max_queued_per_client=1)
+    release = asyncio.Event()
+
+    async def job(name):
+        await release.wait()
+        return name
+
+    running = asyncio.create_task(queue.run("a", job, "running"))
+    await asyncio.sleep(0)
+    cancelled = asyncio.create_task(queue.run("b", job, "cancelled"))
+    await asyncio.sleep(0)
+    release.set()
+    cancelled.cancel()  # its future is cancelled now; the task only wakes to remove it later
+    # Queue the newer job before that happens, so it supersedes the cancelled one
+    assert await queue.run("b", job, "newer") == "newer", "newer job should run, not be dropped"
+    assert await running == "running"
+    try:
+        await cancelled
+    except (asyncio.CancelledError, job_dropped):
+        pass
+    assert queue.in_flight == 0
+    print("  ✅ Superseding a cancelled job doesn't fail")
+
+
+if __name__ == "__main__":
+    print("⚖️  Testing Fair Queue")
+    print("=" * 50)
+    asyncio.run(cancelled_while_queued())
+    asyncio.run(superseded_after_cancel())
+    print("\n🎉 Fair queue tests passed")
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Test script for the adaptive frame-rate hints.
+Checks that each procedure the conversation can be in gets its pacing.
+"""
+
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.frame_rate_advisor import frame_rate_advisor
+
+
+def test_procedure_pacing():
+    print("🎞️  Testing Frame Rate Advisor")
+    print("=" * 50)
+
+    advisor = frame_rate_advisor(base_interval_ms=500, max_interval_ms=5000)
+    intervals = {procedure: advisor.advise("client", procedure)["next_frame_after_ms"]
+                 for procedure in ("grounding", "breathing", "video")}
+    assert intervals["grounding"] == 500, f"grounding should use the base rate: {intervals}"
+    assert intervals["breathing"] == 1500, f"breathing should slow frames down: {intervals}"
+    # llm_communication names the procedure "video"
+    assert intervals["video"] == 2000, f"video should slow frames down the most: {intervals}"
+    print(f"  ✅ Per-procedure intervals: {intervals}")
+
+
+if __name__ == "__main__":
+    test_procedure_pacing()
+    print("\n🎉 Frame rate advisor tests passed")
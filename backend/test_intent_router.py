@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for the compiled intent router used to switch procedures.
+Checks word-boundary matching and benchmarks routing against large keyword sets.
+"""
+
+import os
+import random
+import string
+import sys
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.intent_router import intent_router
+
+
+def test_intent_routing():
+    """Check routing decisions for the built-in intent table."""
+
+    print("🧭 Testing Intent Router")
+    print("=" * 50)
+
+    router = intent_router()
+    cases = [
+        ("Anchor, I can't breathe", "breathing"),
+        ("anchor I can’t breathe", "breathing"),
+        ("Anchor, can you play the video", "video"),
+        ("anchor help me calm   down", "grounding"),
+        ("Anchor I'm panicking and need air", "breathing"),  # breathing is registered first
+        ("Anchor, I'm sitting on a chair", ""),               # "air" inside "chair" is not a match
+        ("Anchor, the stairs and my hair", ""),
+        ("I can't breathe", ""),                              # no wake word
+    ]
+
+    for message, expected in cases:
+        routed = router.route(message)
+        status = "✅" if routed == expected else "❌"
+        print(f"  {status} {message!r} -> {routed!r}")
+        assert routed == expected
+
+
+def _random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+
+def benchmark_intent_routing(procedures: int = 200, synonyms: int = 100, messages: int = 2000):
+    """Compare the compiled router with per-procedure substring scans on a large table."""
+
+    print(f"\n⏱️  Benchmark: {procedures} procedures x {synonyms} synonyms, {messages} messages")
+    rng = random.Random(7)
+
+    intents = [
+        {"procedure": f"procedure_{i}", "keywords": [_random_word(rng) for _ in range(synonyms)]}
+        for i in range(procedures)
+    ]
+    vocabulary = [_random_word(rng) for _ in range(5000)]
+    all_keywords = [keyword for intent in intents for keyword in intent["keywords"]]
+    corpus = []
+    for _ in range(messages):
+        words = ["anchor"] + rng.sample(vocabulary, 20)
+        if rng.random() < 0.5:
+            words.append(rng.choice(all_keywords))
+        rng.shuffle(words)
+        corpus.append(" ".join(words))
+
+    start = time.perf_counter()
+    router = intent_router(intents=intents)
+    router.compile()
+    compile_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for message in corpus:
+        router.route(message)
+    compiled_seconds = time.perf_counter() - start
+
+    # The previous approach: one any(substring) scan per procedure
+    start = time.perf_counter()
+    for message in corpus:
+        lowered = message.lower()
+        if "anchor" in lowered:
+            for intent in intents:
+                if any(word in lowered for word in intent["keywords"]):
+                    break
+    naive_seconds = time.perf_counter() - start
+
+    print(f"  Compile once:        {compile_seconds * 1000:.1f} ms")
+    print(f"  Compiled router:     {compiled_seconds / messages * 1e6:.1f} µs/message")
+    print(f"  Substring scans:     {naive_seconds / messages * 1e6:.1f} µs/message")
+    print(f"  Speedup:             {naive_seconds / compiled_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    test_intent_routing()
+    benchmark_intent_routing()
+    benchmark_intent_routing(procedures=1000, synonyms=100, messages=500)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-session object tracker.
+Checks stable track IDs across keyframes, constant-velocity prediction
+between them, and when a full detection is requested.
+"""
+
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.object_tracker import object_tracker
+
+
+def detection(class_id, box, confidence=0.9):
+    return {"class_id": class_id, "box": box, "confidence": confidence}
+
+
+def test_track_ids_and_prediction():
+    """A moving cup and a still couch keep their IDs; predictions follow the cup."""
+
+    print("🎯 Testing Object Tracker")
+    print("=" * 50)
+
+    tracker = object_tracker(keyframe_interval=3)
+    first = tracker.update([detection(41, [100, 100, 150, 150]), detection(57, [300, 200, 600, 400])],
+                           timestamp=0.0, frame_size=(640, 480))
+    second = tracker.update([detection(57, [302, 201, 601, 401]), detection(41, [110, 100, 160, 150])],
+                            timestamp=0.5, frame_size=(640, 480))
+
+    ids_first = {obj["class_id"]: obj["track_id"] for obj in first}
+    ids_second = {obj["class_id"]: obj["track_id"] for obj in second}
+    assert ids_first == ids_second, f"track IDs changed: {ids_first} -> {ids_second}"
+    print(f"  ✅ Stable track IDs across keyframes: {ids_second}")
+
+    assert not tracker.needs_keyframe(0.6), "should predict right after a keyframe"
+    predicted = {obj["class_id"]: obj for obj in tracker.predict(0.6)}
+    cup_x1 = predicted[41]["box"][0]
+    assert 110 < cup_x1 < 115, f"cup should keep moving right, got x1={cup_x1:.1f}"
+    print(f"  ✅ Predicted cup x1 at t=0.6s: {cup_x1:.1f}")
+
+    tracker.predict(0.7)
+    assert tracker.needs_keyframe(0.8), "keyframe_interval=3 should force detection on the third frame"
+    print("  ✅ Keyframe forced every 3 frames")
+
+
+def test_keyframe_on_low_confidence():
+    """Stale or empty tracks ask for a full detection."""
+
+    tracker = object_tracker(keyframe_interval=10, confidence_half_life_seconds=0.5)
+    assert tracker.needs_keyframe(0.0), "first frame must be detected"
+    tracker.update([], timestamp=0.0)
+    assert tracker.needs_keyframe(0.1), "nothing tracked -> detect"
+    tracker.update([detection(56, [0, 0, 50, 50], confidence=0.6)], timestamp=0.2)
+    assert not tracker.needs_keyframe(0.3)
+    assert tracker.needs_keyframe(1.5), "confidence should have decayed below the threshold"
+    print("  ✅ Keyframes requested for empty scenes and decayed predictions")
+
+
+def test_missed_tracks_expire():
+    tracker = object_tracker(max_misses=1)
+    tracker.update([detection(41, [0, 0, 50, 50])], timestamp=0.0)
+    tracker.update([], timestamp=0.2)
+    assert tracker.predict(0.3) == [], "a track missed on the last keyframe shouldn't be drawn"
+    tracker.update([], timestamp=0.4)
+    assert tracker.tracks == [], "track should be dropped after max_misses"
+    print("  ✅ Unmatched tracks hidden, then dropped")
+
+
+if __name__ == "__main__":
+    test_track_ids_and_prediction()
+    test_keyframe_on_low_confidence()
+    test_missed_tracks_expire()
+    print("\n🎉 Tracker tests passed")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test script for /upload_text idempotency (single_flight).
+Checks that cancelling the first caller for a key (a client disconnecting)
+does not cancel the shared call for the callers coalesced behind it.
+"""
+
+import asyncio
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.single_flight import single_flight
+
+
+async def leader_cancelled():
+    flights = single_flight(ttl_seconds=60)
+    release = asyncio.Event()
+    calls = []
+
+    async def turn():
+        calls.append(1)
+        await release.wait()
+        return "reply"
+
+    leader = asyncio.create_task(flights.run("key", turn))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(flights.run("key", turn))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    try:
+        await leader
+    except asyncio.CancelledError:
+        pass
+    release.set()
+    assert await waiter == "reply", "coalesced caller should get the shared result"
+    assert await flights.run("key", turn) == "reply", "a retry should get the cached result"
+    assert len(calls) == 1, f"turn ran {len(calls)} times"
+    print("  ✅ Coalesced caller gets the result after the first caller is cancelled")
+
+
+async def failure_not_cached():
+    flights = single_flight(ttl_seconds=60)
+    outcomes = iter([RuntimeError("provider down"), "reply"])
+
+    async def turn():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    try:
+        await flights.run("key", turn)
+        assert False, "the failure should reach the caller"
+    except RuntimeError:
+        pass
+    assert not flights.has("key"), "a failed call should leave nothing in flight or cached"
+    assert await flights.run("key", turn) == "reply", "a retry should run the turn again"
+    print("  ✅ Failures are shared but not cached")
+
+
+if __name__ == "__main__":
+    print("🔁 Testing Single Flight")
+    print("=" * 50)
+    asyncio.run(leader_cancelled())
+    asyncio.run(failure_not_cached())
+    print("\n🎉 Single flight tests passed")
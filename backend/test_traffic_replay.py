@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test script for replaying captured provider responses.
+Plays a conversation against scripted replies, exports them the way
+replay_traffic.py does, then plays it again against provider_stub and
+checks that every turn gets the reply (and so the READY/HOLD decision and
+stage) it got the first time. Turns repeat and are short ("ok", "no"),
+and breathing prompts carry the earlier turns as history.
+"""
+
+import os
+import sys
+import tempfile
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import utils.llm_communication as llm_module
+from provider_stub import LATENCY_PROFILES, load_recordings, provider_stub
+from replay_traffic import export_stub
+from utils.llm_communication import llm_communication
+
+TURNS = ["I'm so anxious", "ok", "no", "ok", "I see a lamp and a book", "no", "ok",
+         "hey anchor, can we do breathing instead", "ok", "no", "ok", "nothing helps", "ok"]
+
+
+class fake_gemini:
+    """Stands in for genai.GenerativeModel, answering every prompt with reply(prompt)."""
+    reply = None
+
+    def __init__(self, model):
+        self.model = model
+
+    def generate_content(self, prompt, request_options=None):
+        return type("response", (), {"text": fake_gemini.reply(prompt)})()
+
+
+def play(reply):
+    """Run TURNS through a fresh session; returns (reply, procedure, stage) per turn."""
+    fake_gemini.reply = reply
+    session = llm_communication()
+    return [(session.starting_point(text), session.current_procedure, session.current_stage) for text in TURNS]
+
+
+def test_replay_reproduces_replies():
+    print("📼 Testing Traffic Replay")
+    print("=" * 50)
+    llm_module.genai.GenerativeModel = fake_gemini
+
+    # "Production": distinct replies, mixing HOLD and READY so stages depend on them
+    provider_records = []
+    current_turn = [None]
+
+    def scripted(prompt):
+        number = len(provider_records)
+        text = f"{'HOLD' if number % 3 == 1 else 'READY'}: scripted reply {number}"
+        provider_records.append({"kind": "provider", "request_id": current_turn[0], "provider": "gemini",
+                                 "text": text, "seconds": 0.2})
+        return text
+
+    captured = []
+    fake_gemini.reply = scripted
+    session = llm_communication()
+    for index, text in enumerate(TURNS):
+        current_turn[0] = f"turn-{index}"
+        captured.append((session.starting_point(text), session.current_procedure, session.current_stage))
+    assert any(procedure == "breathing" for _, procedure, _ in captured), "session should reach breathing"
+
+    requests = [{"kind": "request", "request_id": f"turn-{index}", "body": {"text": text}}
+                for index, text in enumerate(TURNS)]
+    with tempfile.TemporaryDirectory() as directory:
+        export_stub({"request": requests, "response": [], "provider": provider_records}, directory)
+        stub = provider_stub(LATENCY_PROFILES["instant"],
+                             recordings=load_recordings(os.path.join(directory, "recordings.jsonl")))
+
+    replayed = play(lambda prompt: stub.reply_text("gemini", prompt))
+    for index, (before, after) in enumerate(zip(captured, replayed)):
+        assert before == after, f"turn {index} ({TURNS[index]!r}) replayed differently: {before} -> {after}"
+    print(f"  ✅ {len(TURNS)} turns replayed with the captured replies, decisions and stages")
+
+
+if __name__ == "__main__":
+    test_replay_reproduces_replies()
+    print("\n🎉 Traffic replay tests passed")
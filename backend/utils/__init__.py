@@ -1,7 +1,16 @@
-from .llm_communication import llm_communication
-from .object_detection import object_detection
-
+# Heavy modules (openai, genai, ultralytics/torch, cv2) are only imported when first used,
+# so importing a light helper like utils.metrics doesn't pull them in.
 __all__ = [
     "llm_communication",
     "object_detection",
-]
\ No newline at end of file
+]
+
+def __getattr__(name):
+    if name == "llm_communication":
+        from .llm_communication import llm_communication as attribute
+    elif name == "object_detection":
+        from .object_detection import object_detection as attribute
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = attribute
+    return attribute
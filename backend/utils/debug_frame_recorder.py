@@ -0,0 +1,131 @@
+import atexit
+import binascii
+import os
+import queue
+import random
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Optional, Tuple
+
+
+class debug_frame_recorder:
+    def __init__(self, directory: str = "debug_images", enabled: bool = True, sample_rate: float = 0.05,
+                 per_session_limit: int = 200, quota_bytes: int = 500 * 1024 * 1024, max_queue: int = 32):
+        """
+        Saves a sample of received frames for inspection, on a background thread.
+
+        The request path only does a few counter checks and a non-blocking
+        enqueue; frames are dropped (and counted) when the queue is full.
+        Once the directory exceeds its quota the oldest files are deleted.
+
+        Args:
+            directory: Where frames are written as received_image_<n>_<timestamp>.jpg
+            enabled: Master switch; when False, record() returns immediately
+            sample_rate: Fraction of frames kept (0..1)
+            per_session_limit: Frames kept per session for the life of the process
+            quota_bytes: Total size of the directory before oldest-first eviction
+            max_queue: Frames waiting to be written before new ones are dropped
+        """
+        self.directory = directory
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.per_session_limit = per_session_limit
+        self.quota_bytes = quota_bytes
+        self._queue: "queue.Queue[Optional[Tuple[str, str]]]" = queue.Queue(maxsize=max_queue)
+        self._session_counts: Dict[str, int] = {}
+        self._files: Deque[Tuple[str, int]] = deque()  # (path, size), oldest first
+        self._total_bytes = 0
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.stats = {"written": 0, "evicted": 0, "dropped": 0, "sampled_out": 0, "session_limited": 0, "errors": 0}
+
+    def record(self, session_id: str, frame_number: int, image: str) -> bool:
+        """Queue a base64 frame for saving if it is sampled; never touches the disk. True if queued."""
+        if not self.enabled:
+            return False
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.stats["sampled_out"] += 1
+            return False
+        if self._session_counts.get(session_id, 0) >= self.per_session_limit:
+            self.stats["session_limited"] += 1
+            return False
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.directory, f"received_image_{frame_number}_{timestamp}.jpg")
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((path, image))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        self._session_counts[session_id] = self._session_counts.get(session_id, 0) + 1
+        return True
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer, name="debug-frame-recorder", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _scan_existing(self) -> None:
+        """Account for frames left by earlier runs so the quota covers them too."""
+        os.makedirs(self.directory, exist_ok=True)
+        existing = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.startswith("received_image_"):
+                stat = entry.stat()
+                existing.append((stat.st_mtime, entry.path, stat.st_size))
+        for _, path, size in sorted(existing):
+            self._files.append((path, size))
+            self._total_bytes += size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.quota_bytes and self._files:
+            path, size = self._files.popleft()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._total_bytes -= size
+            self.stats["evicted"] += 1
+
+    def _writer(self) -> None:
+        try:
+            self._scan_existing()
+        except OSError:
+            self.stats["errors"] += 1
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                path, image = item
+                if image[:10] in ("data:image", b"data:image"):
+                    image = image[image.index("," if isinstance(image, str) else b",") + 1:]
+                data = binascii.a2b_base64(image)
+                with open(path, "wb") as f:
+                    f.write(data)
+                self._files.append((path, len(data)))
+                self._total_bytes += len(data)
+                self.stats["written"] += 1
+                self._evict()
+            except (OSError, binascii.Error, ValueError):
+                self.stats["errors"] += 1
+            finally:
+                self._queue.task_done()
+
+    def disk_usage_bytes(self) -> int:
+        return self._total_bytes
+
+    def close(self) -> None:
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=1.0)
+        except queue.Full:
+            return
+        self._thread.join(timeout=2.0)
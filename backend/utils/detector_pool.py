@@ -0,0 +1,274 @@
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .structured_logger import logger
+
+# A job is re-run on another worker at most this many times if its worker dies mid-inference
+MAX_JOB_ATTEMPTS = 2
+
+
+def _worker_main(worker_id: int, model_name: str, inference_size: int, shm_name: str, slot_count: int,
+                 threads: int, requests, results, heartbeat) -> None:
+    """Worker process: one YOLO replica reading letterboxed frames out of shared-memory slots."""
+    import torch
+    from ultralytics import YOLO
+
+    torch.set_num_threads(threads)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray((slot_count, inference_size, inference_size, 3), dtype=np.uint8, buffer=shm.buf)
+    model = YOLO(model_name)
+    model(np.zeros((inference_size, inference_size, 3), dtype=np.uint8), imgsz=inference_size, verbose=False)
+    results.put(("ready", worker_id, None, model.names, 0.0))
+
+    while True:
+        heartbeat.value = time.time()
+        try:
+            job = requests.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        if job is None:
+            break
+        job_id, slot = job
+        heartbeat.value = time.time()
+        start = time.perf_counter()
+        try:
+            boxes = model(frames[slot], imgsz=inference_size, verbose=False)[0].boxes
+            # Compact N x 6 array: x1, y1, x2, y2, confidence, class
+            packed = np.concatenate([
+                boxes.xyxy.cpu().numpy(),
+                boxes.conf.cpu().numpy()[:, None],
+                boxes.cls.cpu().numpy()[:, None],
+            ], axis=1).astype(np.float32)
+            results.put(("done", worker_id, job_id, packed, time.perf_counter() - start))
+        except Exception as e:
+            results.put(("error", worker_id, job_id, str(e), time.perf_counter() - start))
+
+    del frames
+    shm.close()
+
+
+class pooled_boxes:
+    def __init__(self, packed: np.ndarray):
+        self.xyxy = packed[:, :4]
+        self.conf = packed[:, 4]
+        self.cls = packed[:, 5]
+
+
+class pooled_result:
+    """The parts of ultralytics Results that object_detection reads, rebuilt from a worker's array."""
+
+    def __init__(self, names: Dict[int, str], packed: np.ndarray, frame_geometry: Optional[Dict] = None):
+        self.names = names
+        self.boxes = pooled_boxes(packed)
+        self.frame_geometry = frame_geometry
+
+
+class detector_pool:
+    def __init__(self, model_name: str, workers: int = 2, inference_size: int = 640, slots_per_worker: int = 2,
+                 threads_per_worker: int = 1, health_check_seconds: float = 2.0, hung_after_seconds: float = 30.0):
+        """
+        YOLO replicas in worker processes, fed through shared-memory frame slots.
+
+        The API process letterboxes each frame straight into a free slot and
+        sends only (job id, slot index) to a worker; detections come back as a
+        small N x 6 float32 array. A monitor thread restarts workers that die
+        or stop heart-beating and re-queues the frames they were holding.
+
+        Args:
+            model_name: YOLO weights each worker loads
+            workers: Number of worker processes
+            inference_size: Side of the square letterboxed frames (fixes the slot size)
+            slots_per_worker: Frames that can be queued or in flight per worker
+            threads_per_worker: torch intra-op threads per worker (keep workers * threads <= cores)
+            health_check_seconds: How often the monitor checks the workers
+            hung_after_seconds: Restart a worker whose heartbeat is older than this
+        """
+        self.model_name = model_name
+        self.inference_size = inference_size
+        self.threads_per_worker = threads_per_worker
+        self.health_check_seconds = health_check_seconds
+        self.hung_after_seconds = hung_after_seconds
+        self.slot_count = workers * slots_per_worker
+        self.names: Dict[int, str] = {}
+
+        self._context = mp.get_context("spawn")  # torch is not fork-safe
+        slot_bytes = inference_size * inference_size * 3
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slot_count * slot_bytes)
+        self.frames = np.ndarray((self.slot_count, inference_size, inference_size, 3), dtype=np.uint8,
+                                 buffer=self._shm.buf)
+        self._free_slots: "queue.Queue[int]" = queue.Queue()
+        for slot in range(self.slot_count):
+            self._free_slots.put(slot)
+
+        self._results = self._context.Queue()
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+        # job id -> {"future", "slot", "worker", "attempts"}
+        self._pending: Dict[int, Dict] = {}
+        self._closed = False
+        self.workers: List[Dict] = [self._spawn(worker_id) for worker_id in range(workers)]
+
+        threading.Thread(target=self._collect_results, name="detector-pool-results", daemon=True).start()
+        threading.Thread(target=self._monitor, name="detector-pool-monitor", daemon=True).start()
+
+    # ------------------------
+    # Workers
+    # ------------------------
+    def _spawn(self, worker_id: int, restarts: int = 0) -> Dict:
+        requests = self._context.Queue()
+        heartbeat = self._context.Value("d", time.time(), lock=False)
+        process = self._context.Process(
+            target=_worker_main, name=f"detector-worker-{worker_id}", daemon=True,
+            args=(worker_id, self.model_name, self.inference_size, self._shm.name, self.slot_count,
+                  self.threads_per_worker, requests, self._results, heartbeat),
+        )
+        process.start()
+        return {"id": worker_id, "process": process, "requests": requests, "heartbeat": heartbeat,
+                "ready": False, "in_flight": set(), "restarts": restarts,
+                "stats": {"done": 0, "errors": 0, "busy_seconds": 0.0}}
+
+    def wait_ready(self, timeout: float = 120.0) -> bool:
+        """Block until every worker has loaded and warmed up its model."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if all(worker["ready"] for worker in self.workers):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def _monitor(self) -> None:
+        while not self._closed:
+            time.sleep(self.health_check_seconds)
+            for index, worker in enumerate(list(self.workers)):
+                if self._closed:
+                    return
+                alive = worker["process"].is_alive()
+                hung = alive and worker["ready"] and time.time() - worker["heartbeat"].value > self.hung_after_seconds
+                if alive and not hung:
+                    continue
+                logger.error("detector_pool.worker_restart", worker=worker["id"], hung=hung,
+                             exitcode=worker["process"].exitcode, in_flight=len(worker["in_flight"]))
+                if hung:
+                    worker["process"].kill()
+                replacement = self._spawn(worker["id"], restarts=worker["restarts"] + 1)
+                replacement["stats"] = worker["stats"]
+                with self._lock:
+                    self.workers[index] = replacement
+                    orphaned = list(worker["in_flight"])
+                for job_id in orphaned:
+                    self._requeue(job_id)
+
+    def _requeue(self, job_id: int) -> None:
+        with self._lock:
+            job = self._pending.get(job_id)
+            if job is None:
+                return
+            if job["attempts"] >= MAX_JOB_ATTEMPTS:
+                del self._pending[job_id]
+                failed = job
+            else:
+                failed = None
+                job["attempts"] += 1
+                self._dispatch(job_id, job)
+        if failed is not None:
+            self._free_slots.put(failed["slot"])
+            failed["future"].set_exception(RuntimeError("Detector worker crashed while processing this frame"))
+
+    # ------------------------
+    # Jobs
+    # ------------------------
+    def try_acquire_slot(self) -> Optional[int]:
+        try:
+            return self._free_slots.get_nowait()
+        except queue.Empty:
+            return None
+
+    def acquire_slot(self, timeout: float = None) -> int:
+        """A free frame slot; blocks while all slots are queued or in flight (back-pressure)."""
+        return self._free_slots.get(timeout=timeout)
+
+    def release_slot(self, slot: int) -> None:
+        self._free_slots.put(slot)
+
+    def submit(self, slot: int) -> Future:
+        """Run detection on the frame already written to self.frames[slot]; the slot is freed when it finishes."""
+        future: Future = Future()
+        job_id = next(self._job_ids)
+        with self._lock:
+            job = {"future": future, "slot": slot, "worker": None, "attempts": 1}
+            self._pending[job_id] = job
+            self._dispatch(job_id, job)
+        return future
+
+    def _dispatch(self, job_id: int, job: Dict) -> None:
+        """Send a job to the least-loaded worker (caller holds the lock)."""
+        worker = min(self.workers, key=lambda w: (not w["process"].is_alive(), len(w["in_flight"])))
+        job["worker"] = worker["id"]
+        worker["in_flight"].add(job_id)
+        worker["requests"].put((job_id, job["slot"]))
+
+    def _collect_results(self) -> None:
+        while not self._closed:
+            try:
+                kind, worker_id, job_id, payload, seconds = self._results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                worker = next((w for w in self.workers if w["id"] == worker_id), None)
+                if kind == "ready":
+                    self.names = payload
+                    if worker is not None:
+                        worker["ready"] = True
+                    continue
+                if worker is not None:
+                    worker["in_flight"].discard(job_id)
+                    worker["stats"]["done" if kind == "done" else "errors"] += 1
+                    worker["stats"]["busy_seconds"] += seconds
+                job = self._pending.pop(job_id, None)
+            if job is None:
+                continue  # already re-queued and answered elsewhere
+            self._free_slots.put(job["slot"])
+            if kind == "done":
+                job["future"].set_result(payload)
+            else:
+                job["future"].set_exception(RuntimeError(f"Detection failed in worker {worker_id}: {payload}"))
+
+    # ------------------------
+    # Reporting / shutdown
+    # ------------------------
+    def stats(self) -> List[Dict]:
+        """Per-worker health and throughput."""
+        now = time.time()
+        with self._lock:
+            return [{
+                "worker": worker["id"],
+                "pid": worker["process"].pid,
+                "alive": worker["process"].is_alive(),
+                "ready": worker["ready"],
+                "in_flight": len(worker["in_flight"]),
+                "restarts": worker["restarts"],
+                "heartbeat_age_seconds": round(now - worker["heartbeat"].value, 3),
+                **worker["stats"],
+            } for worker in self.workers]
+
+    def close(self) -> None:
+        self._closed = True
+        for worker in self.workers:
+            worker["requests"].put(None)
+        for worker in self.workers:
+            worker["process"].join(timeout=5)
+            if worker["process"].is_alive():
+                worker["process"].kill()
+        del self.frames
+        self._shm.close()
+        self._shm.unlink()
@@ -0,0 +1,150 @@
+import asyncio
+import math
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from .structured_logger import logger
+
+
+class expiry_group:
+    def __init__(self, wheel: "expiry_wheel", name: str, on_expire: Callable[[List[Hashable]], None],
+                 default_ttl: float):
+        """Keys of one structure on the shared wheel; on_expire gets each tick's expired keys as one list."""
+        self.wheel = wheel
+        self.name = name
+        self.on_expire = on_expire
+        self.default_ttl = default_ttl
+        self.entries: Dict[Hashable, List[float]] = {}  # key -> [deadline, tick it is filed under]
+        self.stats = {"expired": 0, "errors": 0}
+
+    def touch(self, key: Hashable, ttl: Optional[float] = None) -> None:
+        """Expire key ttl seconds from now (default_ttl if None), replacing any earlier expiry; O(1)."""
+        self.wheel._schedule(self, key, self.default_ttl if ttl is None else ttl)
+
+    def cancel(self, key: Hashable) -> None:
+        with self.wheel._lock:
+            self.entries.pop(key, None)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class expiry_wheel:
+    def __init__(self, tick_seconds: float = 1.0, slot_bits: int = 6, levels: int = 4):
+        """
+        Hierarchical timing wheel behind every per-client TTL in the backend.
+
+        Level 0 has one slot per tick; each level above has slots 2**slot_bits
+        times as wide, and its entries cascade down as their slot comes up,
+        so scheduling and expiring a key are O(1) whatever the number of
+        keys. With the defaults a TTL can be up to ~194 days; longer ones are
+        filed at the end of the wheel and re-filed when they get there.
+
+        Touching a key that is already filed only moves its deadline; when
+        the old slot comes up the key is re-filed instead of expired. A
+        client sending frames every 500 ms therefore costs one dict write per
+        frame and no wheel entries.
+
+        Nothing expires until run() is going (one task on the server's event
+        loop); expiry callbacks are called from that task, a batch per group
+        per tick, and must not block.
+
+        Args:
+            tick_seconds: Resolution of expiry
+            slot_bits: log2 of the slots per level
+            levels: Number of levels
+        """
+        self.tick_seconds = tick_seconds
+        self.slot_bits = slot_bits
+        self.slots = 1 << slot_bits
+        self.levels = levels
+        self.groups: List[expiry_group] = []
+        self._wheels: List[List[List[Tuple[expiry_group, Hashable, int]]]] = \
+            [[[] for _ in range(self.slots)] for _ in range(levels)]
+        self._tick = self._tick_of(time.monotonic())  # ticks up to and including this one are processed
+        self._lock = threading.Lock()  # keys are touched from worker threads too
+
+    def group(self, name: str, on_expire: Callable[[List[Hashable]], None], default_ttl: float = 600.0) -> expiry_group:
+        group = expiry_group(self, name, on_expire, default_ttl)
+        self.groups.append(group)
+        return group
+
+    def _tick_of(self, moment: float) -> int:
+        return math.floor(moment / self.tick_seconds)
+
+    def _schedule(self, group: expiry_group, key: Hashable, ttl: float) -> None:
+        deadline = time.monotonic() + ttl
+        with self._lock:
+            tick = min(max(math.ceil(deadline / self.tick_seconds), self._tick + 1), self._last_tick())
+            entry = group.entries.get(key)
+            if entry is not None and entry[1] <= tick:
+                entry[0] = deadline  # re-filed when its current slot comes up
+                return
+            group.entries[key] = [deadline, tick]
+            self._file(group, key, tick)
+
+    def _last_tick(self) -> int:
+        """Latest tick the wheel can hold right now: the end of the top level's current rotation."""
+        shift = (self.levels - 1) * self.slot_bits
+        return (((self._tick >> shift) + self.slots) << shift) - 1
+
+    def _file(self, group: expiry_group, key: Hashable, tick: int) -> None:
+        """Put an entry in the lowest level whose current rotation reaches tick (caller holds the lock)."""
+        for level in range(self.levels):
+            shift = level * self.slot_bits
+            if (tick >> shift) - (self._tick >> shift) < self.slots:
+                self._wheels[level][(tick >> shift) & (self.slots - 1)].append((group, key, tick))
+                return
+        raise ValueError(f"tick {tick} is beyond the wheel")  # _schedule clamps to the span
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """Process every tick up to now and call back with what expired; returns the number of keys expired."""
+        now = time.monotonic() if now is None else now
+        target = self._tick_of(now)
+        expired: Dict[expiry_group, List[Hashable]] = {}
+        with self._lock:
+            while self._tick < target:
+                self._tick += 1
+                # Cascade wider slots that start at this tick, top level first
+                for level in range(self.levels - 1, 0, -1):
+                    shift = level * self.slot_bits
+                    if self._tick & ((1 << shift) - 1) == 0:
+                        slot = (self._tick >> shift) & (self.slots - 1)
+                        entries, self._wheels[level][slot] = self._wheels[level][slot], []
+                        for group, key, tick in entries:
+                            self._file(group, key, tick)
+                slot = self._tick & (self.slots - 1)
+                due, self._wheels[0][slot] = self._wheels[0][slot], []
+                for group, key, tick in due:
+                    entry = group.entries.get(key)
+                    if entry is None or entry[1] != tick:
+                        continue  # cancelled, or re-filed earlier
+                    if entry[0] > now:
+                        entry[1] = min(math.ceil(entry[0] / self.tick_seconds), self._last_tick())
+                        self._file(group, key, entry[1])
+                        continue
+                    del group.entries[key]
+                    expired.setdefault(group, []).append(key)
+
+        for group, keys in expired.items():
+            group.stats["expired"] += len(keys)
+            try:
+                group.on_expire(keys)
+            except Exception as e:
+                group.stats["errors"] += 1
+                logger.error("expiry.callback_failed", group=group.name, keys=len(keys), error=str(e))
+        return sum(len(keys) for keys in expired.values())
+
+    async def run(self) -> None:
+        """Advance once per tick, forever; run as one background task."""
+        while True:
+            await asyncio.sleep(self.tick_seconds - time.monotonic() % self.tick_seconds)
+            self.advance()
+
+
+# Shared wheel for the whole backend; the server runs it from its lifespan
+expiry = expiry_wheel()
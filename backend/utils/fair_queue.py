@@ -0,0 +1,130 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+
+class job_dropped(Exception):
+    """A queued job was replaced by a newer one from the same client."""
+
+
+class fair_queue:
+    def __init__(self, capacity: int = 1, weights: Optional[Dict[str, float]] = None, default_weight: float = 1.0,
+                 max_in_flight_per_client: int = 1, max_queued_per_client: int = 2, idle_client_seconds: int = 600):
+        """
+        Weighted deficit round-robin across clients in front of a shared resource.
+
+        Each client gets its own queue; whenever capacity frees up, clients are
+        visited in turn and served in proportion to their weight, so a device
+        streaming at full rate only ever competes with its own frames. When a
+        client's queue is full its oldest job is dropped, since a newer frame
+        makes it stale.
+
+        Must be used from a single event loop.
+
+        Args:
+            capacity: Jobs let through at once across all clients
+            weights: client id -> weight (share of capacity relative to default_weight)
+            default_weight: Weight of clients not listed in weights
+            max_in_flight_per_client: Jobs one client may have running at once
+            max_queued_per_client: Jobs one client may have waiting; extra ones drop the oldest
+            idle_client_seconds: Forget counters of clients not seen for this long
+        """
+        self.capacity = capacity
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self.max_in_flight_per_client = max_in_flight_per_client
+        self.max_queued_per_client = max_queued_per_client
+        self.idle_client_seconds = idle_client_seconds
+        self.in_flight = 0
+        # client -> {"queue": deque of futures, "deficit", "in_flight", "served", "dropped", "seen"}
+        self.clients: Dict[str, Dict] = {}
+        self._active: Deque[str] = deque()  # clients with queued jobs, in round-robin order
+
+    def _client(self, client_id: str) -> Dict:
+        now = time.time()
+        state = self.clients.get(client_id)
+        if state is None:
+            cutoff = now - self.idle_client_seconds
+            for key in [key for key, idle in self.clients.items()
+                        if idle["seen"] < cutoff and not idle["queue"] and not idle["in_flight"]]:
+                del self.clients[key]
+            state = self.clients[client_id] = {"queue": deque(), "deficit": 0.0, "in_flight": 0,
+                                               "served": 0, "dropped": 0, "seen": now}
+        state["seen"] = now
+        return state
+
+    async def run(self, client_id: str, func: Callable, *args: Any) -> Any:
+        """Await func(*args) (a coroutine function) once this client's turn comes up."""
+        state = self._client(client_id)
+        granted = asyncio.get_running_loop().create_future()
+        self._discard_cancelled(state)
+        if len(state["queue"]) >= self.max_queued_per_client:
+            stale = state["queue"].popleft()
+            state["dropped"] += 1
+            stale.set_exception(job_dropped(f"Superseded by a newer job from {client_id}"))
+        state["queue"].append(granted)
+        if client_id not in self._active:
+            self._active.append(client_id)
+        self._dispatch()
+
+        try:
+            await granted
+        except asyncio.CancelledError:
+            if granted.done() and not granted.cancelled() and granted.exception() is None:
+                self._release(state)
+            elif granted in state["queue"]:
+                state["queue"].remove(granted)
+            raise
+        try:
+            return await func(*args)
+        finally:
+            state["served"] += 1
+            self._release(state)
+
+    def _release(self, state: Dict) -> None:
+        state["in_flight"] -= 1
+        self.in_flight -= 1
+        self._dispatch()
+
+    @staticmethod
+    def _discard_cancelled(state: Dict) -> None:
+        """Drop queued futures whose waiter was cancelled but hasn't woken up to remove them yet."""
+        if any(waiting.done() for waiting in state["queue"]):
+            state["queue"] = deque(waiting for waiting in state["queue"] if not waiting.done())
+
+    def _dispatch(self) -> None:
+        idle_visits = 0  # consecutive clients that couldn't be served; a full lap means stop
+        while self.in_flight < self.capacity and self._active and idle_visits < len(self._active):
+            client_id = self._active[0]
+            state = self.clients[client_id]
+            self._discard_cancelled(state)
+            if not state["queue"]:
+                self._active.popleft()
+                state["deficit"] = 0.0
+                continue
+            if state["in_flight"] >= self.max_in_flight_per_client:
+                self._active.rotate(-1)
+                idle_visits += 1
+                continue
+            if state["deficit"] < 1:
+                state["deficit"] += max(self.weights.get(client_id, self.default_weight), 0.01)
+                if state["deficit"] < 1:  # weights below 1 take several rounds to earn a job
+                    self._active.rotate(-1)
+                    continue
+            idle_visits = 0
+            state["deficit"] -= 1
+            state["in_flight"] += 1
+            self.in_flight += 1
+            state["queue"].popleft().set_result(None)
+            if not state["queue"]:
+                self._active.popleft()
+                state["deficit"] = 0.0
+            elif state["deficit"] < 1:
+                self._active.rotate(-1)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-client served / dropped / queued / in-flight counts."""
+        return {client_id: {"served": state["served"], "dropped": state["dropped"],
+                            "queued": len(state["queue"]), "in_flight": state["in_flight"]}
+                for client_id, state in self.clients.items()}
@@ -0,0 +1,258 @@
+import binascii
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+# Base64 is decoded in slices of this many characters (a multiple of 4), so only
+# a small temporary exists at a time instead of a full-size bytes copy of the frame
+BASE64_CHUNK_CHARS = 64 * 1024
+
+# Grey used by YOLO for letterbox padding
+LETTERBOX_FILL = 114
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, arithmetic) that carry the dimensions
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+_REDUCED_GRAYSCALE_FLAGS = ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                            (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
+
+
+def _capacity_for(size: int) -> int:
+    """Round up to a power of two (min 64 KiB) so similar frame sizes share buffers."""
+    capacity = 64 * 1024
+    while capacity < size:
+        capacity *= 2
+    return capacity
+
+
+def image_dimensions(data, length: int) -> Optional[Tuple[int, int]]:
+    """(width, height) from a JPEG or PNG header without decoding it, or None if unknown."""
+    if length >= 24 and bytes(data[:8]) == b"\x89PNG\r\n\x1a\n":
+        return int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big")
+    if length < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 < length:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            return int.from_bytes(data[i + 7:i + 9], "big"), int.from_bytes(data[i + 5:i + 7], "big")
+        if marker == 0xD8 or 0xD0 <= marker <= 0xD7:  # markers without a length
+            i += 2
+            continue
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+class pending_frame:
+    def __init__(self, pool: "frame_buffer_pool", image: Union[str, bytes]):
+        """
+        An uploaded base64 frame, decoded into a pooled buffer the first time it is used.
+
+        Lets the quality gate and inference share one base64 decode, in
+        whichever worker thread gets to it first. Call release() once every
+        user is done with it.
+        """
+        self.pool = pool
+        self.image = image
+        self.buffer: Optional[bytearray] = None
+        self.length = 0
+
+    def decoded(self) -> Tuple[bytearray, int]:
+        if self.buffer is None:
+            self.buffer, self.length = self.pool.decode_base64(self.image)
+        return self.buffer, self.length
+
+    def release(self) -> None:
+        if self.buffer is not None:
+            self.pool.release_bytes(self.buffer)
+            self.buffer = None
+
+
+class frame_buffer_pool:
+    def __init__(self, max_buffers_per_size: int = 8):
+        """
+        Reusable buffers for frame ingestion.
+
+        Args:
+            max_buffers_per_size: Idle buffers kept per size class; extra ones are freed
+        """
+        self.max_buffers_per_size = max_buffers_per_size
+        self._byte_buffers: Dict[int, List[bytearray]] = {}
+        self._arrays: Dict[Tuple[int, ...], List[np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"byte_hits": 0, "byte_misses": 0, "array_hits": 0, "array_misses": 0}
+
+    # ------------------------
+    # Pooled storage
+    # ------------------------
+    def acquire_bytes(self, size: int) -> bytearray:
+        capacity = _capacity_for(size)
+        with self._lock:
+            free = self._byte_buffers.get(capacity)
+            if free:
+                self.stats["byte_hits"] += 1
+                return free.pop()
+            self.stats["byte_misses"] += 1
+        return bytearray(capacity)
+
+    def release_bytes(self, buffer: bytearray) -> None:
+        with self._lock:
+            free = self._byte_buffers.setdefault(len(buffer), [])
+            if len(free) < self.max_buffers_per_size:
+                free.append(buffer)
+
+    def acquire_array(self, shape: Tuple[int, ...]) -> np.ndarray:
+        with self._lock:
+            free = self._arrays.get(shape)
+            if free:
+                self.stats["array_hits"] += 1
+                return free.pop()
+            self.stats["array_misses"] += 1
+        return np.empty(shape, dtype=np.uint8)
+
+    def release_array(self, array: np.ndarray) -> None:
+        with self._lock:
+            free = self._arrays.setdefault(array.shape, [])
+            if len(free) < self.max_buffers_per_size:
+                free.append(array)
+
+    # ------------------------
+    # Ingestion
+    # ------------------------
+    def decode_base64(self, image: Union[str, bytes]) -> Tuple[bytearray, int]:
+        """
+        Decode a (possibly data-URL prefixed) base64 frame into a pooled buffer.
+
+        Returns:
+            (buffer, number of valid bytes); release the buffer with release_bytes
+        """
+        start = 0
+        prefix = "data:image" if isinstance(image, str) else b"data:image"
+        if image.startswith(prefix):
+            start = image.index("," if isinstance(image, str) else b",") + 1
+
+        whitespace = (" ", "\n", "\r") if isinstance(image, str) else (b" ", b"\n", b"\r")
+        if any(char in image for char in whitespace):
+            # Wrapped base64 can't be split on 4-character boundaries; decode in one go
+            decoded = binascii.a2b_base64(image[start:])
+            buffer = self.acquire_bytes(len(decoded))
+            buffer[:len(decoded)] = decoded
+            return buffer, len(decoded)
+
+        end = len(image)
+        buffer = self.acquire_bytes((end - start) // 4 * 3 + 3)
+        view = memoryview(buffer)
+        length = 0
+        for offset in range(start, end, BASE64_CHUNK_CHARS):
+            piece = image[offset:offset + BASE64_CHUNK_CHARS]
+            if offset + BASE64_CHUNK_CHARS >= end and len(piece) % 4:
+                # Some encoders drop the trailing padding
+                piece += ("=" if isinstance(piece, str) else b"=") * (4 - len(piece) % 4)
+            chunk = binascii.a2b_base64(piece)
+            view[length:length + len(chunk)] = chunk
+            length += len(chunk)
+        view.release()
+        return buffer, length
+
+    def frame(self, image: Union[str, bytes]) -> pending_frame:
+        """Wrap an upload so every decode below shares one base64 decode (see pending_frame)."""
+        return pending_frame(self, image)
+
+    def decode_frame(self, image: Union[str, bytes, pending_frame], target_size: int = None) -> np.ndarray:
+        """
+        Decode a base64 JPEG/PNG frame to a BGR ndarray without touching disk.
+
+        OpenCV reads the JPEG straight out of the pooled buffer through a
+        zero-copy view; the byte buffer goes back to the pool as soon as the
+        image is decoded.
+
+        Args:
+            image: Base64 frame, optionally data-URL prefixed
+            target_size: If set and the source is at least twice this size on its
+                long side, let libjpeg decode at 1/2, 1/4 or 1/8 scale (never below target_size)
+        """
+        frame, _ = self._decode(image, target_size)
+        return frame
+
+    def decode_thumbnail(self, image: Union[str, bytes, pending_frame], side: int = 160) -> np.ndarray:
+        """A grayscale copy no larger than side on its long edge, decoded at up to 1/8 scale."""
+        gray, _ = self._decode(image, target_size=side, grayscale=True)
+        height, width = gray.shape[:2]
+        if max(height, width) > side:
+            scale = side / max(height, width)
+            gray = cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))),
+                              interpolation=cv2.INTER_AREA)
+        return gray
+
+    def _decode(self, image: Union[str, bytes, pending_frame], target_size: int = None,
+                grayscale: bool = False) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """Decoded frame and the (width, height) of the full-resolution source."""
+        shared = isinstance(image, pending_frame)
+        buffer, length = image.decoded() if shared else self.decode_base64(image)
+        try:
+            dimensions = image_dimensions(buffer, length)
+            flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+            if target_size and dimensions:
+                for factor, reduced_flag in _REDUCED_GRAYSCALE_FLAGS if grayscale else _REDUCED_FLAGS:
+                    if max(dimensions) // factor >= target_size:
+                        flags = reduced_flag
+                        break
+            encoded = np.frombuffer(buffer, dtype=np.uint8, count=length)
+            frame = cv2.imdecode(encoded, flags)
+            del encoded
+        finally:
+            if not shared:  # a pending_frame keeps its bytes until its owner releases it
+                self.release_bytes(buffer)
+        if frame is None:
+            raise ValueError("Could not decode image data")
+        height, width = frame.shape[:2]
+        if dimensions is None:
+            dimensions = (width, height)
+        elif (width > height) != (dimensions[0] > dimensions[1]):
+            # EXIF orientation was applied while decoding
+            dimensions = (dimensions[1], dimensions[0])
+        return frame, dimensions
+
+    def decode_letterboxed(self, image: Union[str, bytes, pending_frame], size: int,
+                           out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, Dict[str, float]]:
+        """
+        Decode a frame straight to a size x size letterboxed array for the detector.
+
+        The returned array is pooled: hand it back with release_array once
+        inference is done. The geometry maps detector coordinates back onto
+        the original frame: x_original = (x - pad_x) * scale_x.
+
+        Args:
+            out: A size x size x 3 uint8 array to letterbox into instead of a
+                pooled one (e.g. a shared-memory slot); not to be released here
+        """
+        frame, (original_width, original_height) = self._decode(image, target_size=size)
+        height, width = frame.shape[:2]
+        scale = min(size / width, size / height)
+        new_width, new_height = max(1, round(width * scale)), max(1, round(height * scale))
+        pad_x, pad_y = (size - new_width) // 2, (size - new_height) // 2
+
+        canvas = self.acquire_array((size, size, 3)) if out is None else out
+        canvas.fill(LETTERBOX_FILL)
+        if (new_width, new_height) == (width, height):
+            canvas[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = frame
+        else:
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+            canvas[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = cv2.resize(
+                frame, (new_width, new_height), interpolation=interpolation)
+        geometry = {
+            "width": original_width,
+            "height": original_height,
+            "pad_x": pad_x,
+            "pad_y": pad_y,
+            "scale_x": original_width / new_width,
+            "scale_y": original_height / new_height,
+        }
+        return canvas, geometry
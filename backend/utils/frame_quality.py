@@ -0,0 +1,69 @@
+from typing import Any, Dict
+
+import cv2
+import numpy as np
+
+# Side of the square grid used to find flat (covered) regions
+OCCLUSION_GRID = 4
+
+
+class frame_quality_gate:
+    def __init__(self, blur_threshold: float = 25.0, dark_mean_threshold: float = 30.0,
+                 dark_p95_threshold: float = 70.0, flat_block_std: float = 6.0, occluded_fraction: float = 0.75):
+        """
+        Cheap blur / darkness / occlusion checks on a small grayscale thumbnail,
+        run before paying for a YOLO inference.
+
+        Thresholds apply to a ~160 px thumbnail (see frame_buffer_pool.decode_thumbnail),
+        where Laplacian variance is lower than at full resolution.
+
+        Args:
+            blur_threshold: Laplacian variance below which a frame counts as motion-blurred
+            dark_mean_threshold: Mean luminance (0-255) below which a frame may be too dark...
+            dark_p95_threshold: ...if its 95th percentile is also below this (no bright regions)
+            flat_block_std: Grid cells with a luminance std dev below this count as flat
+            occluded_fraction: Share of flat cells at which the lens is considered covered
+        """
+        self.blur_threshold = blur_threshold
+        self.dark_mean_threshold = dark_mean_threshold
+        self.dark_p95_threshold = dark_p95_threshold
+        self.flat_block_std = flat_block_std
+        self.occluded_fraction = occluded_fraction
+        self.stats: Dict[str, int] = {"accepted": 0, "too_dark": 0, "occluded": 0, "too_blurry": 0}
+
+    def assess(self, gray: np.ndarray) -> Dict[str, Any]:
+        """
+        Quality metrics for a grayscale thumbnail.
+
+        Returns:
+            blur_variance, mean_luminance, p95_luminance, flat_fraction,
+            acceptable and reason ("too_dark", "occluded", "too_blurry" or None)
+        """
+        blur_variance = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        mean_luminance = float(gray.mean())
+        p95_luminance = float(np.percentile(gray, 95))
+
+        height, width = gray.shape[:2]
+        cell_height, cell_width = max(1, height // OCCLUSION_GRID), max(1, width // OCCLUSION_GRID)
+        cells = gray[:cell_height * OCCLUSION_GRID, :cell_width * OCCLUSION_GRID].reshape(
+            OCCLUSION_GRID, cell_height, OCCLUSION_GRID, cell_width)
+        flat_fraction = float((cells.std(axis=(1, 3)) < self.flat_block_std).mean())
+
+        # Darkness first: a dark frame is also flat and blurry, and "too dark" is the useful reason
+        reason = None
+        if mean_luminance < self.dark_mean_threshold and p95_luminance < self.dark_p95_threshold:
+            reason = "too_dark"
+        elif flat_fraction >= self.occluded_fraction:
+            reason = "occluded"
+        elif blur_variance < self.blur_threshold:
+            reason = "too_blurry"
+        self.stats[reason or "accepted"] += 1
+
+        return {
+            "blur_variance": round(blur_variance, 2),
+            "mean_luminance": round(mean_luminance, 2),
+            "p95_luminance": round(p95_luminance, 2),
+            "flat_fraction": round(flat_fraction, 3),
+            "acceptable": reason is None,
+            "reason": reason,
+        }
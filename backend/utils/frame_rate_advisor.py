@@ -0,0 +1,105 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+from .expiry_wheel import expiry
+
+# How much faster (<1) or slower (>1) than the base rate each part of a session wants frames
+PROCEDURE_PACING = {
+    "grounding_visual": 0.5,  # "5 things you can see": the scene is the conversation
+    "grounding": 1.0,
+    "breathing": 3.0,
+    "video": 4.0,
+}
+
+
+class frame_rate_advisor:
+    def __init__(self, base_interval_ms: int = 500, min_interval_ms: int = 200, max_interval_ms: int = 5000,
+                 saturation_depth: int = 4, stability_alpha: float = 0.3, session_ttl_seconds: int = 600):
+        """
+        Suggests when each client should send its next frame, and at what quality.
+
+        Args:
+            base_interval_ms: Interval for an idle server and a changing scene
+            min_interval_ms / max_interval_ms: Bounds on the suggested interval
+            saturation_depth: Detection requests in flight at which the server counts as saturated
+            stability_alpha: Smoothing of the per-session scene stability (higher reacts faster)
+            session_ttl_seconds: Forget sessions that haven't sent a frame for this long
+        """
+        self.base_interval_ms = base_interval_ms
+        self.min_interval_ms = min_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.saturation_depth = saturation_depth
+        self.stability_alpha = stability_alpha
+        self.session_ttl_seconds = session_ttl_seconds
+        self.in_flight = 0
+        # session -> {"labels": set of class names, "stability": 0..1, "seen": timestamp}
+        self.sessions: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._expiry = expiry.group("frame_pacing", self._forget_sessions, default_ttl=session_ttl_seconds)
+
+    @contextmanager
+    def tracking(self):
+        """Count a detection request as queued or running for as long as the block lasts."""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def observe(self, session_id: str, labels: Iterable[str]) -> float:
+        """Record the classes seen in a session's latest frame; returns its smoothed stability."""
+        labels = set(labels)
+        now = time.time()
+        self._expiry.touch(session_id)
+        with self._lock:
+            state = self.sessions.get(session_id)
+            if state is None:
+                self.sessions[session_id] = {"labels": labels, "stability": 0.0, "seen": now}
+                return 0.0
+            union = state["labels"] | labels
+            # Jaccard similarity of consecutive frames; an empty scene staying empty is stable
+            similarity = len(state["labels"] & labels) / len(union) if union else 1.0
+            state["stability"] += self.stability_alpha * (similarity - state["stability"])
+            state["labels"] = labels
+            state["seen"] = now
+            return state["stability"]
+
+    def _forget_sessions(self, session_ids: List[str]) -> None:
+        """Sessions that haven't sent a frame for session_ttl_seconds (called by the expiry wheel)."""
+        with self._lock:
+            for session_id in session_ids:
+                self.sessions.pop(session_id, None)
+
+    def advise(self, session_id: str, procedure: Optional[str] = None, inference_size: int = 640) -> Dict:
+        """
+        Hints for the client's next frame.
+
+        Returns:
+            next_frame_after_ms, preferred_jpeg_quality and preferred_resolution ("WxH", 4:3)
+        """
+        with self._lock:
+            queued = max(0, self.in_flight - 1)  # other detection requests besides this one
+            state = self.sessions.get(session_id)
+            stability = state["stability"] if state else 0.0
+        load = min(queued / self.saturation_depth, 2.0)
+
+        interval = self.base_interval_ms * PROCEDURE_PACING.get(procedure, 1.0)
+        interval *= 1 + 2 * stability  # a settled scene needs fewer looks
+        interval *= 1 + 3 * load  # back off hard as the detector queue grows
+        interval = int(min(max(interval, self.min_interval_ms), self.max_interval_ms))
+
+        width = inference_size or 640
+        quality = 80
+        if load >= 1:
+            width, quality = min(width, 480), 60
+        elif load >= 0.5:
+            quality = 70
+        return {
+            "next_frame_after_ms": interval,
+            "preferred_jpeg_quality": quality,
+            "preferred_resolution": f"{width}x{width * 3 // 4}",
+        }
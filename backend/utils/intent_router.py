@@ -0,0 +1,124 @@
+import re
+from typing import Dict, Iterable, List, Optional
+
+# Procedures the user can switch into by voice, in priority order (first match wins).
+# Keywords are whole words/phrases; "can't" also matches the curly-apostrophe spelling.
+PROCEDURE_INTENTS = [
+    {
+        "procedure": "breathing",
+        "keywords": ["breath", "breaths", "breathe", "breathing", "breathless", "hyperventilating",
+                     "inhale", "inhaling", "exhale", "exhaling", "lungs", "can't breathe", "hard to breathe",
+                     "catch my breath", "air", "oxygen"],
+    },
+    {
+        "procedure": "video",
+        "keywords": ["video"],
+    },
+    {
+        "procedure": "grounding",
+        "keywords": ["grounding", "ground", "grounded", "focus", "focusing", "present",
+                     "panic", "panicking", "panicked", "calm down"],
+    },
+]
+
+# A switch is only considered when the user addresses the assistant by name
+WAKE_WORDS = ["anchor"]
+
+_WAKE = "__wake__"
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().replace("’", "'").split())
+
+
+def _trie_pattern(node: Dict[str, dict]) -> str:
+    """
+    Turn a character trie into a regex with shared prefixes factored out,
+    so matching cost at each position depends on keyword length rather
+    than on how many keywords are registered.
+    """
+    is_end = "" in node
+    branches = []
+    leaves = []
+    for char in sorted(key for key in node if key):
+        token = r"\s+" if char == " " else re.escape(char)
+        child = node[char]
+        if len(child) == 1 and "" in child:
+            if char == " ":
+                branches.append(token)
+            else:
+                leaves.append(token)
+        else:
+            branches.append(token + _trie_pattern(child))
+
+    if leaves:
+        branches.append(leaves[0] if len(leaves) == 1 else "[" + "".join(leaves) + "]")
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if is_end:
+        pattern = "(?:" + pattern + ")?"
+    return pattern
+
+
+class intent_router:
+    def __init__(self, intents: Iterable[Dict] = PROCEDURE_INTENTS, wake_words: Iterable[str] = WAKE_WORDS):
+        """
+        Route user messages to procedures with one compiled, word-bounded regex.
+
+        Args:
+            intents: Dicts with "procedure" and "keywords", in priority order
+            wake_words: Words that must also be present for a switch to count
+        """
+        self.keyword_to_intent: Dict[str, str] = {}
+        self.priority: Dict[str, int] = {}
+        self._pattern: Optional[re.Pattern] = None
+
+        for word in wake_words:
+            self.keyword_to_intent[_normalize(word)] = _WAKE
+        for intent in intents:
+            self.register(intent["procedure"], intent["keywords"])
+
+    def register(self, procedure: str, keywords: Iterable[str]) -> None:
+        """Add keywords for a procedure; the pattern is recompiled on next use."""
+        self.priority.setdefault(procedure, len(self.priority))
+        for keyword in keywords:
+            self.keyword_to_intent.setdefault(_normalize(keyword), procedure)
+        self._pattern = None
+
+    def compile(self) -> re.Pattern:
+        """Build the combined pattern from every registered keyword."""
+        trie: Dict[str, dict] = {}
+        for keyword in self.keyword_to_intent:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        self._pattern = re.compile(r"(?<!\w)" + _trie_pattern(trie) + r"(?!\w)")
+        return self._pattern
+
+    def match(self, message: str) -> List[str]:
+        """All intents mentioned in the message (wake words included), in one scan."""
+        pattern = self._pattern or self.compile()
+        text = message.lower().replace("’", "'")
+        found = []
+        for hit in pattern.finditer(text):
+            intent = self.keyword_to_intent.get(" ".join(hit.group(0).split()))
+            if intent is not None and intent not in found:
+                found.append(intent)
+        return found
+
+    def route(self, message: str) -> str:
+        """
+        Procedure the user is asking for, or "" if none.
+
+        Requires a wake word; when several procedures are mentioned the one
+        registered first wins.
+        """
+        found = self.match(message)
+        if _WAKE not in found:
+            return ""
+        procedures = [intent for intent in found if intent != _WAKE]
+        if not procedures:
+            return ""
+        return min(procedures, key=self.priority.__getitem__)
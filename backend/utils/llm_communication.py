@@ -1,27 +1,163 @@
 # llm_service.py
 import os
 import random
-from typing import List, Dict, Any
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
 from datetime import datetime, timedelta
 from openai import OpenAI
 from dotenv import load_dotenv
 import google.generativeai as genai
+from .prompt_builder import prompt_builder, DEFAULT_PROMPT_TOKEN_BUDGET
+from .intent_router import intent_router
+from .metrics import metrics
+from .structured_logger import logger
+from .turn_deadline import deadline_exceeded, provider_timeout, raise_if_expired
+from .traffic_capture import capture
+from .expiry_wheel import expiry
 load_dotenv()
 # Load keys
 OpenAI.api_key = os.getenv("OPENAI_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 genai.api_key = os.getenv("GEMINI_API_KEY")
 
+# Optional base URLs, e.g. to point at provider_stub.py for offline testing
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+if GEMINI_BASE_URL:
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"), transport="rest",
+                    client_options={"api_endpoint": GEMINI_BASE_URL})
+
+SYSTEM_INSTRUCTION = "You are a calm, grounding therapist helping with anxiety. Respond in two sentences or less."
+
+# Gentle replies used when a turn fails or misses its latency budget
+GROUNDING_FALLBACK = "I'm here to help you through this. Let's take a gentle breath together and try again. You're doing great."
+BREATHING_FALLBACK = "Let’s take a calm breath together and try again. You’re doing great."
+
+GROUNDING_STEP_TEMPLATE = """You are a calm, caring therapist guiding a user through a 5-4-3-2-1 grounding exercise for anxiety.  
+Your role is not just to move through steps, but to be a supportive companion who listens patiently and helps the user feel understood.  
+
+Here is the conversation state:
+
+- Last grounding step: "{last_llm_message}"
+- User’s reply: "{user_message}"
+- Current grounding step prompt: "{current_step_message}"
+
+Rules:
+1. If the user clearly followed the instruction (e.g., listed the correct number of things, or engaged with the exercise), respond with "READY:" and THEN gently introduce the **next step’s grounding prompt** in a calm, natural way.  
+2. If the user seems distracted, panicked, venting, or going off-topic, respond with "HOLD:" and provide a short, empathetic response that:  
+   - Validates their feelings or acknowledges what they said,  
+   - Reassures them they are safe talking to you,  
+   - And keeps them gently connected to the grounding process without pushing.  
+3. Your response after "READY:" or "HOLD:" should be no more than 2 supportive sentences. Keep the tone warm, kind, and human.  
+4. Never sound like you are rushing or checking boxes — your priority is to make the user feel heard and cared for, even if they are off-topic.  
+
+Format:  
+- Start with either "READY:" or "HOLD:" (nothing else before it).  
+- After that, include your message for the user.  
+"""
+
+GROUNDING_SEGUE_TEMPLATE = """You are a calm and supportive companion.  
+The user may have been chatting off-topic or staying in the current step for a while, but now you must gently and smoothly guide them forward without making them feel rushed.  
+
+Here is the conversation state:
+
+- Last assistant message: "{last_llm_message}"
+- User’s reply: "{user_message}"
+- Current step message: "{current_step_message}"
+
+Rules:
+1. Always respond with "READY:" followed by a warm, natural transition that briefly acknowledges what the user said and gently reconnects them to the exercise.  
+2. After your transition, immediately provide the {current_step_message}.  
+3. The transition should feel kind and conversational, not scripted or mechanical. Use no more than 2 short sentences before moving into the step.  
+4. Your priority is to sound supportive and patient — like a friend who cares — while still keeping the grounding exercise moving forward.  
+
+Format:  
+- Start with "READY:" (nothing else before it).  
+- After that, include your gentle transition + the {current_step_message}.  
+"""
+
+GROUNDING_SCENE_VISUAL_TEMPLATE = (
+    "From the detected scene, I see these objects: {objects}"
+    ". In your response, you MUST name at least one of these objects directly. "
+    "Phrase it naturally, for example: 'From your scene I see [object].' "
+    "Then guide the user through this grounding step using that object."
+)
+
+GROUNDING_SCENE_SENSE_TEMPLATE = (
+    "From the detected scene, I see these objects: {objects}"
+    ". In your response, you MUST name at least one of these objects directly "
+    "and tie it to the sense for this step (touch, hear, smell, taste). "
+    "Phrase it naturally, for example: 'From your scene I see [object], and you might notice its [texture/sound/etc.].'"
+)
+
+CONVERSATION_SUMMARY_TEMPLATE = """You keep a short running summary of an anxiety support conversation so the assistant can stay consistent without rereading every message.
+
+Summary so far: "{summary}"
+
+Newer exchanges to fold in:
+{turns}
+
+Rewrite the summary to include the newer exchanges. Keep what matters for continuity: how the user is feeling, what they shared about their surroundings, which exercise and step they are on, and anything they asked to avoid. Use no more than 80 words and reply with the summary only.
+"""
+
+BREATHING_STEP_TEMPLATE = """
+You are a calm, supportive therapist guiding a user through a breathing exercise for anxiety relief.
+
+User said: "{user_message}"
+Current step: "{current_step_message}"
+
+Rules:
+1. Keep your response under 2 sentences.
+2. If the user is following along, gently move to the next step with reassurance.
+3. If the user is panicked, off-topic, or needs patience, pause here and reassure them instead of pushing forward.
+"""
+
+
+
+def _expire_old_messages(conversations: List["llm_communication"]) -> None:
+    """Expiry callback (event loop): trim each conversation under its history lock, as the turn path does."""
+    for conversation in conversations:
+        with conversation._history_lock:
+            conversation._cleanup_old_messages()
+            conversation._schedule_message_expiry()
+
+
+message_expiry = expiry.group("message_history", _expire_old_messages)
+
 class llm_communication:
-    def __init__(self, message_retention_minutes: int = 30):
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+    def __init__(self, message_retention_minutes: int = 30, prompt_token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET,
+                 recent_turn_window: int = 5):
+        self.client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
         self.message_history: List[Dict[str, Any]] = []
         self.message_retention_minutes = message_retention_minutes
+        # Held briefly around every read or change of message_history (never across a provider call):
+        # turns run in scheduler threads while expiry trims the history from the event loop
+        self._history_lock = threading.RLock()
+
+        # Turns older than the recent window are folded into a rolling summary
+        self.recent_turn_window = recent_turn_window
+        self.conversation_summary = ""
+        self._summary_lock = threading.Lock()
+        # Turns that aged out of the history before a fold reached them; the next fold takes them
+        self._evicted_turns: List[Dict[str, Any]] = []
+
+        # Prompt templates are compiled once and assembled under a token budget
+        self.prompts = prompt_builder(token_budget=prompt_token_budget)
+        self.prompts.register("grounding_step", GROUNDING_STEP_TEMPLATE)
+        self.prompts.register("grounding_segue", GROUNDING_SEGUE_TEMPLATE)
+        self.prompts.register("grounding_scene_visual", GROUNDING_SCENE_VISUAL_TEMPLATE)
+        self.prompts.register("grounding_scene_sense", GROUNDING_SCENE_SENSE_TEMPLATE)
+        self.prompts.register("breathing_step", BREATHING_STEP_TEMPLATE)
+        self.prompts.register("conversation_summary", CONVERSATION_SUMMARY_TEMPLATE)
         self.current_stage = 0
         self.off_topic_count = 0
         self.max_off_topic = 2
 
         self.current_procedure = "grounding" #grounding, breathing, videos
+        self.intents = intent_router()
+        # Optional callback for every LLM call (see _observe_call), e.g. for offline evaluation
+        self.on_llm_call: Optional[Callable[..., None]] = None
         # Grounding exercise prompts
         self.grounding_prompts = [
             # Calm Opener
@@ -45,7 +181,80 @@ class llm_communication:
             # Gentle Closure
             "You've just guided yourself through all five steps. Well done. Take a moment to notice how you feel now. Would you like to continue with another round, or pause here?"
         ]
+
+        # Breathing exercise prompts
+        self.breathing_prompts = [
+            "Breathe in gently through your nose for a slow count of 4.",
+            "Now hold your breath for a count of 4.",
+            "Exhale slowly through your mouth for a count of 6.",
+            "Pause for a moment and notice the calm settling in your body.",
+            "Let's repeat this cycle together if you’d like."
+        ]
     
+    # ------------------------
+    # Checkpoints / fallbacks
+    # ------------------------
+    def conversation_checkpoint(self) -> Dict[str, Any]:
+        """Exercise position and history, so a turn that misses its deadline can be undone."""
+        with self._history_lock:
+            return {
+                "current_procedure": self.current_procedure,
+                "current_stage": self.current_stage,
+                "off_topic_count": self.off_topic_count,
+                "message_history": list(self.message_history),
+            }
+
+    def restore_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        """Go back to a checkpoint, minus any of its turns that have aged out since it was taken."""
+        self.current_procedure = checkpoint["current_procedure"]
+        self.current_stage = checkpoint["current_stage"]
+        self.off_topic_count = checkpoint["off_topic_count"]
+        with self._history_lock:
+            self.message_history = list(checkpoint["message_history"])
+            self._cleanup_old_messages()
+            self._schedule_message_expiry()
+
+    def export_state(self) -> Dict[str, Any]:
+        """Everything a restarted server needs to carry on this conversation, as plain JSON types."""
+        with self._history_lock:
+            return {
+                "current_procedure": self.current_procedure,
+                "current_stage": self.current_stage,
+                "off_topic_count": self.off_topic_count,
+                "conversation_summary": self.conversation_summary,
+                "message_history": [{key: value for key, value in message.items() if key != "datetime"}
+                                    for message in self.message_history],
+                "evicted_turns": [{key: value for key, value in message.items() if key != "datetime"}
+                                  for message in self._evicted_turns],
+            }
+
+    def import_state(self, state: Dict[str, Any]) -> None:
+        """Resume from export_state() output, queueing turns that aged out while the server was down for the summary."""
+        with self._history_lock:
+            self._evicted_turns = list(state.get("evicted_turns", []))
+        self.restore_checkpoint({
+            **state,
+            "message_history": [{**message, "datetime": datetime.fromtimestamp(message["timestamp"])}
+                                for message in state["message_history"]],
+        })
+        self.conversation_summary = state.get("conversation_summary", "")
+
+    def fallback_reply(self, procedure: str = None, stage: int = None) -> str:
+        """A gentle reply that repeats the current step, for when the LLM can't answer in time."""
+        procedure = self.current_procedure if procedure is None else procedure
+        stage = self.current_stage if stage is None else stage
+        if procedure == "breathing":
+            return f"{BREATHING_FALLBACK} {self.breathing_prompts[min(max(stage, 0), len(self.breathing_prompts) - 1)]}"
+        if procedure == "grounding":
+            return f"{GROUNDING_FALLBACK} {self.grounding_prompts[min(max(stage, 0), len(self.grounding_prompts) - 1)]}"
+        return GROUNDING_FALLBACK
+
+    def all_fallback_replies(self) -> List[str]:
+        """Every reply fallback_reply can return, e.g. to render their audio ahead of time."""
+        return ([self.fallback_reply("grounding", stage) for stage in range(len(self.grounding_prompts))] +
+                [self.fallback_reply("breathing", stage) for stage in range(len(self.breathing_prompts))] +
+                [GROUNDING_FALLBACK])
+
     # ------------------------
     # Message Logging System
     # ------------------------
@@ -58,53 +267,161 @@ class llm_communication:
             "timestamp": timestamp,
             "datetime": datetime.fromtimestamp(timestamp),
             "user_message": user_message,
-            "llm_response": llm_response
+            "llm_response": llm_response,
+            "summarized": False
         }
         
-        self.message_history.append(message_entry)
-        self._cleanup_old_messages()
-    
+        with self._history_lock:
+            self.message_history.append(message_entry)
+            # Old turns are dropped off the request path, when the oldest one reaches the retention period
+            if self not in message_expiry:
+                self._schedule_message_expiry()
+
+    def _schedule_message_expiry(self) -> None:
+        with self._history_lock:
+            if self.message_history:
+                oldest = self.message_history[0]["datetime"]
+                message_expiry.touch(self, (oldest - datetime.now()).total_seconds()
+                                     + self.message_retention_minutes * 60)
+
     def _cleanup_old_messages(self) -> None:
-        """Remove messages older than the retention period."""
+        """Remove messages older than the retention period (in place; turns are appended in time order)."""
         cutoff_time = datetime.now() - timedelta(minutes=self.message_retention_minutes)
-        self.message_history = [
-            msg for msg in self.message_history 
-            if msg["datetime"] > cutoff_time
-        ]
+        with self._history_lock:
+            expired = 0
+            for msg in self.message_history:
+                if msg["datetime"] > cutoff_time:
+                    break
+                expired += 1
+            # Turns not yet in the summary wait for the next fold instead of being lost
+            for msg in self.message_history[:expired]:
+                if not msg.get("summarized") and not any(msg is queued for queued in self._evicted_turns):
+                    self._evicted_turns.append(msg)
+            del self.message_history[:expired]
     
-    def format_conversation_for_context(self, max_messages: int = 5) -> str:
-        """Format recent conversation history as context for LLM calls."""
-        self._cleanup_old_messages()
-        recent_history = self.message_history[-max_messages:] if max_messages > 0 else self.message_history
+    def format_conversation_for_context(self, max_messages: int = None, max_tokens: int = None) -> str:
+        """
+        Format the rolling summary plus recent conversation history as context for LLM calls.
+
+        max_messages defaults to the recent turn window; older turns are covered
+        by the summary. When max_tokens is given, the oldest turns are dropped
+        until summary and history fit that many estimated tokens.
+        """
+        if max_messages is None:
+            max_messages = self.recent_turn_window
+        with self._history_lock:
+            self._cleanup_old_messages()
+            recent_history = self.message_history[-max_messages:] if max_messages > 0 else list(self.message_history)
+        summary = self.conversation_summary
+        if max_tokens is not None:
+            summary_tokens = self.prompts.estimator(summary)
+            if summary_tokens > max_tokens:
+                summary = ""
+                summary_tokens = 0
+            kept = self.prompts.fit_history(recent_history, max_tokens - summary_tokens)
+            # Turns the budget left out of the prompt are folded into the summary on the next pass
+            with self._history_lock:
+                for msg in recent_history[:len(recent_history) - len(kept)]:
+                    msg["fold_into_summary"] = True
+            recent_history = kept
         
-        if not recent_history:
+        if not recent_history and not summary:
             return ""
         
-        context_parts = ["Recent conversation history:"]
+        context_parts = []
+        if summary:
+            context_parts.append(f"Summary of earlier conversation: {summary}")
+        if recent_history:
+            context_parts.append("Recent conversation history:")
         for msg in recent_history:
             context_parts.append(f"User: {msg['user_message']}")
             context_parts.append(f"Assistant: {msg['llm_response']}")
         
         return "\n".join(context_parts)
 
+    def summarize_older_turns(self, model: str = "gemini-2.5-flash-lite") -> None:
+        """
+        Fold turns that have left the recent window, the retention period or
+        the prompt's token budget into the rolling summary.
+
+        Meant to run off the request path (e.g. as a background task after a
+        reply is sent). If a fold is already running for this conversation the
+        call returns immediately; the next one picks up whatever is left.
+        """
+        if not self._summary_lock.acquire(blocking=False):
+            return
+        try:
+            with self._history_lock:
+                older = len(self.message_history) - self.recent_turn_window if self.recent_turn_window > 0 \
+                    else len(self.message_history)
+                pending = [msg for msg in self._evicted_turns if not msg.get("summarized")]
+                pending += [msg for index, msg in enumerate(self.message_history)
+                            if not msg.get("summarized") and (index < older or msg.get("fold_into_summary"))]
+            if not pending:
+                return
+
+            turns = "\n".join(f"User: {msg['user_message']}\nAssistant: {msg['llm_response']}" for msg in pending)
+            prompt, _ = self.prompts.render("conversation_summary", summary=self.conversation_summary or "None yet",
+                                            turns=turns)
+            start_time = time.time()
+            try:
+                with metrics.span("llm_summary", provider="gemini", model=model):
+                    summary = genai.GenerativeModel(model).generate_content(prompt).text.strip()
+            except Exception as e:
+                logger.error("llm.summary_error", provider="gemini", model=model, error=str(e))
+                return
+            self._observe_call("gemini", model, self.prompts.estimator(prompt), summary, time.time() - start_time,
+                               purpose="summary")
+
+            if summary:
+                self.conversation_summary = summary
+                with self._history_lock:
+                    for msg in pending:
+                        msg["summarized"] = True
+                    self._evicted_turns = [msg for msg in self._evicted_turns if not msg.get("summarized")]
+        finally:
+            self._summary_lock.release()
+
+    def _observe_call(self, provider: str, model: str, prompt_tokens: int, text: Optional[str], seconds: float,
+                      purpose: str = "reply") -> None:
+        if self.on_llm_call is not None:
+            self.on_llm_call(provider=provider, model=model, purpose=purpose, prompt_tokens=prompt_tokens,
+                             completion_tokens=self.prompts.estimator(text) if text else 0, seconds=seconds,
+                             text=text)
+
     # ------------------------
     # OpenAI API call
     # ------------------------
     def openai_prompt(self, prompt: str, model: str = "gpt-4o-mini", include_history: bool = False) -> str:
-        messages = [{"role": "system", "content": "You are a calm, grounding therapist helping with anxiety. Respond in two sentences or less."}]
+        messages = [{"role": "system", "content": SYSTEM_INSTRUCTION}]
         
-        # Include conversation history if requested
+        # Include conversation history if requested, within what's left of the token budget
         if include_history:
-            context = self.format_conversation_for_context()
+            context = self.format_conversation_for_context(max_tokens=self.prompts.remaining_budget(prompt))
             if context:
                 messages.append({"role": "system", "content": f"Context: {context}"})
         
         messages.append({"role": "user", "content": prompt})
+        prompt_tokens = sum(self.prompts.estimator(message["content"]) for message in messages)
         
-        response = self.client.chat.completions.create(
-        model=model,
-            messages=messages
-        )
+        # Within a turn, the call may only use what is left of its latency budget
+        timeout = provider_timeout("llm", "openai")
+        start_time = time.time()
+        try:
+            with metrics.span("llm", provider="openai", model=model):
+                response = self.client.chat.completions.create(
+                model=model,
+                    messages=messages,
+                    **({"timeout": timeout} if timeout is not None else {})
+                )
+        except Exception as e:
+            raise_if_expired(e)
+            raise
+        logger.info("llm.call", provider="openai", model=model, prompt_tokens=prompt_tokens,
+                    latency_seconds=round(time.time() - start_time, 3))
+        capture.record_provider("openai_chat", response.choices[0].message.content, time.time() - start_time,
+                                model=model)
+        self._observe_call("openai", model, prompt_tokens, response.choices[0].message.content, time.time() - start_time)
         return response.choices[0].message.content
 
 
@@ -116,24 +433,35 @@ class llm_communication:
         Query the Gemini API for a response.
         Uses the GOOGLE_API_KEY loaded during initialization.
         """
-        # Include conversation history if requested
+        # Include conversation history if requested, within what's left of the token budget
         if include_history:
-            context = self.format_conversation_for_context()
+            context = self.format_conversation_for_context(max_tokens=self.prompts.remaining_budget(prompt))
             if context:
                 # Prepend the context to the prompt
                 prompt = f"{context}\n\n{prompt}"
         
         # Add system instruction to the prompt
-        system_instruction = "You are a calm, grounding therapist helping with anxiety. Respond in two sentences or less."
-        full_prompt = f"{system_instruction}\n\n{prompt}"
+        full_prompt = f"{SYSTEM_INSTRUCTION}\n\n{prompt}"
+        prompt_tokens = self.prompts.estimator(full_prompt)
         
+        # Within a turn, the call may only use what is left of its latency budget
+        timeout = provider_timeout("llm", "gemini")
+        start_time = time.time()
         try:
             # Call the Gemini API using the correct syntax
-            response = genai.GenerativeModel(model).generate_content(full_prompt)
+            with metrics.span("llm", provider="gemini", model=model):
+                response = genai.GenerativeModel(model).generate_content(
+                    full_prompt, request_options={"timeout": timeout} if timeout is not None else None)
+            logger.info("llm.call", provider="gemini", model=model, prompt_tokens=prompt_tokens,
+                        latency_seconds=round(time.time() - start_time, 3))
+            capture.record_provider("gemini", response.text, time.time() - start_time, model=model)
+            self._observe_call("gemini", model, prompt_tokens, response.text, time.time() - start_time)
             return response.text
         
         except Exception as e:
-            print(f"Gemini API Error: {e}")
+            raise_if_expired(e)
+            logger.error("llm.error", provider="gemini", model=model, prompt_tokens=prompt_tokens, error=str(e))
+            self._observe_call("gemini", model, prompt_tokens, None, time.time() - start_time, purpose="error")
             return "I apologize, but I couldn't connect to the AI right now. Let's take a slow breath together."
 
     # ------------------------
@@ -190,52 +518,12 @@ class llm_communication:
                 last_llm_message = self.grounding_prompts[self.current_stage - 1]
             current_step_message = self.grounding_prompts[self.current_stage]
             
-            prompt = f"""You are a calm, caring therapist guiding a user through a 5-4-3-2-1 grounding exercise for anxiety.  
-Your role is not just to move through steps, but to be a supportive companion who listens patiently and helps the user feel understood.  
-
-Here is the conversation state:
-
-- Last grounding step: "{last_llm_message}"
-- User’s reply: "{user_message}"
-- Current grounding step prompt: "{current_step_message}"
-
-Rules:
-1. If the user clearly followed the instruction (e.g., listed the correct number of things, or engaged with the exercise), respond with "READY:" and THEN gently introduce the **next step’s grounding prompt** in a calm, natural way.  
-2. If the user seems distracted, panicked, venting, or going off-topic, respond with "HOLD:" and provide a short, empathetic response that:  
-   - Validates their feelings or acknowledges what they said,  
-   - Reassures them they are safe talking to you,  
-   - And keeps them gently connected to the grounding process without pushing.  
-3. Your response after "READY:" or "HOLD:" should be no more than 2 supportive sentences. Keep the tone warm, kind, and human.  
-4. Never sound like you are rushing or checking boxes — your priority is to make the user feel heard and cared for, even if they are off-topic.  
-
-Format:  
-- Start with either "READY:" or "HOLD:" (nothing else before it).  
-- After that, include your message for the user.  
-"""
+            template = "grounding_step"
             if self.off_topic_count >= self.max_off_topic:
                 self.off_topic_count = 0
                 # Gently segue
-                prompt = f"""You are a calm and supportive companion.  
-The user may have been chatting off-topic or staying in the current step for a while, but now you must gently and smoothly guide them forward without making them feel rushed.  
-
-Here is the conversation state:
-
-- Last assistant message: "{last_llm_message}"
-- User’s reply: "{user_message}"
-- Current step message: "{current_step_message}"
+                template = "grounding_segue"
 
-Rules:
-1. Always respond with "READY:" followed by a warm, natural transition that briefly acknowledges what the user said and gently reconnects them to the exercise.  
-2. After your transition, immediately provide the {current_step_message}.  
-3. The transition should feel kind and conversational, not scripted or mechanical. Use no more than 2 short sentences before moving into the step.  
-4. Your priority is to sound supportive and patient — like a friend who cares — while still keeping the grounding exercise moving forward.  
-
-Format:  
-- Start with "READY:" (nothing else before it).  
-- After that, include your gentle transition + the {current_step_message}.  
-"""
-                
-            
             # Safety clamp on stage index
             if self.current_stage < 0:
                 self.current_stage = 0
@@ -243,11 +531,17 @@ Format:
                 self.current_stage = len(self.grounding_prompts) - 1
             
             #base_prompt = self.grounding_prompts[self.current_stage]
+            prompt_fields = {
+                "last_llm_message": last_llm_message,
+                "user_message": user_message,
+                "current_step_message": current_step_message,
+            }
 
             # --- Stage Logic ---
             if self.current_stage == 0:  # Calm opener
                 #FIXME make intro logic here alex
                 #Take a slow breath in... and a gentle breath out. You're safe here. Everything will be okay. Let's move through this together, step by step.
+                prompt, _ = self.prompts.build(template, prompt_fields)
                 response = self._generate_grounding_response(prompt, user_message)
                 self._advance_stage()
 
@@ -255,14 +549,10 @@ Format:
                 # Use passed OD results or fallback to mock data
                 detected_objects = od_results if od_results else self._get_scene_objects()
                 
-                if detected_objects:
-                    prompt += (
-        "From the detected scene, I see these objects: "
-        + ", ".join(detected_objects)
-        + ". In your response, you MUST name at least one of these objects directly. "
-        "Phrase it naturally, for example: 'From your scene I see [object].' "
-        "Then guide the user through this grounding step using that object."
-    )#response = self._generate_grounding_response(base_prompt, user_message)
+                # Scene objects are trimmed to whatever fits in the token budget
+                prompt, _ = self.prompts.build(template, prompt_fields, scene_objects=detected_objects,
+                                               scene_template="grounding_scene_visual")
+                #response = self._generate_grounding_response(base_prompt, user_message)
                 # response = self.openai_prompt(prompt=prompt)
                 response = self.gemini_prompt(prompt)
                 self._advance_stage()
@@ -273,19 +563,14 @@ Format:
                 
                 #response = self._generate_grounding_response(base_prompt, user_message)
                 #fixme FIXME if this ends up being dumb then delete FIXME true hasn't been tested
-                if detected_objects:
-                    prompt += (
-            "From the detected scene, I see these objects: "
-            + ", ".join(detected_objects)
-            + ". In your response, you MUST name at least one of these objects directly "
-            "and tie it to the sense for this step (touch, hear, smell, taste). "
-            "Phrase it naturally, for example: 'From your scene I see [object], and you might notice its [texture/sound/etc.].'"
-        )
+                prompt, _ = self.prompts.build(template, prompt_fields, scene_objects=detected_objects,
+                                               scene_template="grounding_scene_sense")
                 # response = self.openai_prompt(prompt=prompt)
                 response = self.gemini_prompt(prompt)
                 self._advance_stage()
 
             elif self.current_stage == 6:  # Closure
+                prompt, _ = self.prompts.build(template, prompt_fields)
                 #response = self._generate_grounding_response(base_prompt, user_message)
                 # response = self.openai_prompt(prompt=prompt)
                 response = self.gemini_prompt(prompt)
@@ -310,9 +595,11 @@ Format:
             self.log_message(user_message, response, timestamp=timestamp)
             return response
         
+        except deadline_exceeded:
+            raise
         except Exception as e:
-            print(f"Error in grounding exercise pipeline: {e}")
-            return "I'm here to help you through this. Let's take a gentle breath together and try again. You're doing great."
+            logger.error("grounding.error", stage=self.current_stage, error=str(e))
+            return GROUNDING_FALLBACK
 
     def _generate_grounding_response(self, base_prompt: str, user_message: str) -> str:
         """Generate a grounding response using the base prompt + user input."""
@@ -371,13 +658,7 @@ Format:
                 self.log_message(user_message, response, timestamp)
                 return response
 
-            breathing_prompts = [
-                "Breathe in gently through your nose for a slow count of 4.",
-                "Now hold your breath for a count of 4.",
-                "Exhale slowly through your mouth for a count of 6.",
-                "Pause for a moment and notice the calm settling in your body.",
-                "Let's repeat this cycle together if you’d like."
-            ]
+            breathing_prompts = self.breathing_prompts
 
             if self.current_stage < 0:
                 self.current_stage = 0
@@ -387,17 +668,8 @@ Format:
             current_step_message = breathing_prompts[self.current_stage]
 
             # Simple acknowledgment + step progression
-            prompt = f"""
-You are a calm, supportive therapist guiding a user through a breathing exercise for anxiety relief.
-
-User said: "{user_message}"
-Current step: "{current_step_message}"
-
-Rules:
-1. Keep your response under 2 sentences.
-2. If the user is following along, gently move to the next step with reassurance.
-3. If the user is panicked, off-topic, or needs patience, pause here and reassure them instead of pushing forward.
-            """
+            prompt, _ = self.prompts.render("breathing_step", user_message=user_message,
+                                            current_step_message=current_step_message)
 
             # response = self.openai_prompt(prompt=prompt, include_history=True)
             response = self.gemini_prompt(prompt, include_history=True)
@@ -413,9 +685,11 @@ Rules:
             self.log_message(user_message, response, timestamp=timestamp)
             return response
 
+        except deadline_exceeded:
+            raise
         except Exception as e:
-            print(f"Error in breathing procedure: {e}")
-            return "Let’s take a calm breath together and try again. You’re doing great."
+            logger.error("breathing.error", stage=self.current_stage, error=str(e))
+            return BREATHING_FALLBACK
 
 
 
@@ -444,19 +718,10 @@ Rules:
         - bool indicates if the user wants to switch
         - str indicates which procedure to switch to ("breathing", "video", "grounding")
         """
-        user_message = user_message.lower()
-
-        # check breathing
-        if "anchor" in user_message and any(word in user_message for word in ["breath", "breathe", "breathing", "hyperventilating", "inhale", "exhale", "lungs", "can’t breathe", "hard to breathe", "catch my breath", "air", "oxygen"]):
-            return [(self.current_procedure != "breathing"), "breathing"]
-
-        # check video
-        if "anchor" in user_message and any(word in user_message for word in ["video"]):
-            return [(self.current_procedure != "video"), "video"]
-
-        # check grounding
-        if "anchor" in user_message and any(word in user_message for word in ["grounding", "ground", "focus", "present", "panic", "calm down"]):
-            return [(self.current_procedure != "grounding"), "grounding"]
+        # One pass over the message with the compiled intent table
+        procedure = self.intents.route(user_message)
+        if procedure:
+            return [(self.current_procedure != procedure), procedure]
 
         # default: no switch
         return [False, ""]
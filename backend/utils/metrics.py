@@ -0,0 +1,145 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .structured_logger import logger
+
+# Default histogram buckets (seconds), from sub-millisecond decode up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Endpoint of the request currently being handled, so spans can be tagged without threading it through
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class metrics_registry:
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        """
+        In-process counters, gauges and histograms rendered in Prometheus text format.
+
+        Args:
+            buckets: Upper bounds (seconds) used for every histogram
+        """
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def set_counter(self, name: str, value: float, **labels: str) -> None:
+        """Publish a running total that is counted elsewhere."""
+        with self._lock:
+            self._counters.setdefault(name, {})[_label_key(labels)] = value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record one histogram sample."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # Per-bucket counts followed by sum and count
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def register_collector(self, collector: Callable[[], None]) -> None:
+        """Call collector just before rendering, e.g. to copy external stats into gauges."""
+        self._collectors.append(collector)
+
+    @contextmanager
+    def span(self, name: str, endpoint: Optional[str] = None, **labels: str):
+        """
+        Time a block of work, recording wall and CPU seconds.
+
+        Spans are tagged with the current request's endpoint unless one is given.
+        CPU time is that of the calling thread.
+        """
+        labels["span"] = name
+        labels["endpoint"] = endpoint if endpoint is not None else current_endpoint.get()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            self.observe("grounded_span_seconds", time.perf_counter() - wall_start, **labels)
+            self.observe("grounded_span_cpu_seconds", time.thread_time() - cpu_start, **labels)
+
+    def render(self) -> str:
+        """Everything recorded so far in Prometheus text exposition format."""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error("metrics.collector_error", error=str(e))
+
+        lines = []
+        with self._lock:
+            for kind, store in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(store.items()):
+                    self._header(lines, name, kind)
+                    for key, value in series.items():
+                        lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, "histogram")
+                for key, state in series.items():
+                    cumulative = 0.0
+                    for i, bound in enumerate(self.buckets):
+                        cumulative += state[i]
+                        le = (("le", _format_value(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(key, le)} {_format_value(cumulative)}")
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {_format_value(state[-1])}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(state[-2])}")
+                    lines.append(f"{name}_count{_format_labels(key)} {_format_value(state[-1])}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: List[str], name: str, kind: str) -> None:
+        help_text = self._help.get(name, (kind, name.replace("_", " ")))[1]
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+# Shared registry for the whole backend
+metrics = metrics_registry()
+metrics.describe("grounded_span_seconds", "histogram", "Wall time of each stage of request handling")
+metrics.describe("grounded_span_cpu_seconds", "histogram", "CPU time of each stage of request handling")
+metrics.describe("grounded_request_seconds", "histogram", "Wall time per HTTP request")
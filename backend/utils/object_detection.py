@@ -1,20 +1,49 @@
+import asyncio
 import cv2
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 from ultralytics import YOLO
 import os
+import threading
 from .str_to_pic import str_to_pic
+from .frame_buffers import frame_buffer_pool, pending_frame
+from .frame_quality import frame_quality_gate
+from .detector_pool import detector_pool, pooled_result
+from .metrics import metrics
+from .request_profiler import profiled
+from .structured_logger import logger
 import time
 
+# Square input side the detector runs at; 0 feeds frames at whatever resolution they arrive
+DEFAULT_INFERENCE_SIZE = int(os.getenv("INFERENCE_SIZE", "640"))
+
 class object_detection:
-    def __init__(self, model_name: str = "yolov8n.pt"):
+    def __init__(self, model_name: str = "yolov8n.pt", inference_size: int = DEFAULT_INFERENCE_SIZE,
+                 box_coordinates: str = "original", workers: int = 0):
         """
         Initialize the YOLO object detection pipeline.
         
         Args:
             model_name: YOLO model to use (yolov8n.pt, yolov8s.pt, yolov8m.pt, yolov8l.pt, yolov8x.pt)
+            inference_size: Letterboxed input side in pixels (multiple of 32), 0 to disable
+            box_coordinates: "original" (pixels of the uploaded frame) or "normalized" (0-1)
+            workers: Run inference in this many worker processes (see detector_pool);
+                0 keeps the model in this process
         """
-        self.model = YOLO(model_name)
+        if box_coordinates not in ("original", "normalized"):
+            raise ValueError(f"Unknown box coordinates: {box_coordinates}")
+        if workers and not inference_size:
+            raise ValueError("A detector worker pool needs a fixed inference_size")
+        self.model_name = model_name
+        self.inference_size = inference_size
+        self.box_coordinates = box_coordinates
+        self.pool = None
+        self._model = None
+        self._inference_lock = threading.Lock()  # the in-process YOLO predictor isn't thread-safe
+        if workers:
+            self.pool = detector_pool(model_name, workers=workers, inference_size=inference_size)
+        else:
+            self._model = YOLO(model_name)
         
         # COCO class names for reference
         self.coco_classes = {
@@ -45,13 +74,116 @@ class object_detection:
             'handbag', 'suitcase', 'potted plant', 'tree', 'flower'
         }
     
+        self.coco_ids = {name: class_id for class_id, name in self.coco_classes.items()}
         self.last_objects_identified = None
+        self.frame_buffers = frame_buffer_pool()
+        self.quality_gate = frame_quality_gate()
+    
+    @property
+    def model(self):
+        """The in-process YOLO model; only loaded on first use when inference runs in a worker pool."""
+        if self._model is None:
+            self._model = YOLO(self.model_name)
+        return self._model
+
+    def warm_up(self, width: int = 640, height: int = 480) -> None:
+        """Run one inference on a blank frame so the first real request doesn't pay for lazy setup."""
+        if self.pool is not None:
+            # Workers warm their own replicas
+            if not self.pool.wait_ready():
+                raise RuntimeError("Detector workers did not become ready")
+            return
+        if self.inference_size:
+            width = height = self.inference_size
+        self.model(np.zeros((height, width, 3), dtype=np.uint8), verbose=False)
     
-    def apply_object_detection(self, image_str: str): #handles image casting and gets result obj
-        image_path = str_to_pic(image_str)
-        image = cv2.imread(image_path)
-        results = self.model(image) # results type = ultralytics.engine.results.Results
+    def apply_object_detection(self, image_str: Union[str, pending_frame]): #handles image casting and gets result obj
+        """
+        Decode a base64 frame and run YOLO on it.
+
+        With an inference_size the frame is decoded at reduced scale where
+        possible and letterboxed once into a pooled array; each result carries
+        a `frame_geometry` dict so boxes can be mapped back (see map_box).
+        The pooled array is reused by the next frame, so don't keep
+        `result.orig_img` around.
+        """
+        # Decoded in memory from pooled buffers (no temp file + imread round trip)
+        if not self.inference_size:
+            with metrics.span("decode"):
+                image = self.frame_buffers.decode_frame(image_str)
+            with metrics.span("inference", provider="yolo", model=self.model_name), self._inference_lock:
+                return self.model(image) # results type = ultralytics.engine.results.Results
+
+        with metrics.span("decode"):
+            image, geometry = self.frame_buffers.decode_letterboxed(image_str, self.inference_size)
+        try:
+            with metrics.span("inference", provider="yolo", model=self.model_name), self._inference_lock:
+                results = self.model(image, imgsz=self.inference_size)
+        finally:
+            self.frame_buffers.release_array(image)
+        for result in results:
+            result.frame_geometry = geometry
         return results
+
+    async def detect(self, image_str: Union[str, pending_frame]):
+        """apply_object_detection without blocking the event loop: in a thread, or on the worker pool."""
+        if self.pool is None:
+            return await asyncio.to_thread(profiled, self.apply_object_detection, image_str)
+
+        slot = self.pool.try_acquire_slot()
+        if slot is None:
+            # Every slot is queued or in flight: wait off the event loop
+            slot = await asyncio.to_thread(self.pool.acquire_slot)
+        # Decoding and letterboxing into the slot is CPU work too; keep it off the event loop
+        decoding = asyncio.ensure_future(asyncio.to_thread(profiled, self._decode_into_slot, image_str, slot))
+        try:
+            geometry = await asyncio.shield(decoding)
+        except asyncio.CancelledError:
+            # The thread is still writing into the slot; free it only once that's done
+            def release_when_written(done: asyncio.Future) -> None:
+                if not done.cancelled():
+                    done.exception()  # retrieved: the request is gone, nobody else will look at it
+                self.pool.release_slot(slot)
+
+            decoding.add_done_callback(release_when_written)
+            raise
+        except Exception:
+            self.pool.release_slot(slot)
+            raise
+        with metrics.span("inference", provider="yolo", model=self.model_name):
+            packed = await asyncio.wrap_future(self.pool.submit(slot))
+        return [pooled_result(self.pool.names, packed, geometry)]
+
+    def _decode_into_slot(self, image_str: Union[str, pending_frame], slot: int) -> Dict[str, float]:
+        with metrics.span("decode"):
+            _, geometry = self.frame_buffers.decode_letterboxed(image_str, self.inference_size,
+                                                                 out=self.pool.frames[slot])
+        return geometry
+
+    def assess_frame_quality(self, image_str: Union[str, pending_frame]) -> Dict[str, Any]:
+        """
+        Blur, darkness and occlusion metrics from a small thumbnail (see frame_quality_gate.assess).
+
+        Blocking; pass a pending_frame to reuse its base64 decode for inference.
+        """
+        with metrics.span("quality"):
+            return self.quality_gate.assess(self.frame_buffers.decode_thumbnail(image_str))
+
+    def map_box(self, box, geometry: Optional[Dict[str, float]]) -> List[float]:
+        """Map an x1, y1, x2, y2 box from detector input space to self.box_coordinates."""
+        x1, y1, x2, y2 = (float(v) for v in box)
+        if geometry is None:
+            return [x1, y1, x2, y2]
+        x1 = (x1 - geometry["pad_x"]) * geometry["scale_x"]
+        x2 = (x2 - geometry["pad_x"]) * geometry["scale_x"]
+        y1 = (y1 - geometry["pad_y"]) * geometry["scale_y"]
+        y2 = (y2 - geometry["pad_y"]) * geometry["scale_y"]
+        width, height = geometry["width"], geometry["height"]
+        x1, x2 = min(max(x1, 0.0), width), min(max(x2, 0.0), width)
+        y1, y2 = min(max(y1, 0.0), height), min(max(y2, 0.0), height)
+        if self.box_coordinates == "normalized":
+            return [x1 / width, y1 / height, x2 / width, y2 / height]
+        return [x1, y1, x2, y2]
     
     def extract_dominant_color(self, image: np.ndarray, bbox: List[int]) -> str:
         """
@@ -89,7 +221,7 @@ class object_detection:
             return self._hsv_to_color_name(hue, saturation, value)
             
         except Exception as e:
-            print(f"Error extracting color: {e}")
+            logger.error("detection.color_error", error=str(e))
             return "unknown"
     
     def _hsv_to_color_name(self, hue: float, saturation: float, value: float) -> str:
@@ -151,7 +283,7 @@ class object_detection:
             # Load image
             image = cv2.imread(image_path)
             if image is None:
-                print(f"Error: Could not load image from {image_path}")
+                logger.error("detection.image_unreadable", path=image_path)
                 return []
             
             # Run YOLO detection
@@ -195,7 +327,7 @@ class object_detection:
             return detected_objects
             
         except Exception as e:
-            print(f"Error in object detection: {e}")
+            logger.error("detection.error", path=image_path, error=str(e))
             return []
     
     def process_image_pipeline(self, image_string: str, confidence_threshold: float = 0.5) -> Dict[str, Any]:
@@ -249,9 +381,16 @@ class object_detection:
             "frame_id": int,
             "status": "success"
         }
-        Only includes objects above the confidence threshold.
+        Only includes objects above the confidence threshold. Box centers are in
+        self.box_coordinates space (floats when normalized).
         """
+        return self.format_objects_for_kori(self.detections_from_results(result_obj, confidence_threshold),
+                                            frame_count, start_time)
+
+    def detections_from_results(self, result_obj, confidence_threshold: float = 0.5) -> List[Dict[str, Any]]:
+        """Detections above the threshold as {"class_id", "box", "confidence"}, boxes in self.box_coordinates."""
         detections = []
+        geometry = getattr(result_obj, "frame_geometry", None)
         class_id_to_name = result_obj.names
         boxes = result_obj.boxes.xyxy
         class_ids = result_obj.boxes.cls
@@ -262,26 +401,50 @@ class object_detection:
             if confidence < confidence_threshold:
                 continue
 
+            # Get class_id from COCO dictionary
             class_name = class_id_to_name[int(class_id)]
-            x1, y1, x2, y2 = boxes[i]
+            detections.append({
+                "class_id": self.coco_ids[class_name],
+                "box": self.map_box(boxes[i], geometry),
+                "confidence": confidence,
+            })
+        return detections
 
-            # Compute center as integers
-            center_x = int(((x1 + x2) / 2).item())
-            center_y = int(((y1 + y2) / 2).item())
+    def frame_size(self, result_obj) -> Optional[tuple]:
+        """(width, height) of the uploaded frame in self.box_coordinates units, if known."""
+        geometry = getattr(result_obj, "frame_geometry", None)
+        if self.box_coordinates == "normalized":
+            return (1.0, 1.0)
+        if geometry is None:
+            return None
+        return (geometry["width"], geometry["height"])
 
-            # Get class_id from COCO dictionary
-            name_to_id = {v: k for k, v in self.coco_classes.items()}
-            class_id_int = name_to_id[class_name]
+    def format_objects_for_kori(self, objects: List[Dict[str, Any]], frame_count, start_time) -> Dict[str, Any]:
+        """Kori's response format for detected or tracked objects (see get_objects_from_results_for_kori)."""
+        detections = []
+        for obj in objects:
+            x1, y1, x2, y2 = obj["box"]
 
-            detections.append({
-                "class_id": class_id_int,
+            # Compute center as integers (pixels) or 0-1 fractions
+            center_x = (x1 + x2) / 2
+            center_y = (y1 + y2) / 2
+            if self.box_coordinates == "normalized":
+                center_x, center_y = round(center_x, 4), round(center_y, 4)
+            else:
+                center_x, center_y = int(center_x), int(center_y)
+
+            detection = {
+                "class_id": obj["class_id"],
                 "box_x": center_x,
                 "box_y": center_y,
-                "confidence": round(confidence, 3),
+                "confidence": round(obj["confidence"], 3),
                 "processing_time": round(time.time() - start_time, 3),
                 "frame_id": frame_count,
                 "status": "success"
-            })
+            }
+            if "track_id" in obj:
+                detection["track_id"] = obj["track_id"]
+            detections.append(detection)
         self.last_objects_identified = detections
         return {"objects": detections}
 
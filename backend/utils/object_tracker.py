@@ -0,0 +1,189 @@
+import itertools
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .expiry_wheel import expiry
+
+
+def iou(a: List[float], b: List[float]) -> float:
+    """Intersection over union of two x1, y1, x2, y2 boxes."""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class object_tracker:
+    def __init__(self, keyframe_interval: int = 5, min_confidence: float = 0.4, iou_threshold: float = 0.3,
+                 max_misses: int = 2, confidence_half_life_seconds: float = 1.0, velocity_smoothing: float = 0.5):
+        """
+        SORT-style tracker for one session: greedy IoU matching of detections to
+        constant-velocity predictions, with stable track IDs.
+
+        Full detection is only needed on keyframes; frames in between can be
+        answered from predicted tracks (see needs_keyframe / predict).
+
+        Args:
+            keyframe_interval: Run full detection at least every N frames
+            min_confidence: Force a keyframe once predicted tracks fall below this confidence
+            iou_threshold: Minimum IoU for a detection to continue a track
+            max_misses: Keyframes a track may go undetected before it is dropped
+            confidence_half_life_seconds: How quickly confidence in an un-updated prediction halves
+            velocity_smoothing: Weight of the newest velocity measurement (0-1)
+        """
+        self.keyframe_interval = keyframe_interval
+        self.min_confidence = min_confidence
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.confidence_half_life_seconds = confidence_half_life_seconds
+        self.velocity_smoothing = velocity_smoothing
+        self.tracks: List[Dict] = []
+        self.frame_size: Optional[Tuple[float, float]] = None
+        self.frames_since_keyframe: Optional[int] = None
+        self.last_seen = time.time()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # ------------------------
+    # Keyframe scheduling
+    # ------------------------
+    def tracking_confidence(self, timestamp: float) -> float:
+        """Lowest confidence among current tracks once predicted forward to timestamp."""
+        if not self.tracks:
+            return 0.0
+        return min(self._predicted_confidence(track, timestamp) for track in self.tracks)
+
+    def _predicted_confidence(self, track: Dict, timestamp: float) -> float:
+        elapsed = max(0.0, timestamp - track["updated_at"])
+        return track["confidence"] * 0.5 ** (elapsed / self.confidence_half_life_seconds)
+
+    def needs_keyframe(self, timestamp: float) -> bool:
+        """Whether this frame should get a full detection rather than a prediction."""
+        with self._lock:
+            if self.frames_since_keyframe is None or self.frames_since_keyframe + 1 >= self.keyframe_interval:
+                return True
+            # With nothing tracked there is nothing to predict, so every frame is a keyframe
+            return self.tracking_confidence(timestamp) < self.min_confidence
+
+    # ------------------------
+    # Updates
+    # ------------------------
+    def _predict_box(self, track: Dict, timestamp: float) -> List[float]:
+        elapsed = max(0.0, timestamp - track["updated_at"])
+        box = [coord + velocity * elapsed for coord, velocity in zip(track["box"], track["velocity"])]
+        if self.frame_size:
+            width, height = self.frame_size
+            box = [min(max(box[0], 0.0), width), min(max(box[1], 0.0), height),
+                   min(max(box[2], 0.0), width), min(max(box[3], 0.0), height)]
+        return box
+
+    def update(self, detections: List[Dict], timestamp: float,
+               frame_size: Optional[Tuple[float, float]] = None) -> List[Dict]:
+        """
+        Match a keyframe's detections to tracks and return them with a "track_id".
+
+        Args:
+            detections: Dicts with "class_id", "box" (x1, y1, x2, y2) and "confidence"
+            timestamp: Capture time of the frame, in seconds
+            frame_size: (width, height) boxes are clipped to when predicting
+        """
+        with self._lock:
+            self.frames_since_keyframe = 0
+            self.last_seen = time.time()
+            if frame_size:
+                self.frame_size = frame_size
+            predicted = [self._predict_box(track, timestamp) for track in self.tracks]
+
+            # Greedy assignment by descending IoU, same class only
+            pairs = sorted(
+                ((iou(predicted[t], detection["box"]), t, d)
+                 for t, track in enumerate(self.tracks)
+                 for d, detection in enumerate(detections)
+                 if track["class_id"] == detection["class_id"]),
+                reverse=True,
+            )
+            matched_tracks, matched_detections = set(), {}
+            for overlap, t, d in pairs:
+                if overlap < self.iou_threshold:
+                    break
+                if t in matched_tracks or d in matched_detections:
+                    continue
+                matched_tracks.add(t)
+                matched_detections[d] = t
+
+            for d, t in matched_detections.items():
+                track, detection = self.tracks[t], detections[d]
+                elapsed = timestamp - track["updated_at"]
+                if elapsed > 0:
+                    alpha = self.velocity_smoothing
+                    track["velocity"] = [
+                        (1 - alpha) * velocity + alpha * (new - old) / elapsed
+                        for velocity, new, old in zip(track["velocity"], detection["box"], track["box"])
+                    ]
+                track.update(box=list(detection["box"]), confidence=detection["confidence"],
+                             updated_at=timestamp, misses=0)
+                track["hits"] += 1
+
+            track_ids = {d: self.tracks[t]["track_id"] for d, t in matched_detections.items()}
+            survivors = []
+            for t, track in enumerate(self.tracks):
+                if t not in matched_tracks:
+                    track["misses"] += 1
+                    if track["misses"] > self.max_misses:
+                        continue
+                survivors.append(track)
+            for d, detection in enumerate(detections):
+                if d not in track_ids:
+                    track_ids[d] = next(self._ids)
+                    survivors.append({"track_id": track_ids[d], "class_id": detection["class_id"],
+                                      "box": list(detection["box"]), "velocity": [0.0, 0.0, 0.0, 0.0],
+                                      "confidence": detection["confidence"], "updated_at": timestamp,
+                                      "hits": 1, "misses": 0})
+            self.tracks = survivors
+
+            return [{**detection, "track_id": track_ids[d]} for d, detection in enumerate(detections)]
+
+    def predict(self, timestamp: float) -> List[Dict]:
+        """Tracks extrapolated to timestamp, for frames that skip detection."""
+        with self._lock:
+            if self.frames_since_keyframe is not None:
+                self.frames_since_keyframe += 1
+            self.last_seen = time.time()
+            objects = []
+            for track in self.tracks:
+                if track["misses"]:
+                    continue  # not seen on the last keyframe; don't keep drawing it
+                box = self._predict_box(track, timestamp)
+                if box[2] <= box[0] or box[3] <= box[1]:
+                    continue  # moved out of frame
+                objects.append({"class_id": track["class_id"], "box": box, "track_id": track["track_id"],
+                                "confidence": self._predicted_confidence(track, timestamp)})
+            return objects
+
+
+class tracker_registry:
+    def __init__(self, ttl_seconds: int = 600, **tracker_options):
+        """One object_tracker per session, forgotten after ttl_seconds without frames."""
+        self.ttl_seconds = ttl_seconds
+        self.tracker_options = tracker_options
+        self.trackers: Dict[str, object_tracker] = {}
+        self.stats = {"keyframes": 0, "predicted_frames": 0}
+        self._lock = threading.Lock()
+        self._expiry = expiry.group("object_trackers", self._forget_sessions, default_ttl=ttl_seconds)
+
+    def _forget_sessions(self, session_ids: List[str]) -> None:
+        with self._lock:
+            for session_id in session_ids:
+                self.trackers.pop(session_id, None)
+
+    def for_session(self, session_id: str) -> object_tracker:
+        self._expiry.touch(session_id)
+        with self._lock:
+            tracker = self.trackers.get(session_id)
+            if tracker is None:
+                tracker = self.trackers[session_id] = object_tracker(**self.tracker_options)
+            return tracker
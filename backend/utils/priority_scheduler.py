@@ -0,0 +1,113 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .metrics import metrics
+from .request_profiler import profiled
+
+# Highest priority first
+PRIORITY_CLASSES = ("interactive", "session_start", "frames", "background")
+
+
+class job_shed(Exception):
+    """A queued job was dropped because it waited longer than its class allows."""
+
+
+class priority_scheduler:
+    def __init__(self, max_concurrency: int = 4, reserved_interactive: int = 1,
+                 class_limits: Optional[Dict[str, int]] = None, max_wait_seconds: Optional[Dict[str, float]] = None):
+        """
+        Runs blocking work off the event loop in strict priority order.
+
+        Whenever a slot frees, the waiting job of the highest class gets it, so
+        a conversation turn never queues behind frames or background work.
+        Lower classes are deferred: they can't take the slots reserved for
+        interactive work, and a class with a max wait sheds jobs that have been
+        queued too long instead of running stale work.
+
+        Must be used from a single event loop.
+
+        Args:
+            max_concurrency: Jobs running at once, across all classes
+            reserved_interactive: Slots only "interactive" jobs may use
+            class_limits: Per-class caps on jobs running at once (e.g. one YOLO in-process)
+            max_wait_seconds: Per-class queue time after which jobs are shed (job_shed)
+        """
+        self.max_concurrency = max_concurrency
+        self.reserved_interactive = min(reserved_interactive, max_concurrency - 1)
+        self.class_limits = class_limits or {}
+        self.max_wait_seconds = max_wait_seconds or {}
+        self.running: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self.queued: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self.stats: Dict[str, Dict[str, int]] = {name: {"completed": 0, "shed": 0} for name in PRIORITY_CLASSES}
+        self._waiting: List = []  # heap of (rank, sequence, priority_class, enqueued_at, future)
+        self._sequence = itertools.count()
+
+    async def run(self, priority_class: str, func: Callable, *args: Any) -> Any:
+        """Run func(*args) in priority_class; sync functions go to a thread, coroutines are awaited."""
+        if priority_class not in self.running:
+            raise ValueError(f"Unknown priority class: {priority_class}")
+        enqueued_at = time.perf_counter()
+        granted = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (PRIORITY_CLASSES.index(priority_class), next(self._sequence),
+                                       priority_class, enqueued_at, granted))
+        self.queued[priority_class] += 1
+        self._dispatch()
+        try:
+            await granted
+        except asyncio.CancelledError:
+            if granted.done() and not granted.cancelled() and granted.exception() is None:
+                self._release(priority_class)  # granted just as we were cancelled
+            raise
+
+        metrics.observe("grounded_scheduler_wait_seconds", time.perf_counter() - enqueued_at, priority=priority_class)
+        try:
+            if inspect.iscoroutinefunction(func):
+                return await func(*args)
+            return await asyncio.to_thread(profiled, func, *args)
+        finally:
+            self.stats[priority_class]["completed"] += 1
+            self._release(priority_class)
+
+    def _release(self, priority_class: str) -> None:
+        self.running[priority_class] -= 1
+        self._dispatch()
+
+    def _can_start(self, priority_class: str) -> bool:
+        total = sum(self.running.values())
+        limit = self.max_concurrency if priority_class == "interactive" else self.max_concurrency - self.reserved_interactive
+        if total >= limit:
+            return False
+        class_limit = self.class_limits.get(priority_class)
+        return class_limit is None or self.running[priority_class] < class_limit
+
+    def _dispatch(self) -> None:
+        """Grant slots to waiting jobs, best class first; a capped class doesn't block the ones below it."""
+        now = time.perf_counter()
+        blocked = []
+        while self._waiting and sum(self.running.values()) < self.max_concurrency:
+            entry = heapq.heappop(self._waiting)
+            _, _, priority_class, enqueued_at, granted = entry
+            if granted.done():  # cancelled while queued
+                self.queued[priority_class] -= 1
+                continue
+            max_wait = self.max_wait_seconds.get(priority_class)
+            if max_wait is not None and now - enqueued_at > max_wait:
+                self.queued[priority_class] -= 1
+                self.stats[priority_class]["shed"] += 1
+                granted.set_exception(job_shed(f"{priority_class} job waited more than {max_wait}s"))
+                continue
+            if not self._can_start(priority_class):
+                blocked.append(entry)
+                if priority_class != "interactive" and sum(self.running.values()) >= \
+                        self.max_concurrency - self.reserved_interactive:
+                    break  # only interactive work may start now, and none is waiting ahead of this
+                continue
+            self.queued[priority_class] -= 1
+            self.running[priority_class] += 1
+            granted.set_result(None)
+        for entry in blocked:
+            heapq.heappush(self._waiting, entry)
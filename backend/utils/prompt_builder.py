@@ -0,0 +1,129 @@
+import math
+import os
+import re
+from string import Formatter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Default upper bound for a single assembled prompt (template + scene + history)
+DEFAULT_PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1200"))
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local token estimate, close enough to BPE tokenizers for budgeting.
+
+    Words count as one token per ~4 characters, punctuation as one token each.
+    """
+    if not text:
+        return 0
+    count = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        count += math.ceil(len(piece) / 4) if piece[0].isalnum() or piece[0] == "_" else 1
+    return count
+
+
+class prompt_builder:
+    def __init__(self, token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET,
+                 estimator: Callable[[str], int] = estimate_tokens):
+        """
+        Assemble LLM prompts from pre-compiled templates under a token budget.
+
+        Args:
+            token_budget: Maximum estimated tokens for an assembled prompt
+            estimator: Function mapping text to an estimated token count
+        """
+        self.token_budget = token_budget
+        self.estimator = estimator
+        self.templates: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, name: str, template: str) -> None:
+        """
+        Compile a str.format-style template once.
+
+        Literal segments are stored with their token counts so that building
+        a prompt only has to estimate the dynamic fields.
+        """
+        segments: List[Tuple[str, Optional[str]]] = []
+        static_tokens = 0
+        for literal, field, _, _ in Formatter().parse(template):
+            segments.append((literal, field))
+            static_tokens += self.estimator(literal)
+        self.templates[name] = {"segments": segments, "static_tokens": static_tokens}
+
+    def render(self, name: str, /, **fields: Any) -> Tuple[str, int]:
+        """
+        Fill a compiled template.
+
+        Returns:
+            (prompt text, estimated token count)
+        """
+        compiled = self.templates[name]
+        parts = []
+        tokens = compiled["static_tokens"]
+        for literal, field in compiled["segments"]:
+            parts.append(literal)
+            if field is not None:
+                value = str(fields.get(field, ""))
+                parts.append(value)
+                tokens += self.estimator(value)
+        return "".join(parts), tokens
+
+    def fit_items(self, items: Sequence[str], budget: int, separator_tokens: int = 1) -> List[str]:
+        """Keep items in order until the next one would exceed the budget."""
+        kept = []
+        used = 0
+        for item in items:
+            cost = self.estimator(item) + (separator_tokens if kept else 0)
+            if used + cost > budget:
+                break
+            kept.append(item)
+            used += cost
+        return kept
+
+    def build(self, name: str, fields: Dict[str, Any], scene_objects: Sequence[str] = None,
+              scene_template: str = None) -> Tuple[str, int]:
+        """
+        Build a prompt from a template, then append as many scene objects as fit.
+
+        Priority order is: template and its fields, scene objects, and whatever
+        budget remains is left for conversation history (see remaining_budget).
+
+        Returns:
+            (prompt text, estimated token count)
+        """
+        prompt, tokens = self.render(name, **fields)
+
+        if scene_objects and scene_template:
+            scene_static = self.templates[scene_template]["static_tokens"]
+            available = self.token_budget - tokens - scene_static
+            kept = self.fit_items(scene_objects, available)
+            if kept:
+                scene_text, scene_tokens = self.render(scene_template, objects=", ".join(kept))
+                prompt += scene_text
+                tokens += scene_tokens
+
+        return prompt, tokens
+
+    def remaining_budget(self, prompt: str) -> int:
+        """Tokens still available once the given prompt is accounted for."""
+        return max(0, self.token_budget - self.estimator(prompt))
+
+    def fit_history(self, turns: Sequence[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        """
+        Keep the most recent conversation turns that fit the budget.
+
+        Turns are dicts with "user_message" and "llm_response", as stored in
+        llm_communication.message_history. Returned oldest first.
+        """
+        kept = []
+        used = 0
+        for turn in reversed(turns):
+            cost = self.estimator(turn["user_message"]) + self.estimator(turn["llm_response"]) + 4
+            if used + cost > budget:
+                break
+            kept.append(turn)
+            used += cost
+        kept.reverse()
+        return kept
@@ -0,0 +1,306 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from html import escape
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    """Stack of a frame, root first, as a ';'-joined collapsed-stack key."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+class request_profiler:
+    def __init__(self, sample_interval_ms: float = 5.0):
+        """
+        On-demand profiler for selected requests, aggregated per endpoint.
+
+        Off by default: the server middleware only checks `self.enabled`.
+
+        A profiled request covers its tasks on the event loop and the worker
+        threads running its blocking work (LLM, TTS, in-process YOLO), which
+        see it through current_profile when run via profiled(). Other
+        requests interleaving on the loop aren't charged to it. Inference in
+        detector worker processes isn't profiled; their time shows up as the
+        wait for the result.
+
+        Args:
+            sample_interval_ms: Stack sampling period in "sampling" mode
+        """
+        self.enabled = False
+        self.mode = "sampling"
+        self.sample_interval_ms = sample_interval_ms
+        self.remaining_requests = 0
+        self.match_header: Optional[Tuple[str, str]] = None
+        self.endpoint_filter: Optional[str] = None
+        # endpoint -> collapsed stack -> weight (samples, or microseconds in deterministic mode)
+        self.stacks: Dict[str, Counter] = {}
+        self.profiled_requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # thread id -> {"sampling", "tracing": sessions using it, "loop": its event loop, "session": a worker's job}
+        self._threads: Dict[int, Dict] = {}
+        self._task_sessions: Dict[asyncio.Task, "_profile_session"] = {}
+        self._local = threading.local()  # per-thread state of the deterministic hook
+        self._sampler: Optional[threading.Thread] = None
+
+    # ------------------------
+    # Arming / selection
+    # ------------------------
+    def start(self, requests: int = 10, mode: str = "sampling", match_header: Tuple[str, str] = None,
+              endpoint: str = None, sample_interval_ms: float = None) -> None:
+        """Profile the next N requests (optionally only those on an endpoint or carrying a header value)."""
+        if mode not in ("sampling", "deterministic"):
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.mode = mode
+        self.remaining_requests = requests
+        self.match_header = (match_header[0].lower(), match_header[1]) if match_header else None
+        self.endpoint_filter = endpoint
+        if sample_interval_ms is not None:
+            self.sample_interval_ms = sample_interval_ms
+        self.enabled = True
+
+    def stop(self) -> None:
+        self.enabled = False
+        self.remaining_requests = 0
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stacks.clear()
+            self.profiled_requests.clear()
+
+    def should_profile(self, endpoint: str, headers) -> bool:
+        """Whether this request is selected; consumes one unit of the request budget."""
+        if self.endpoint_filter and endpoint != self.endpoint_filter:
+            return False
+        if self.match_header and headers.get(self.match_header[0]) != self.match_header[1]:
+            return False
+        with self._lock:
+            if self.remaining_requests <= 0:
+                self.enabled = False
+                return False
+            self.remaining_requests -= 1
+            if self.remaining_requests == 0:
+                self.enabled = False
+        return True
+
+    # ------------------------
+    # Collection
+    # ------------------------
+    def begin(self, endpoint: str) -> "_profile_session":
+        """Start profiling the current request; call from its task on the event loop, returns a token for end()."""
+        with self._lock:
+            self.profiled_requests[endpoint] = self.profiled_requests.get(endpoint, 0) + 1
+        session = _profile_session(self, endpoint, self.mode)
+        session.context_token = current_profile.set(session)
+        loop = asyncio.get_running_loop()
+        if session.mode == "sampling":
+            self._install_task_factory(loop)
+            session.task = asyncio.current_task()
+            with self._lock:
+                self._task_sessions[session.task] = session
+        self._enter_thread(session, loop)
+        return session
+
+    def end(self, session: "_profile_session") -> None:
+        self._exit_thread(session)
+        if session.task is not None:
+            with self._lock:
+                self._task_sessions.pop(session.task, None)
+        current_profile.reset(session.context_token)
+
+    def _enter_thread(self, session: "_profile_session", loop: asyncio.AbstractEventLoop = None) -> None:
+        """Count a session as using this thread; the first deterministic one installs the profile hook."""
+        thread_id = threading.get_ident()
+        with self._lock:
+            entry = self._threads.get(thread_id)
+            if entry is None:
+                # A loop thread's samples go to the session of the running task, a worker's to its job's
+                entry = self._threads[thread_id] = {"sampling": 0, "tracing": 0, "loop": loop, "session": session}
+            if session.mode == "deterministic":
+                entry["tracing"] += 1
+                install = entry["tracing"] == 1
+            else:
+                entry["sampling"] += 1
+                install = False
+                if self._sampler is None:
+                    self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                    self._sampler.start()
+        if install:
+            self._local.counts = Counter()
+            self._local.previous = None
+            self._local.last = time.perf_counter()
+            sys.setprofile(self._trace)
+
+    def _exit_thread(self, session: "_profile_session") -> None:
+        """Undo _enter_thread; the hook is removed only when no deterministic session uses the thread."""
+        thread_id = threading.get_ident()
+        with self._lock:
+            entry = self._threads[thread_id]
+            entry["tracing" if session.mode == "deterministic" else "sampling"] -= 1
+            uninstall = session.mode == "deterministic" and entry["tracing"] == 0
+            if not entry["tracing"] and not entry["sampling"]:
+                del self._threads[thread_id]
+        if session.mode == "deterministic":
+            if uninstall:
+                sys.setprofile(None)
+            self._flush_thread()
+
+    def _trace(self, frame, event, arg) -> None:
+        """Profile hook: time since the last event goes to the stack and session that were current then."""
+        now = time.perf_counter()
+        local = self._local
+        if local.previous is not None:
+            local.counts[local.previous] += (now - local.last) * 1e6
+        # Other requests interleaving on the event loop run in their own contexts, so aren't charged
+        session = current_profile.get()
+        local.previous = (session.endpoint, _collapse(frame)) \
+            if session is not None and session.mode == "deterministic" else None
+        local.last = time.perf_counter()
+
+    def _flush_thread(self) -> None:
+        counts, self._local.counts = self._local.counts, Counter()  # the hook may still be installed
+        with self._lock:
+            for (endpoint, stack), weight in counts.items():
+                self.stacks.setdefault(endpoint, Counter())[stack] += weight
+
+    def _install_task_factory(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Tag tasks created by a sampled request (e.g. by call_next) so loop-thread samples can be attributed."""
+        previous = loop.get_task_factory()
+        if getattr(previous, "profiler", None) is self:
+            return
+
+        def factory(loop, coro, **kwargs):
+            task = previous(loop, coro, **kwargs) if previous else asyncio.Task(coro, loop=loop, **kwargs)
+            session = current_profile.get()
+            if session is not None and session.mode == "sampling":
+                with self._lock:
+                    self._task_sessions[task] = session
+                task.add_done_callback(self._forget_task)
+            return task
+
+        factory.profiler = self
+        loop.set_task_factory(factory)
+
+    def _forget_task(self, task: asyncio.Task) -> None:
+        with self._lock:
+            self._task_sessions.pop(task, None)
+
+    def _sample_loop(self) -> None:
+        interval = self.sample_interval_ms / 1000
+        while True:
+            with self._lock:
+                sampled = [(thread_id, entry["loop"], entry["session"])
+                           for thread_id, entry in self._threads.items() if entry["sampling"]]
+                if not sampled:
+                    self._sampler = None
+                    return
+            frames = sys._current_frames()
+            for thread_id, loop, session in sampled:
+                if loop is not None:
+                    # The event loop interleaves requests: sample only while one of the session's tasks runs
+                    with self._lock:
+                        session = self._task_sessions.get(asyncio.current_task(loop))
+                frame = frames.get(thread_id)
+                if frame is not None and session is not None:
+                    stack = _collapse(frame)
+                    with self._lock:
+                        self.stacks.setdefault(session.endpoint, Counter())[stack] += 1
+            del frames
+            time.sleep(interval)
+
+    # ------------------------
+    # Output
+    # ------------------------
+    def collapsed(self, endpoint: str = None) -> str:
+        """Brendan Gregg collapsed-stack format, one 'stack weight' line per stack."""
+        merged = Counter()
+        with self._lock:
+            for name, stacks in self.stacks.items():
+                if endpoint is None or name == endpoint:
+                    for stack, weight in stacks.items():
+                        merged[f"{name};{stack}"] += weight
+        return "".join(f"{stack} {int(weight)}\n" for stack, weight in merged.most_common())
+
+    def flamegraph_svg(self, endpoint: str = None, width: int = 1200, row_height: int = 16) -> str:
+        """A minimal self-contained flamegraph of the collapsed stacks."""
+        root: Dict = {"children": {}, "weight": 0}
+        for line in self.collapsed(endpoint).splitlines():
+            stack, weight = line.rsplit(" ", 1)
+            node = root
+            node["weight"] += int(weight)
+            for label in stack.split(";"):
+                node = node["children"].setdefault(label, {"children": {}, "weight": 0})
+                node["weight"] += int(weight)
+
+        def depth_of(node: Dict) -> int:
+            return 1 + max((depth_of(child) for child in node["children"].values()), default=0)
+
+        total = root["weight"] or 1
+        height = (depth_of(root) - 1) * row_height
+        rects: List[str] = []
+
+        def layout(node: Dict, x: float, depth: int) -> None:
+            # Roots at the bottom, callees stacked above, like a flamegraph
+            y = height - (depth + 1) * row_height
+            for label, child in sorted(node["children"].items()):
+                child_width = child["weight"] / total * width
+                if child_width >= 0.5:
+                    hue = 20 + (hash(label) % 40)
+                    text = f'<text x="{x + 3:.1f}" y="{y + row_height - 4}" font-size="11" font-family="monospace">' \
+                           f'{escape(label[:int(child_width / 7)])}</text>' if child_width > 30 else ""
+                    rects.append(
+                        f'<g><title>{escape(label)} ({child["weight"]}, {child["weight"] / total:.1%})</title>'
+                        f'<rect x="{x:.1f}" y="{y}" width="{child_width:.1f}" height="{row_height - 1}" '
+                        f'fill="hsl({hue},80%,60%)"/>{text}</g>'
+                    )
+                    layout(child, x, depth + 1)
+                x += child_width
+
+        layout(root, 0.0, 0)
+        return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                f'viewBox="0 0 {width} {height}">{"".join(rects)}</svg>')
+
+
+class _profile_session:
+    """One profiled request, visible to its tasks and worker threads through current_profile."""
+
+    def __init__(self, profiler: request_profiler, endpoint: str, mode: str):
+        self.profiler = profiler
+        self.endpoint = endpoint
+        self.mode = mode
+        self.task: Optional[asyncio.Task] = None
+        self.context_token = None
+
+
+# Request being profiled in this context (copied into worker threads by asyncio.to_thread)
+current_profile: ContextVar[Optional[_profile_session]] = ContextVar("current_profile", default=None)
+
+
+def profiled(func: Callable, *args: Any) -> Any:
+    """
+    Call func(*args), profiling the calling thread if the request that queued it is being profiled.
+
+    Wrap blocking work handed to a worker thread (asyncio.to_thread copies
+    the request's context), so the profile covers the thread that does it.
+    """
+    session = current_profile.get()
+    if session is None:
+        return func(*args)
+    session.profiler._enter_thread(session)
+    try:
+        return func(*args)
+    finally:
+        session.profiler._exit_thread(session)
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+SNAPSHOT_MAGIC = b"GRSNAP1\0"
+# Value block: flags, key length, value length, then the key and the (maybe compressed) JSON value
+BLOCK_HEADER = struct.Struct("<BHI")
+# Index entry: key hash, block offset, block length; entries are sorted by hash
+INDEX_ENTRY = struct.Struct("<QQI")
+# Last bytes of the file: index offset, entry count, live value bytes, magic
+TRAILER = struct.Struct("<QQQ8s")
+COMPRESSED = 1
+COMPRESS_OVER_BYTES = 256
+
+
+def key_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+
+class session_snapshot:
+    def __init__(self, path: str, compact_ratio: float = 0.5):
+        """
+        Keyed session state in one append-only, memory-mapped file.
+
+        Opening only maps the file and reads its fixed-size trailer, so a
+        restart costs the same with 100 sessions or 100k. get() finds a key
+        by binary search over the sorted index in the mapping and decodes
+        just that value, so state is restored when a session first comes
+        back, not at boot.
+
+        write() appends only the values that changed since the last write,
+        then a new index and trailer, so after a crash mid-write the file is
+        read up to the last complete trailer. Once live values are less than compact_ratio of the file
+        (superseded values and old indexes being the rest) it is rewritten
+        with just those.
+
+        Args:
+            path: Snapshot file (created on first write)
+            compact_ratio: Live-bytes fraction below which the file is compacted
+        """
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self._lock = threading.Lock()  # guards the mapping while it is swapped for a new one
+        self._write_lock = threading.Lock()
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._index_offset = 0
+        self._entries = 0
+        self._live_bytes = 0
+        self._written_crcs: Dict[str, int] = {}  # key -> crc of the value last written by this process
+        self.stats = {"writes": 0, "values_written": 0, "values_unchanged": 0, "compactions": 0, "corrupt": 0}
+        self._open()
+
+    # ------------------------
+    # Reading
+    # ------------------------
+    def _open(self) -> None:
+        self._close_map()
+        self._index_offset = self._entries = self._live_bytes = 0
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < len(SNAPSHOT_MAGIC) + TRAILER.size:
+            return
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            self.stats["corrupt"] += 1
+            self._close_map()
+            return
+        # Normally the trailer is the last thing in the file; after a crash mid-write, the last complete one
+        end = len(self._map)
+        while end >= len(SNAPSHOT_MAGIC) + TRAILER.size:
+            index_offset, entries, live_bytes, magic = TRAILER.unpack_from(self._map, end - TRAILER.size)
+            if magic == SNAPSHOT_MAGIC and index_offset + entries * INDEX_ENTRY.size == end - TRAILER.size:
+                self._index_offset, self._entries, self._live_bytes = index_offset, entries, live_bytes
+                return
+            self.stats["corrupt"] += 1
+            end = self._map.rfind(SNAPSHOT_MAGIC, len(SNAPSHOT_MAGIC), end - 1) + len(SNAPSHOT_MAGIC)
+        self._close_map()
+
+    def _close_map(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _find(self, hashed: int) -> Optional[Tuple[int, int]]:
+        """(offset, length) of the block indexed under hashed, by binary search in the mapped index."""
+        low, high = 0, self._entries
+        while low < high:
+            middle = (low + high) // 2
+            entry_hash, offset, length = INDEX_ENTRY.unpack_from(self._map, self._index_offset + middle * INDEX_ENTRY.size)
+            if entry_hash == hashed:
+                return offset, length
+            if entry_hash < hashed:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _decode(self, offset: int) -> Tuple[str, Any]:
+        flags, key_length, value_length = BLOCK_HEADER.unpack_from(self._map, offset)
+        start = offset + BLOCK_HEADER.size
+        key = self._map[start:start + key_length].decode()
+        value = self._map[start + key_length:start + key_length + value_length]
+        if flags & COMPRESSED:
+            value = zlib.decompress(value)
+        return key, json.loads(value)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """The value last written for key, or default."""
+        with self._lock:
+            if self._map is None:
+                return default
+            location = self._find(key_hash(key))
+            if location is None:
+                return default
+            stored_key, value = self._decode(location[0])
+            return value if stored_key == key else default  # 64-bit hash collision
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _missing) is not _missing
+
+    def __len__(self) -> int:
+        return self._entries
+
+    def keys(self) -> List[str]:
+        """Every stored key; reads each block's header, so meant for occasional maintenance off the event loop."""
+        with self._lock:
+            keys = []
+            for _, offset, _ in INDEX_ENTRY.iter_unpack(
+                    self._map[self._index_offset:self._index_offset + self._entries * INDEX_ENTRY.size]
+                    if self._map is not None else b""):
+                _, key_length, _ = BLOCK_HEADER.unpack_from(self._map, offset)
+                start = offset + BLOCK_HEADER.size
+                keys.append(self._map[start:start + key_length].decode())
+            return keys
+
+    def size_bytes(self) -> int:
+        return len(self._map) if self._map is not None else 0
+
+    # ------------------------
+    # Writing
+    # ------------------------
+    def _encode(self, key: str, value: Any) -> bytes:
+        encoded_key = key.encode()
+        encoded = json.dumps(value, separators=(",", ":"), default=str).encode()
+        flags = 0
+        if len(encoded) > COMPRESS_OVER_BYTES:
+            encoded, flags = zlib.compress(encoded, 1), COMPRESSED
+        return BLOCK_HEADER.pack(flags, len(encoded_key), len(encoded)) + encoded_key + encoded
+
+    def _current_index(self) -> Dict[int, Tuple[int, int]]:
+        if self._map is None:
+            return {}
+        return {entry_hash: (offset, length) for entry_hash, offset, length in INDEX_ENTRY.iter_unpack(
+            self._map[self._index_offset:self._index_offset + self._entries * INDEX_ENTRY.size])}
+
+    def write(self, changes: Dict[str, Any]) -> int:
+        """
+        Persist changed keys (a value of None deletes the key); blocking, call off the event loop.
+
+        Values identical to what this process last wrote are skipped. Returns
+        the number of values written.
+        """
+        with self._write_lock:
+            blocks: List[Tuple[str, Optional[bytes]]] = []
+            for key, value in changes.items():
+                if value is None:
+                    blocks.append((key, None))
+                    self._written_crcs.pop(key, None)
+                    continue
+                block = self._encode(key, value)
+                crc = zlib.crc32(block)
+                if self._written_crcs.get(key) == crc:
+                    self.stats["values_unchanged"] += 1
+                    continue
+                self._written_crcs[key] = crc
+                blocks.append((key, block))
+            if not blocks:
+                return 0
+
+            # Readers keep using the current mapping while the new values go in after it
+            index = self._current_index()
+            live_bytes = self._live_bytes
+            new_file = self._map is None
+            with open(self.path, "ab" if not new_file else "wb") as f:
+                if new_file:
+                    f.write(SNAPSHOT_MAGIC)
+                offset = f.tell()
+                for key, block in blocks:
+                    hashed = key_hash(key)
+                    previous = index.pop(hashed, None)
+                    if previous is not None:
+                        live_bytes -= previous[1]
+                    if block is None:
+                        continue
+                    f.write(block)
+                    index[hashed] = (offset, len(block))
+                    live_bytes += len(block)
+                    offset += len(block)
+                self._write_index(f, index, live_bytes)
+                f.flush()
+                os.fsync(f.fileno())
+            with self._lock:
+                self._open()
+            self.stats["writes"] += 1
+            self.stats["values_written"] += sum(block is not None for _, block in blocks)
+            if self._live_bytes < self.compact_ratio * (self._index_offset - len(SNAPSHOT_MAGIC)):
+                self._compact()
+            return len(blocks)
+
+    def _write_index(self, f, index: Dict[int, Tuple[int, int]], live_bytes: int) -> None:
+        index_offset = f.tell()
+        f.write(b"".join(INDEX_ENTRY.pack(hashed, *index[hashed]) for hashed in sorted(index)))
+        f.write(TRAILER.pack(index_offset, len(index), live_bytes, SNAPSHOT_MAGIC))
+
+    def _compact(self) -> None:
+        """Rewrite the file with only live values (caller holds the write lock)."""
+        temporary = self.path + ".compacting"
+        index = self._current_index()
+        compacted: Dict[int, Tuple[int, int]] = {}
+        with open(temporary, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            for hashed, (offset, length) in sorted(index.items(), key=lambda item: item[1][0]):
+                compacted[hashed] = (f.tell(), length)
+                f.write(self._map[offset:offset + length])
+            self._write_index(f, compacted, sum(length for _, length in compacted.values()))
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self._close_map()
+            os.replace(temporary, self.path)
+            self._open()
+        self.stats["compactions"] += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_map()
+
+
+_missing = object()
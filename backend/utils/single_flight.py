@@ -0,0 +1,70 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class single_flight:
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 1024):
+        """
+        Coalesce concurrent calls with the same key and briefly cache their results.
+
+        Args:
+            ttl_seconds: How long a finished result is served to repeated calls
+            max_entries: Upper bound on cached results (oldest evicted first)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._results: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {"executed": 0, "coalesced": 0, "cache_hits": 0}
+
+    def _evict_expired(self, now: float) -> None:
+        while self._results:
+            key, (expires_at, _) = next(iter(self._results.items()))
+            if expires_at > now and len(self._results) <= self.max_entries:
+                break
+            self._results.popitem(last=False)
+
+    def has(self, key: Hashable) -> bool:
+        """True if a call with this key is in flight or has a fresh cached result."""
+        if key in self._in_flight:
+            return True
+        entry = self._results.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run func once per key: callers arriving while it runs share its result,
+        and callers arriving within the TTL afterwards get the cached result.
+        Failures are shared with waiting callers but never cached. Cancelling
+        a caller, the first one included, does not cancel the shared call.
+        """
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        entry = self._results.get(key)
+        if entry is not None:
+            self.stats["cache_hits"] += 1
+            return entry[1]
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        # The work runs as its own task, so a caller that is cancelled (client gone,
+        # deadline) leaves it running for everyone else waiting on the key
+        task = asyncio.ensure_future(func())
+        self._in_flight[key] = task
+        self.stats["executed"] += 1
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future) -> None:
+        self._in_flight.pop(key, None)
+        if task.cancelled():
+            return
+        # Retrieve the exception in case every caller has gone; failures are never cached
+        if task.exception() is None:
+            self._results[key] = (time.monotonic() + self.ttl_seconds, task.result())
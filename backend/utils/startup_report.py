@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from .structured_logger import logger
+
+
+class startup_report:
+    def __init__(self):
+        """
+        Tracks how long each subsystem takes to import and initialize, and
+        runs slow initializers in the background so the app can answer /health
+        while models load.
+        """
+        self.created_at = time.perf_counter()
+        self.phases: List[Dict] = []
+        self.errors: Dict[str, str] = {}
+        self._ready: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, subsystem: str, step: str):
+        """Time one step (e.g. "import", "init", "warmup") of a subsystem."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(subsystem, step, time.perf_counter() - start, start)
+
+    def record(self, subsystem: str, step: str, seconds: float, started_at: float = None) -> None:
+        with self._lock:
+            self.phases.append({
+                "subsystem": subsystem,
+                "step": step,
+                "seconds": round(seconds, 4),
+                "started_after_seconds": round((started_at or time.perf_counter()) - self.created_at, 4),
+            })
+
+    def start_background(self, subsystem: str, initializer: Callable[[], None]) -> None:
+        """Run an initializer on its own thread; wait_for(subsystem) resolves when it finishes."""
+        ready = self._ready.setdefault(subsystem, threading.Event())
+
+        def run():
+            try:
+                initializer()
+            except Exception as e:
+                self.errors[subsystem] = str(e)
+                logger.error("startup.failed", subsystem=subsystem, error=str(e))
+            finally:
+                ready.set()
+                if all(event.is_set() for event in self._ready.values()):
+                    logger.info("startup.complete", **self.report())
+
+        threading.Thread(target=run, name=f"startup-{subsystem}", daemon=True).start()
+
+    def is_ready(self, subsystem: str) -> bool:
+        ready = self._ready.get(subsystem)
+        return ready is not None and ready.is_set() and subsystem not in self.errors
+
+    def wait_ready(self, subsystem: str, timeout: float = None) -> bool:
+        """Blocking wait_for, for initializers that depend on another subsystem."""
+        ready = self._ready.get(subsystem)
+        if ready is None:
+            return False
+        ready.wait(timeout)
+        return self.is_ready(subsystem)
+
+    async def wait_for(self, subsystem: str, timeout: float) -> bool:
+        """Wait without blocking the event loop; False if not ready in time or it failed."""
+        ready = self._ready.get(subsystem)
+        if ready is None:
+            return False
+        if not ready.is_set():
+            await asyncio.to_thread(ready.wait, timeout)
+        return self.is_ready(subsystem)
+
+    def report(self) -> Dict:
+        """Per-subsystem breakdown of import and initialization costs."""
+        subsystems: Dict[str, Dict] = {}
+        with self._lock:
+            phases = list(self.phases)
+        for phase in phases:
+            entry = subsystems.setdefault(phase["subsystem"], {"total_seconds": 0.0, "steps": {}})
+            entry["steps"][phase["step"]] = phase["seconds"]
+            entry["total_seconds"] = round(entry["total_seconds"] + phase["seconds"], 4)
+        for name, event in self._ready.items():
+            entry = subsystems.setdefault(name, {"total_seconds": 0.0, "steps": {}})
+            entry["ready"] = self.is_ready(name)
+            if name in self.errors:
+                entry["error"] = self.errors[name]
+        return {
+            "uptime_seconds": round(time.perf_counter() - self.created_at, 3),
+            "all_ready": all(self.is_ready(name) for name in self._ready),
+            "subsystems": subsystems,
+        }
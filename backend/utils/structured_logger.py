@@ -0,0 +1,140 @@
+import atexit
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, TextIO
+
+# Request-scoped identifiers attached to every record (set by the server middleware)
+current_request_id: ContextVar[str] = ContextVar("current_request_id", default="")
+current_session_id: ContextVar[str] = ContextVar("current_session_id", default="")
+
+# Per-event sampling rates (0..1); unlisted events are always logged.
+# Override with LOG_SAMPLE_RATES="frame.cumulative_objects=0.1,text.turn=1"
+DEFAULT_SAMPLE_RATES = {
+    "frame.cumulative_objects": 0.02,
+}
+
+
+def _parse_sample_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            event, rate = item.split("=", 1)
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+class structured_logger:
+    def __init__(self, stream: TextIO = None, max_queue: int = 10000, sample_rates: Dict[str, float] = None):
+        """
+        JSON-lines logger whose writes happen on a background thread.
+
+        Records are dropped (and counted) rather than blocking the caller when
+        the buffer is full.
+
+        Args:
+            stream: Where records are written (default: stdout)
+            max_queue: Records buffered before new ones are dropped
+            sample_rates: Fraction of records kept per event type
+        """
+        self.stream = stream or sys.stdout
+        self.sample_rates = dict(DEFAULT_SAMPLE_RATES)
+        self.sample_rates.update(sample_rates or {})
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.stats = {"written": 0, "dropped": 0, "sampled_out": 0}
+
+    def set_sample_rate(self, event: str, rate: float) -> None:
+        self.sample_rates[event] = rate
+
+    def log(self, event: str, level: str = "info", **fields: Any) -> None:
+        """Queue one record; never blocks on I/O."""
+        rate = self.sample_rates.get(event, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            self.stats["sampled_out"] += 1
+            return
+
+        record = {
+            "ts": time.time(),
+            "level": level,
+            "event": event,
+            "session_id": current_session_id.get(),
+            "request_id": current_request_id.get(),
+        }
+        record.update(fields)
+
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def info(self, event: str, **fields: Any) -> None:
+        self.log(event, "info", **fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        self.log(event, "warning", **fields)
+
+    def error(self, event: str, **fields: Any) -> None:
+        self.log(event, "error", **fields)
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer, name="structured-logger", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _writer(self) -> None:
+        while True:
+            record = self._queue.get()
+            batch = [record]
+            # Drain whatever else is waiting so one flush covers many records
+            while len(batch) < 512:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            lines = [json.dumps(item, default=str, ensure_ascii=False) for item in batch if item is not None]
+            if lines:
+                try:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                    self.stats["written"] += len(lines)
+                except Exception:
+                    self.stats["dropped"] += len(lines)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self, timeout: float = 1.0) -> None:
+        """Wait (briefly) until everything queued so far has been written."""
+        deadline = time.time() + timeout
+        while self._thread is not None and self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.005)
+
+    def close(self) -> None:
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=1.0)
+        except queue.Full:
+            return
+        self._thread.join(timeout=1.0)
+
+
+# Shared logger for the whole backend
+logger = structured_logger(
+    max_queue=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    sample_rates=_parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "")),
+)
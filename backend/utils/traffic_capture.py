@@ -0,0 +1,278 @@
+import atexit
+import base64
+import binascii
+import hashlib
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple
+
+from .structured_logger import current_request_id
+
+ARCHIVE_MAGIC = b"GRTRAF1\n"
+# Each record: header length, payload length, then the JSON header and the raw payload
+RECORD_PREFIX = struct.Struct("<II")
+
+
+def _image_bytes(image: str) -> bytes:
+    if image[:10] == "data:image":
+        image = image[image.index(",") + 1:]
+    return binascii.a2b_base64(image)
+
+
+class traffic_capture:
+    def __init__(self, path: Optional[str] = None, sample_rate: float = 1.0,
+                 max_bytes: int = 2 * 1024 * 1024 * 1024, max_queue: int = 256):
+        """
+        Records incoming requests and provider responses to an append-only archive.
+
+        Frames are stored once as raw JPEG bytes (not base64) and referenced by
+        hash afterwards, so a session holding up the same scene costs little.
+        Clients are sampled as a whole, keeping every captured session
+        complete. All writing happens on a background thread; records are
+        dropped (and counted) when the queue is full or the archive is at
+        max_bytes.
+
+        Args:
+            path: Archive file; capture is off when None
+            sample_rate: Fraction of clients captured (0..1)
+            max_bytes: Size at which the archive stops growing
+            max_queue: Records waiting to be written before new ones are dropped
+        """
+        self.path = path
+        self.enabled = bool(path)
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.started_at = time.time()
+        self._queue: "queue.Queue[Optional[Tuple[Dict[str, Any], bytes]]]" = queue.Queue(maxsize=max_queue)
+        self._frames_seen: Set[str] = set()
+        self._captured_requests: Set[str] = set()  # request ids whose provider calls belong in the archive
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.stats = {"written": 0, "dropped": 0, "over_quota": 0, "errors": 0}
+
+    def wants(self, client_id: str) -> bool:
+        """Whether this client's traffic is captured (stable per client, so sessions stay whole)."""
+        if not self.enabled:
+            return False
+        return self.sample_rate >= 1.0 or zlib.crc32(client_id.encode()) % 10000 < self.sample_rate * 10000
+
+    def record_request(self, client_id: str, method: str, path: str, body: bytes,
+                       headers: Optional[Dict[str, str]] = None) -> None:
+        """Queue one incoming request; a JSON body's "image" is split out into the archive's frame store."""
+        request_id = current_request_id.get()
+        header: Dict[str, Any] = {"kind": "request", "t": round(time.time() - self.started_at, 4),
+                                  "request_id": request_id, "client": client_id, "method": method,
+                                  "path": path, "headers": headers or {}}
+        payload = b""
+        try:
+            fields = json.loads(body) if body else None
+        except ValueError:
+            fields = None
+        if isinstance(fields, dict) and isinstance(fields.get("image"), str):
+            try:
+                frame = _image_bytes(fields.pop("image"))
+            except (binascii.Error, ValueError):
+                frame = b""
+            digest = hashlib.sha1(frame).hexdigest()
+            header["frame"] = digest
+            if digest not in self._frames_seen:
+                self._frames_seen.add(digest)
+                payload = frame
+        header["body"] = fields if fields is not None else body.decode("utf-8", "replace")
+        self._captured_requests.add(request_id)
+        self._enqueue(header, payload)
+
+    def record_response(self, status: int, seconds: float) -> None:
+        """How the server answered the current request, for comparing replays with production."""
+        self._enqueue({"kind": "response", "t": round(time.time() - self.started_at, 4),
+                       "request_id": current_request_id.get(), "status": status, "seconds": round(seconds, 4)})
+
+    def record_provider(self, provider: str, text: Optional[str], seconds: float, **fields: Any) -> None:
+        """A provider response made while serving a captured request (provider_stub's recording names)."""
+        request_id = current_request_id.get()
+        if not self.enabled or request_id not in self._captured_requests:
+            return
+        self._enqueue({"kind": "provider", "t": round(time.time() - self.started_at, 4), "request_id": request_id,
+                       "provider": provider, "text": text, "seconds": round(seconds, 4), **fields})
+
+    def finish_request(self) -> None:
+        """The current request is done; later provider calls (e.g. background summaries) aren't attributed to it."""
+        self._captured_requests.discard(current_request_id.get())
+
+    def _enqueue(self, header: Dict[str, Any], payload: bytes = b"") -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((header, payload))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            if payload:
+                self._frames_seen.discard(header["frame"])  # store the frame with its next occurrence
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer, name="traffic-capture", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _writer(self) -> None:
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            archive = open(self.path, "ab")
+            # Each capture run (server start) begins with the magic and a line saying when it started
+            archive.write(ARCHIVE_MAGIC + json.dumps({"started_at": self.started_at}).encode() + b"\n")
+        except OSError:
+            self.stats["errors"] += 1
+            self.enabled = False
+            return
+        with archive:
+            while True:
+                item = self._queue.get()
+                try:
+                    if item is None:
+                        return
+                    header, payload = item
+                    encoded = json.dumps(header, separators=(",", ":"), default=str).encode()
+                    if archive.tell() + len(encoded) + len(payload) > self.max_bytes:
+                        self.stats["over_quota"] += 1
+                        if payload:
+                            self._frames_seen.discard(header["frame"])
+                        continue
+                    archive.write(RECORD_PREFIX.pack(len(encoded), len(payload)) + encoded + payload)
+                    archive.flush()
+                    self.stats["written"] += 1
+                except (OSError, TypeError, ValueError):
+                    self.stats["errors"] += 1
+                finally:
+                    self._queue.task_done()
+
+    def close(self) -> None:
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=1.0)
+        except queue.Full:
+            return
+        self._thread.join(timeout=2.0)
+
+
+class capture_middleware:
+    def __init__(self, app, capture: traffic_capture, paths: Tuple[str, ...],
+                 client_id: Callable[[Dict[str, Any]], str], headers: Tuple[str, ...] = ("idempotency-key",)):
+        """
+        ASGI middleware feeding a traffic_capture.
+
+        The request body is read here in full and handed on unchanged, so
+        requests the endpoint rejects before parsing (429, 503) still keep
+        their frames and text. Register it inside the middleware that sets
+        current_request_id, so provider calls can be tied to their request.
+
+        Args:
+            app: The wrapped ASGI app
+            capture: Where records go
+            paths: Request paths that are captured
+            client_id: ASGI scope -> client id, as the server identifies clients
+            headers: Request headers (lowercase) kept with each request
+        """
+        self.app = app
+        self.capture = capture
+        self.paths = paths
+        self.client_id = client_id
+        self.headers = headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        client_id = self.client_id(scope)
+        if not self.capture.wants(client_id):
+            return await self.app(scope, receive, send)
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return  # client went away before sending the body
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]
+                   if name.decode("latin-1") in self.headers}
+        self.capture.record_request(client_id, scope["method"], scope["path"], body, headers)
+
+        replayed = False
+
+        async def receive_body():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status = 500
+
+        async def send_and_note_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_body, send_and_note_status)
+        finally:
+            self.capture.record_response(status, time.perf_counter() - start)
+            self.capture.finish_request()
+
+
+def read_archive(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Records of a capture archive in order, each a dict with "kind" and "t" (seconds since capture start).
+
+    Request records get their frame back as base64 in body["image"]. When
+    several capture runs were appended to one file, offsets count from the
+    start of the first, so the gap between runs is kept. A truncated last
+    record (the server died mid-write) ends the iteration.
+    """
+    frames: Dict[str, str] = {}
+    with open(path, "rb") as archive:
+        first_started_at = None
+        offset = 0.0
+        while True:
+            prefix = archive.read(RECORD_PREFIX.size)
+            if prefix == ARCHIVE_MAGIC:  # RECORD_PREFIX.size == len(ARCHIVE_MAGIC)
+                started_at = json.loads(archive.readline())["started_at"]
+                if first_started_at is None:
+                    first_started_at = started_at
+                offset = started_at - first_started_at
+                continue
+            if len(prefix) < RECORD_PREFIX.size:
+                return
+            header_length, payload_length = RECORD_PREFIX.unpack(prefix)
+            encoded = archive.read(header_length)
+            payload = archive.read(payload_length)
+            if len(encoded) < header_length or len(payload) < payload_length:
+                return
+            record = json.loads(encoded)
+            record["t"] += offset
+            if payload:
+                frames[record["frame"]] = base64.b64encode(payload).decode()
+            if record["kind"] == "request" and "frame" in record and isinstance(record["body"], dict):
+                record["body"]["image"] = frames.get(record["frame"], "")
+            yield record
+
+
+# Shared capture for the whole backend; set CAPTURE_TRAFFIC to an archive path to turn it on
+capture = traffic_capture(
+    path=os.getenv("CAPTURE_TRAFFIC") or None,
+    sample_rate=float(os.getenv("CAPTURE_SAMPLE_RATE", "1.0")),
+    max_bytes=int(float(os.getenv("CAPTURE_MAX_MB", "2048")) * 1024 * 1024),
+)
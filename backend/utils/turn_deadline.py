@@ -0,0 +1,54 @@
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+
+class deadline_exceeded(Exception):
+    """The turn's latency budget ran out before an upstream call finished."""
+
+
+class turn_deadline:
+    def __init__(self, budget_seconds: float):
+        """
+        Latency budget for one conversation turn.
+
+        Provider calls made while this is the current deadline get the remaining
+        budget as their timeout (see provider_timeout), and record which
+        provider the turn was waiting on so misses can be attributed.
+        """
+        self.budget_seconds = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+        self.phase = "queue"  # what the turn is waiting on: "queue", "llm" or "tts"
+        self.provider = "scheduler"
+        self.checkpoint: Optional[Dict] = None  # conversation state when the turn started running
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def enter(self, phase: str, provider: str) -> float:
+        """Mark the turn as waiting on a provider; returns the seconds left, or raises if none are."""
+        self.phase, self.provider = phase, provider
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise deadline_exceeded(f"No budget left for {phase} ({provider})")
+        return remaining
+
+
+# Deadline of the turn running in this context (copied into worker threads by asyncio.to_thread)
+current_deadline: ContextVar[Optional[turn_deadline]] = ContextVar("current_deadline", default=None)
+
+
+def provider_timeout(phase: str, provider: str) -> Optional[float]:
+    """Timeout for an upstream call: the current turn's remaining budget, or None outside a turn."""
+    deadline = current_deadline.get()
+    return deadline.enter(phase, provider) if deadline is not None else None
+
+
+def raise_if_expired(error: Exception = None) -> None:
+    """Turn a provider failure into deadline_exceeded when it was the turn's budget that ran out."""
+    deadline = current_deadline.get()
+    if deadline is not None and deadline.expired():
+        raise deadline_exceeded(f"{deadline.phase} ({deadline.provider}) missed the turn deadline") from error